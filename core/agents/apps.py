@@ -5,3 +5,7 @@ class AgentsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "agents"
     verbose_name = "Agents"
+
+    def ready(self):
+        # Import signals para invalidar el contexto de prompts cacheado.
+        from . import signals  # noqa: F401
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agents', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agentmessage',
+            index=models.Index(fields=['created_at', 'id'], name='agent_messa_created_98e984_idx'),
+        ),
+    ]
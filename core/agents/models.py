@@ -130,6 +130,9 @@ class AgentMessage(models.Model):
 
     class Meta:
         db_table = "agent_messages"
+        indexes = [
+            models.Index(fields=["created_at", "id"]),
+        ]
 
     def __str__(self):
         return f"Message {self.id}"
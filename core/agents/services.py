@@ -0,0 +1,186 @@
+"""
+Contexto de catalogo para los prompts de los agentes RAG.
+
+`PromptContextBuilder` arma por FlujoAgente un documento de texto compacto con la tienda, las reglas
+de los reglamentos de sus agentes, sus categorias (descripcion_prompt, logica_venta, regla) y los
+productos activos de esas categorias o vinculados directo al flujo. Se construye con un numero fijo
+de consultas (no crece con el catalogo) y su `version` es el hash del contenido, estable mientras el
+catalogo no cambie.
+
+El resultado se guarda en el cache de Django (alias AGENTS_CONTEXTO_CACHE_ALIAS) por flujo, asi que
+iniciar una sesion cuesta un `get_many`. Las señales de `agents.signals` lo invalidan (al confirmar la
+transaccion) cuando se guarda o borra cualquier modelo que aporta al documento: reemplazan la
+generacion del flujo, y una entrada solo vale si fue escrita con la generacion actual. Asi un
+contexto construido mientras llega una invalidacion queda descartado en vez de sobrevivir hasta
+AGENTS_CONTEXTO_TIMEOUT.
+"""
+import hashlib
+import uuid
+from typing import Iterable, List, NamedTuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q
+
+from ecommerce.models import Categoria, Producto, ProductoCategoria
+
+from .models import Agente, FlujoAgente, ProductoFlujoAgente, Regla
+
+
+CAMPOS_CATEGORIA = (("descripcion_prompt", ""), ("logica_venta", "Logica de venta: "), ("regla__texto", "Regla: "))
+
+
+class ContextoPrompt(NamedTuple):
+    flujo_id: int
+    version: str
+    documento: str
+
+
+def _cache():
+    return caches[getattr(settings, "AGENTS_CONTEXTO_CACHE_ALIAS", "default")]
+
+
+def contexto_cache_key(flujo_id: int) -> str:
+    return f"agents:contexto:{flujo_id}"
+
+
+def _generacion_key(flujo_id: int) -> str:
+    return f"{contexto_cache_key(flujo_id)}:generacion"
+
+
+def _timeout() -> int:
+    return getattr(settings, "AGENTS_CONTEXTO_TIMEOUT", 3600)
+
+
+def _compactar(texto) -> str:
+    return " ".join(str(texto or "").split())
+
+
+class PromptContextBuilder:
+    def __init__(self, flujo_id: int):
+        self.flujo_id = flujo_id
+
+    def obtener(self) -> ContextoPrompt:
+        """
+        Contexto cacheado del flujo; si no esta (o es de una generacion anterior) lo construye y lo
+        guarda al confirmar, atado a la generacion leida antes de construirlo.
+        """
+        key, generacion_key = contexto_cache_key(self.flujo_id), _generacion_key(self.flujo_id)
+        valores = _cache().get_many([key, generacion_key])
+        generacion, entrada = valores.get(generacion_key), valores.get(key)
+        if entrada is not None and entrada[0] == generacion:
+            return entrada[1]
+        contexto = self.construir()
+        transaction.on_commit(lambda: _cache().set(key, (generacion, contexto), _timeout()))
+        return contexto
+
+    def construir(self) -> ContextoPrompt:
+        """Arma el documento en cinco consultas; FlujoAgente.DoesNotExist si el flujo no existe."""
+        flujo = FlujoAgente.objects.select_related("tienda").get(pk=self.flujo_id)
+        categorias = list(
+            Categoria.objects.filter(flujos_agente__flujo_agente_id=flujo.pk, esta_activa=True)
+            .order_by("id")
+            .values("id", "nombre", "descripcion_prompt", "logica_venta", "regla__texto")
+            .distinct()
+        )
+        relaciones = ProductoCategoria.objects.filter(
+            categoria_id__in=[categoria["id"] for categoria in categorias], producto__isnull=False
+        )
+        # Cada producto se lista una vez, bajo la primera categoria del flujo que lo contiene.
+        categoria_de = {}
+        for producto_id, categoria_id in relaciones.order_by("categoria_id").values_list("producto_id", "categoria_id"):
+            categoria_de.setdefault(producto_id, categoria_id)
+        directos = ProductoFlujoAgente.objects.filter(flujo_agente_id=flujo.pk, producto__isnull=False).values_list(
+            "producto_id", flat=True
+        )
+        productos = (
+            Producto.objects.filter(Q(pk__in=relaciones.values("producto_id")) | Q(pk__in=directos), esta_activa=True)
+            .order_by("id")
+            .values("id", "nombre", "precio", "descripcion_prompt", "agendable")
+        )
+        por_categoria = {}
+        for producto in productos:
+            por_categoria.setdefault(categoria_de.get(producto["id"]), []).append(producto)
+        reglas = [
+            _compactar(texto)
+            for texto in Regla.objects.filter(
+                reglamento_id__in=Agente.objects.filter(flujo_agente_id=flujo.pk).values("reglamento_id")
+            )
+            .order_by("reglamento_id", "orden", "id")
+            .values_list("texto", flat=True)
+        ]
+
+        lineas = [f"# {_compactar(flujo.nombre_comercial)} ({_compactar(flujo.tienda.nombre)})"]
+        if flujo.descripcion:
+            lineas.append(_compactar(flujo.descripcion))
+        if reglas:
+            lineas.append("## Reglas")
+            lineas += [f"{numero}. {texto}" for numero, texto in enumerate(reglas, start=1)]
+        if categorias:
+            lineas.append("## Categorias")
+        for categoria in categorias:
+            lineas.append(f"### {_compactar(categoria['nombre'])} [categoria {categoria['id']}]")
+            for campo, etiqueta in CAMPOS_CATEGORIA:
+                if categoria[campo]:
+                    lineas.append(f"{etiqueta}{_compactar(categoria[campo])}")
+            lineas += self._productos(por_categoria.get(categoria["id"], []))
+        if por_categoria.get(None):
+            lineas.append("## Otros productos")
+            lineas += self._productos(por_categoria[None])
+
+        documento = "\n".join(lineas)
+        version = hashlib.sha256(documento.encode("utf-8")).hexdigest()[:16]
+        return ContextoPrompt(flujo.pk, version, documento)
+
+    @staticmethod
+    def _productos(productos: List[dict]) -> List[str]:
+        lineas = []
+        for producto in productos:
+            partes = [f"- {_compactar(producto['nombre'])} [producto {producto['id']}]"]
+            if producto["precio"] is not None:
+                partes.append(f"${producto['precio']}")
+            if producto["agendable"]:
+                partes.append("agendable")
+            linea = " | ".join(partes)
+            if producto["descripcion_prompt"]:
+                linea += f": {_compactar(producto['descripcion_prompt'])}"
+            lineas.append(linea)
+        return lineas
+
+
+def invalidar_contexto(flujo_ids: Iterable[int]) -> None:
+    """Reemplaza (al confirmar) la generacion de los flujos: sus entradas cacheadas dejan de valer."""
+    keys = [_generacion_key(flujo_id) for flujo_id in set(flujo_ids) if flujo_id is not None]
+    if keys:
+        transaction.on_commit(lambda: _cache().set_many({key: uuid.uuid4().hex for key in keys}, _timeout()))
+
+
+def flujos_de_productos(producto_ids: Iterable[int]) -> List[int]:
+    producto_ids = list(producto_ids)
+    return list(
+        FlujoAgente.objects.filter(
+            Q(producto_relaciones__producto_id__in=producto_ids)
+            | Q(categorias__categoria__producto_relaciones__producto_id__in=producto_ids)
+        )
+        .values_list("id", flat=True)
+        .distinct()
+    )
+
+
+def flujos_de_categorias(categoria_ids: Iterable[int]) -> List[int]:
+    return list(
+        FlujoAgente.objects.filter(categorias__categoria_id__in=list(categoria_ids))
+        .values_list("id", flat=True)
+        .distinct()
+    )
+
+
+def flujos_de_reglas(regla_ids: Iterable[int], reglamento_ids: Iterable[int]) -> List[int]:
+    return list(
+        FlujoAgente.objects.filter(
+            Q(agentes__reglamento_id__in=list(reglamento_ids)) | Q(categorias__categoria__regla_id__in=list(regla_ids))
+        )
+        .values_list("id", flat=True)
+        .distinct()
+    )
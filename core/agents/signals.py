@@ -0,0 +1,71 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from ecommerce.models import Categoria, Producto, ProductoCategoria, Tienda
+
+from .models import Agente, CategoriaFlujoAgente, FlujoAgente, ProductoFlujoAgente, Regla
+from .services import flujos_de_categorias, flujos_de_productos, flujos_de_reglas, invalidar_contexto
+
+
+def _anterior(sender, instance, campo):
+    if instance.pk is None:
+        return None
+    return sender.objects.filter(pk=instance.pk).values_list(campo, flat=True).first()
+
+
+@receiver(pre_save, sender=Agente)
+@receiver(pre_save, sender=ProductoFlujoAgente)
+@receiver(pre_save, sender=CategoriaFlujoAgente)
+def recordar_flujo_anterior(sender, instance, **kwargs):
+    instance._flujo_anterior = _anterior(sender, instance, "flujo_agente_id")
+
+
+@receiver(pre_save, sender=Regla)
+def recordar_reglamento_anterior(sender, instance: Regla, **kwargs):
+    instance._reglamento_anterior = _anterior(sender, instance, "reglamento_id")
+
+
+@receiver(post_save, sender=FlujoAgente)
+@receiver(post_delete, sender=FlujoAgente)
+def invalidar_contexto_flujo(sender, instance: FlujoAgente, **kwargs):
+    invalidar_contexto([instance.pk])
+
+
+@receiver(post_save, sender=Agente)
+@receiver(post_delete, sender=Agente)
+@receiver(post_save, sender=ProductoFlujoAgente)
+@receiver(post_delete, sender=ProductoFlujoAgente)
+@receiver(post_save, sender=CategoriaFlujoAgente)
+@receiver(post_delete, sender=CategoriaFlujoAgente)
+def invalidar_contexto_relacion(sender, instance, **kwargs):
+    invalidar_contexto([instance.flujo_agente_id, getattr(instance, "_flujo_anterior", None)])
+
+
+@receiver(post_save, sender=Regla)
+@receiver(post_delete, sender=Regla)
+def invalidar_contexto_regla(sender, instance: Regla, **kwargs):
+    reglamentos = {instance.reglamento_id, getattr(instance, "_reglamento_anterior", None)}
+    invalidar_contexto(flujos_de_reglas([instance.pk], reglamentos))
+
+
+@receiver(post_save, sender=Tienda)
+def invalidar_contexto_tienda(sender, instance: Tienda, **kwargs):
+    invalidar_contexto(FlujoAgente.objects.filter(tienda_id=instance.pk).values_list("id", flat=True))
+
+
+@receiver(post_save, sender=Categoria)
+def invalidar_contexto_categoria(sender, instance: Categoria, **kwargs):
+    invalidar_contexto(flujos_de_categorias([instance.pk]))
+
+
+@receiver(post_save, sender=ProductoCategoria)
+@receiver(post_delete, sender=ProductoCategoria)
+def invalidar_contexto_producto_categoria(sender, instance: ProductoCategoria, **kwargs):
+    # `_relacion_anterior` (producto_id, categoria_id) lo deja el pre_save de ecommerce.signals.
+    anterior = getattr(instance, "_relacion_anterior", None)
+    invalidar_contexto(flujos_de_categorias({instance.categoria_id, anterior[1] if anterior else None}))
+
+
+@receiver(post_save, sender=Producto)
+def invalidar_contexto_producto(sender, instance: Producto, **kwargs):
+    invalidar_contexto(flujos_de_productos([instance.pk]))
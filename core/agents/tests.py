@@ -0,0 +1,102 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from agents.models import (
+    Agente,
+    CategoriaFlujoAgente,
+    FlujoAgente,
+    ModeloIA,
+    ProductoFlujoAgente,
+    Regla,
+    Reglamento,
+    TipoAgente,
+)
+from agents.services import PromptContextBuilder
+from ecommerce.models import Categoria, Producto, ProductoCategoria, Tienda
+from users.models import Cuenta
+
+
+class PromptContextTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "pass1234")
+        self.client.force_authenticate(self.user)
+        cuenta = Cuenta.objects.create(user=self.user, nombre="Cuenta Test", nombre_usuario="ctest", contrasena="x")
+        self.tienda = Tienda.objects.create(nombre="Tienda Test", cuenta=cuenta)
+        self.producto = Producto.objects.create(nombre="Producto Test", precio=Decimal("20.00"), agendable=True)
+
+        reglamento = Reglamento.objects.create(nombre="General")
+        self.regla = Regla.objects.create(reglamento=reglamento, orden=1, texto="Responder  siempre en español.")
+        categoria = Categoria.objects.create(
+            nombre="Cabello", descripcion_prompt="Servicios de peluqueria", logica_venta="Ofrecer tratamiento"
+        )
+        self.flujo = FlujoAgente.objects.create(nombre="Ventas", nombre_comercial="Salon Test", tienda=self.tienda)
+        CategoriaFlujoAgente.objects.create(categoria=categoria, flujo_agente=self.flujo)
+        self.corte = Producto.objects.create(
+            nombre="Corte", precio=Decimal("15.00"), descripcion_prompt="Incluye lavado"
+        )
+        inactivo = Producto.objects.create(nombre="Retirado", precio=Decimal("1.00"), esta_activa=False)
+        for producto in (self.corte, inactivo):
+            ProductoCategoria.objects.create(producto=producto, categoria=categoria)
+        ProductoFlujoAgente.objects.create(producto=self.producto, flujo_agente=self.flujo)
+        Agente.objects.create(
+            nombre="Vendedor",
+            tienda=self.tienda,
+            flujo_agente=self.flujo,
+            tipo_agente=TipoAgente.objects.create(nombre="ventas"),
+            modelo_ia=ModeloIA.objects.create(nombre="modelo"),
+            reglamento=reglamento,
+        )
+        cache.clear()
+
+    def test_contexto_de_prompt_por_flujo_se_cachea_e_invalida(self):
+        with self.assertNumQueries(5):
+            construido = PromptContextBuilder(self.flujo.id).construir()
+        documento = construido.documento
+        self.assertTrue(documento.startswith("# Salon Test (Tienda Test)"))
+        self.assertIn("1. Responder siempre en español.", documento)
+        self.assertIn("Logica de venta: Ofrecer tratamiento", documento)
+        self.assertIn(f"- Corte [producto {self.corte.id}] | $15.00 | agendable: Incluye lavado", documento)
+        self.assertIn(f"## Otros productos\n- Producto Test [producto {self.producto.id}]", documento)
+        self.assertNotIn("Retirado", documento)
+
+        url = reverse("flujos-contexto", args=[self.flujo.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.get(url)
+        self.assertEqual(resp.data["version"], construido.version)
+        with self.assertNumQueries(0):
+            self.assertEqual(PromptContextBuilder(self.flujo.id).obtener(), construido)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=resp["ETag"]).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.corte.descripcion_prompt = "Incluye lavado y peinado"
+            self.corte.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            contexto = PromptContextBuilder(self.flujo.id).obtener()
+        self.assertNotEqual(contexto.version, construido.version)
+        self.assertIn("Incluye lavado y peinado", contexto.documento)
+        with self.assertNumQueries(0):
+            self.assertEqual(PromptContextBuilder(self.flujo.id).obtener(), contexto)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.regla.texto = "Tutear al cliente."
+            self.regla.save()
+        self.assertIn("1. Tutear al cliente.", PromptContextBuilder(self.flujo.id).obtener().documento)
+
+    def test_invalidacion_durante_la_construccion_no_se_pierde(self):
+        # Una lectura construye el contexto, llega una invalidacion y recien despues se guarda la lectura.
+        with self.captureOnCommitCallbacks() as guardar_lectura:
+            viejo = PromptContextBuilder(self.flujo.id).obtener()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.corte.descripcion_prompt = "Incluye lavado y peinado"
+            self.corte.save()
+        for callback in guardar_lectura:
+            callback()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            contexto = PromptContextBuilder(self.flujo.id).obtener()
+        self.assertNotEqual(contexto.version, viejo.version)
+        self.assertIn("Incluye lavado y peinado", contexto.documento)
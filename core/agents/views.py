@@ -1,7 +1,9 @@
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters, permissions, viewsets
+from rest_framework import filters, permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
 
-from common.pagination import get_page_number_pagination
+from common.pagination import get_keyset_pagination, get_page_number_pagination
 from common.permissions import IsAdminOrReadOnly
 
 from .models import (
@@ -28,6 +30,7 @@ from .serializers import (
     ReglamentoSerializer,
     TipoAgenteSerializer,
 )
+from .services import PromptContextBuilder
 
 
 class FlujoAgenteViewSet(viewsets.ModelViewSet):
@@ -46,6 +49,18 @@ class FlujoAgenteViewSet(viewsets.ModelViewSet):
             return qs
         return qs.filter(tienda__cuenta__user=self.request.user)
 
+    @action(detail=True, methods=["get"], url_path="contexto")
+    def contexto(self, request, pk=None):
+        """
+        Documento de catalogo para el prompt del flujo (cacheado). `version` es el hash del contenido y
+        viaja como ETag: con `If-None-Match` igual responde 304 sin cuerpo.
+        """
+        contexto = PromptContextBuilder(self.get_object().pk).obtener()
+        etag = f'"{contexto.version}"'
+        if request.headers.get("If-None-Match") == etag:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        return Response(contexto._asdict(), headers={"ETag": etag})
+
 
 class AgenteViewSet(viewsets.ModelViewSet):
     serializer_class = AgenteSerializer
@@ -130,7 +145,7 @@ class AgentSessionViewSet(viewsets.ReadOnlyModelViewSet):
 class AgentMessageViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = AgentMessageSerializer
     permission_classes = [permissions.IsAdminUser]
-    pagination_class = get_page_number_pagination(20)
+    pagination_class = get_keyset_pagination(("-created_at", "-id"), 20)
     queryset = AgentMessage.objects.select_related("session").all().order_by("-created_at", "-id")
 
 
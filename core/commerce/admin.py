@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Cart, CartItem, CheckIn, Order, OrderItem, Payment
+from .models import Cart, CartItem, CheckIn, Order, OrderItem, Payment, StockReservation
 
 
 class CartItemInline(admin.TabularInline):
@@ -38,6 +38,13 @@ class PaymentAdmin(admin.ModelAdmin):
     search_fields = ("order__id",)
 
 
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ("id", "order", "producto", "cantidad", "status", "expires_at", "created_at")
+    list_filter = ("status",)
+    search_fields = ("producto__nombre", "order__id")
+
+
 @admin.register(CheckIn)
 class CheckInAdmin(admin.ModelAdmin):
     list_display = ("id", "producto", "user", "tienda", "status", "created_at", "done_at")
@@ -5,3 +5,6 @@ class CommerceConfig(AppConfig):
     default_auto_field = "django.db.models.AutoField"
     name = "commerce"
 
+    def ready(self):
+        # Import signals para invalidar el resumen cacheado del carrito.
+        from . import signals  # noqa: F401
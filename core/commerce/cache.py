@@ -0,0 +1,65 @@
+"""
+Cache del resumen del carrito activo por (usuario, tienda).
+
+Usa el framework de cache de Django (alias COMMERCE_CART_CACHE_ALIAS), por lo que funciona
+igual con LocMemCache en desarrollo y con Redis en produccion. Solo se usan get_many/set/set_many.
+
+Las mutaciones no escriben el resumen: invalidan (al confirmar la transaccion) y la siguiente lectura
+lo recalcula. Cada clave tiene una generacion (un token que la invalidacion reemplaza); el resumen se
+guarda junto a la generacion leida antes de calcularlo y solo vale si sigue siendo la actual, asi una
+invalidacion que ocurre mientras se calcula nunca queda tapada por un resumen viejo.
+"""
+import uuid
+from typing import Callable, Iterable, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+def _cache():
+    return caches[getattr(settings, "COMMERCE_CART_CACHE_ALIAS", "default")]
+
+
+def _timeout() -> int:
+    return getattr(settings, "COMMERCE_CART_CACHE_TIMEOUT", 300)
+
+
+def cart_cache_key(user_id: int, tienda_id: int) -> str:
+    return f"commerce:cart:{user_id}:{tienda_id}"
+
+
+def _generacion_key(key: str) -> str:
+    return f"{key}:generacion"
+
+
+def _leer(user_id: int, tienda_id: int) -> Tuple[dict | None, str | None]:
+    """(resumen vigente o None, generacion actual) en un solo viaje al cache."""
+    key = cart_cache_key(user_id, tienda_id)
+    valores = _cache().get_many([key, _generacion_key(key)])
+    generacion = valores.get(_generacion_key(key))
+    entrada = valores.get(key)
+    if entrada is None or entrada[0] != generacion:
+        return None, generacion
+    return entrada[1], generacion
+
+
+def cached_summary(user_id: int, tienda_id: int, construir: Callable[[], dict]) -> dict:
+    """Resumen cacheado; si falta lo construye y lo guarda (al confirmar) atado a la generacion leida."""
+    summary, generacion = _leer(user_id, tienda_id)
+    if summary is None:
+        summary = construir()
+        key = cart_cache_key(user_id, tienda_id)
+        transaction.on_commit(lambda: _cache().set(key, (generacion, summary), _timeout()))
+    return summary
+
+
+def invalidate_carts(pares: Iterable[Tuple[int, int]]) -> None:
+    """Reemplaza (al confirmar) la generacion de los carritos (user_id, tienda_id) indicados."""
+    keys = {_generacion_key(cart_cache_key(user_id, tienda_id)) for user_id, tienda_id in pares}
+    if keys:
+        transaction.on_commit(lambda: _cache().set_many({key: uuid.uuid4().hex for key in keys}, _timeout()))
+
+
+def invalidate_cart(user_id: int, tienda_id: int) -> None:
+    invalidate_carts([(user_id, tienda_id)])
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from commerce.services import liberar_reservas_expiradas
+
+
+class Command(BaseCommand):
+    help = "Libera en lotes las retenciones de stock vencidas (pensado para cron o un worker periodico)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        liberadas = liberar_reservas_expiradas(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Retenciones liberadas: {liberadas}"))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:06
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commerce', '0001_initial'),
+        ('ecommerce', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('status', models.CharField(choices=[('active', 'activa'), ('consumed', 'consumida'), ('released', 'liberada')], default='active', max_length=10)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to='commerce.order')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='stock_reservations', to='ecommerce.producto')),
+            ],
+            options={
+                'db_table': 'commerce_stock_reservation',
+                'indexes': [models.Index(fields=['producto', 'status', 'expires_at'], name='commerce_st_product_191c8b_idx'), models.Index(fields=['status', 'expires_at'], name='commerce_st_status_480d60_idx')],
+                'constraints': [models.UniqueConstraint(fields=('order', 'producto'), name='uq_reserva_por_order_producto')],
+            },
+        ),
+    ]
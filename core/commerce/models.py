@@ -83,6 +83,7 @@ class Order(models.Model):
         indexes = [
             models.Index(fields=["user", "tienda"]),
             models.Index(fields=["status"]),
+            models.Index(fields=["created_at", "id"]),
         ]
 
     def __str__(self):
@@ -134,6 +135,36 @@ class Payment(models.Model):
         return f"Payment {self.provider} #{self.pk}"
 
 
+class StockReservation(models.Model):
+    """Retencion temporal de stock creada en el checkout y consumida al pagar la orden."""
+
+    class Status(models.TextChoices):
+        ACTIVA = "active", "activa"
+        CONSUMIDA = "consumed", "consumida"
+        LIBERADA = "released", "liberada"
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="stock_reservations")
+    producto = models.ForeignKey(Producto, on_delete=models.PROTECT, related_name="stock_reservations")
+    cantidad = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.ACTIVA)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "commerce_stock_reservation"
+        indexes = [
+            models.Index(fields=["producto", "status", "expires_at"]),
+            models.Index(fields=["status", "expires_at"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["order", "producto"], name="uq_reserva_por_order_producto"),
+        ]
+
+    def __str__(self):
+        return f"Reserva {self.producto} x{self.cantidad} ({self.get_status_display()})"
+
+
 class CheckIn(models.Model):
     class Status(models.TextChoices):
         PENDIENTE = "pending", "pendiente"
@@ -42,6 +42,24 @@ class UpdateCartItemSerializer(serializers.Serializer):
     quantity = serializers.IntegerField(min_value=0)
 
 
+class CartOperationSerializer(serializers.Serializer):
+    OPS = ("add", "set", "remove")
+
+    op = serializers.ChoiceField(choices=OPS)
+    producto_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0, required=False, default=1)
+
+    def validate(self, attrs):
+        if attrs["op"] == "add" and attrs["quantity"] < 1:
+            raise serializers.ValidationError({"quantity": "La cantidad debe ser mayor a 0."})
+        return attrs
+
+
+class CartBatchSerializer(serializers.Serializer):
+    tienda_id = serializers.IntegerField()
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=200)
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
     producto_nombre = serializers.CharField(source="producto.nombre", read_only=True)
 
@@ -1,14 +1,19 @@
+from collections import defaultdict
 from decimal import Decimal
-from typing import Tuple
+from typing import Dict, Tuple
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
-from sales.services import create_sale_from_order, guess_categoria_snapshot
+from sales.services import create_sale_from_order, guess_categoria_snapshot, guess_categoria_snapshots
 from ecommerce.models import Producto, Tienda
 
-from .models import Cart, CartItem, CheckIn, Order, OrderItem, Payment
+from .cache import invalidate_cart
+from .models import Cart, CartItem, CheckIn, Order, OrderItem, Payment, StockReservation
 
 
 def get_or_create_cart(user, tienda: Tienda) -> Cart:
@@ -44,6 +49,7 @@ def add_item_to_cart(user, tienda: Tienda, producto: Producto, quantity: int) ->
         item.categoria_snapshot_id = item.categoria_snapshot_id or cat_id
         item.categoria_snapshot_nombre = item.categoria_snapshot_nombre or (cat_nombre or "")
         item.save(update_fields=["cantidad", "precio_unitario", "categoria_snapshot_id", "categoria_snapshot_nombre"])
+    invalidate_cart(cart.user_id, cart.tienda_id)
     return cart
 
 
@@ -56,84 +62,299 @@ def update_item_quantity(user, tienda: Tienda, producto: Producto, quantity: int
 
     if quantity < 1:
         item.delete()
-        return cart
-
-    item.cantidad = quantity
-    item.save(update_fields=["cantidad", "updated_at"])
+    else:
+        item.cantidad = quantity
+        item.save(update_fields=["cantidad", "updated_at"])
+    invalidate_cart(cart.user_id, cart.tienda_id)
     return cart
 
 
 def remove_item_from_cart(user, tienda: Tienda, producto: Producto) -> Cart:
     cart = get_or_create_cart(user, tienda)
     CartItem.objects.filter(cart=cart, producto=producto).delete()
+    invalidate_cart(cart.user_id, cart.tienda_id)
+    return cart
+
+
+@transaction.atomic
+def apply_cart_operations(user, tienda: Tienda, operations: list) -> Cart:
+    """
+    Aplica una lista de operaciones `add`/`set`/`remove` sobre el carrito en una transaccion.
+    Los productos e items existentes se leen una vez, el estado final se calcula en memoria y
+    se escribe con un upsert (bulk_create con update_conflicts) mas un DELETE. Si alguna
+    operacion es invalida no se aplica ninguna.
+    """
+    cart = get_or_create_cart(user, tienda)
+    producto_ids = {op["producto_id"] for op in operations}
+    productos = Producto.objects.in_bulk(producto_ids)
+    existentes = {item.producto_id: item for item in CartItem.objects.filter(cart=cart, producto_id__in=producto_ids)}
+    cantidades = {pid: item.cantidad for pid, item in existentes.items()}
+
+    errores = []
+    for posicion, op in enumerate(operations):
+        pid = op["producto_id"]
+        producto = productos.get(pid)
+        if producto is None:
+            errores.append(f"Operacion {posicion}: el producto {pid} no existe.")
+        elif op["op"] == "add":
+            if not producto.esta_activa:
+                errores.append(f"Operacion {posicion}: el producto {producto.nombre} esta inactivo.")
+            else:
+                cantidades[pid] = cantidades.get(pid, 0) + op["quantity"]
+        elif op["op"] == "set":
+            if pid not in cantidades:
+                errores.append(f"Operacion {posicion}: el producto {producto.nombre} no esta en el carrito.")
+            else:
+                cantidades[pid] = op["quantity"]
+        else:
+            cantidades[pid] = 0
+    if errores:
+        raise ValidationError(errores)
+
+    nuevos = [pid for pid, n in cantidades.items() if n > 0 and pid not in existentes]
+    snapshots = guess_categoria_snapshots(nuevos) if nuevos else {}
+    filas = []
+    for pid, cantidad in cantidades.items():
+        item = existentes.get(pid)
+        if cantidad < 1 or (item is not None and item.cantidad == cantidad):
+            continue
+        if item is None:
+            cat_id, cat_nombre = snapshots.get(pid, (None, ""))
+            precio = productos[pid].precio or Decimal("0.00")
+        else:
+            cat_id, cat_nombre, precio = item.categoria_snapshot_id, item.categoria_snapshot_nombre, item.precio_unitario
+        filas.append(
+            CartItem(
+                cart=cart,
+                producto_id=pid,
+                cantidad=cantidad,
+                precio_unitario=precio,
+                categoria_snapshot_id=cat_id,
+                categoria_snapshot_nombre=cat_nombre or "",
+            )
+        )
+    if filas:
+        CartItem.objects.bulk_create(
+            filas,
+            update_conflicts=True,
+            unique_fields=["cart", "producto"],
+            update_fields=["cantidad", "updated_at"],
+        )
+
+    eliminar = [pid for pid, n in cantidades.items() if n < 1 and pid in existentes]
+    if eliminar:
+        CartItem.objects.filter(cart=cart, producto_id__in=eliminar).delete()
+
+    invalidate_cart(cart.user_id, cart.tienda_id)
     return cart
 
 
 def cart_summary(cart: Cart) -> dict:
-    items = cart.items.all()
-    subtotal = sum((item.precio_unitario * item.cantidad for item in items), Decimal("0.00"))
-    total_items = sum((item.cantidad for item in items), 0)
+    """Resumen del carrito en una sola consulta (items + nombre de producto) y una pasada en memoria."""
+    filas = cart.items.order_by("id").values_list("producto_id", "producto__nombre", "cantidad", "precio_unitario")
+    subtotal = Decimal("0.00")
+    total_items = 0
+    items = []
+    for producto_id, producto_nombre, cantidad, precio_unitario in filas:
+        total_linea = precio_unitario * cantidad
+        subtotal += total_linea
+        total_items += cantidad
+        items.append(
+            {
+                "producto_id": producto_id,
+                "producto_nombre": producto_nombre,
+                "cantidad": cantidad,
+                "precio_unitario": precio_unitario,
+                "total_linea": total_linea,
+            }
+        )
     return {
         "cart_id": cart.id,
         "tienda_id": cart.tienda_id,
         "status": cart.status,
         "subtotal": subtotal,
         "total_items": total_items,
-        "items": [
-            {
-                "producto_id": item.producto_id,
-                "producto_nombre": item.producto.nombre,
-                "cantidad": item.cantidad,
-                "precio_unitario": item.precio_unitario,
-                "total_linea": item.total_linea,
-            }
-            for item in items
-        ],
+        "items": items,
     }
 
 
+class StockInsuficiente(ValidationError):
+    """Una o mas lineas no tienen stock suficiente; `faltantes` mapea producto_id -> (pedido, disponible)."""
+
+    def __init__(self, faltantes: Dict[int, Tuple[int, int]], nombres: Dict[int, str]):
+        self.faltantes = faltantes
+        detalle = ", ".join(nombres.get(pid, f"producto-{pid}") for pid in faltantes) or "el pedido"
+        super().__init__(f"Stock insuficiente para {detalle}.")
+
+
+def _retenciones_activas(excluir_order: Order | None = None):
+    """Subconsulta: unidades retenidas por reservas activas no vencidas del producto externo (OuterRef pk)."""
+    reservas = StockReservation.objects.filter(
+        producto_id=OuterRef("pk"), status=StockReservation.Status.ACTIVA, expires_at__gt=timezone.now()
+    )
+    if excluir_order is not None:
+        reservas = reservas.exclude(order=excluir_order)
+    total = reservas.order_by().values("producto_id").annotate(total=Sum("cantidad")).values("total")
+    return Coalesce(Subquery(total, output_field=IntegerField()), 0)
+
+
+def _bloquear_productos(producto_ids) -> None:
+    """
+    SELECT ... FOR UPDATE de los productos en orden de id: serializa checkouts y pagos que tocan el
+    mismo producto. Las consultas siguientes de la transaccion ven las retenciones ya confirmadas.
+    """
+    list(Producto.objects.select_for_update().filter(pk__in=set(producto_ids)).order_by("id").values_list("id"))
+
+
+def stock_disponible(producto_ids) -> Dict[int, Tuple[int, str]]:
+    """Stock menos retenciones activas no vencidas, por producto: {id: (disponible, nombre)}."""
+    activas = Q(
+        stock_reservations__status=StockReservation.Status.ACTIVA,
+        stock_reservations__expires_at__gt=timezone.now(),
+    )
+    filas = (
+        Producto.objects.filter(pk__in=set(producto_ids))
+        .annotate(retenido=Coalesce(Sum("stock_reservations__cantidad", filter=activas), 0))
+        .values_list("id", "nombre", "stock", "retenido")
+    )
+    return {pid: (stock - retenido, nombre) for pid, nombre, stock, retenido in filas}
+
+
+def _verificar_disponibilidad(cantidades: Dict[int, int]) -> None:
+    disponible = stock_disponible(cantidades)
+    faltantes = {}
+    nombres = {}
+    for pid, n in cantidades.items():
+        libre, nombre = disponible.get(pid, (0, ""))
+        if libre < n:
+            faltantes[pid] = (n, libre)
+            nombres[pid] = nombre
+    if faltantes:
+        raise StockInsuficiente(faltantes, nombres)
+
+
+def _retener_stock(order: Order, cantidades: Dict[int, int]) -> None:
+    expires_at = timezone.now() + settings.COMMERCE_RESERVATION_TTL
+    StockReservation.objects.bulk_create(
+        [
+            StockReservation(order=order, producto_id=pid, cantidad=n, expires_at=expires_at)
+            for pid, n in cantidades.items()
+        ]
+    )
+
+
 @transaction.atomic
 def checkout_cart(user, tienda: Tienda) -> Order:
     cart = get_or_create_cart(user, tienda)
-    items = list(cart.items.select_related("producto"))
+    items = list(cart.items.all())
     if not items:
         raise ValidationError("El carrito esta vacio.")
 
-    order = Order.objects.create(user=user, tienda=tienda, cart=cart, status=Order.Status.PENDIENTE)
+    # Snapshots de categoria faltantes en una sola consulta, no una por linea.
+    sin_snapshot = [
+        item.producto_id
+        for item in items
+        if item.categoria_snapshot_id is None or not item.categoria_snapshot_nombre
+    ]
+    snapshots = guess_categoria_snapshots(sin_snapshot) if sin_snapshot else {}
+
     total_items = 0
     subtotal = Decimal("0.00")
+    lineas = []
+    cantidades = defaultdict(int)
     for item in items:
         cat_id = item.categoria_snapshot_id
         cat_nombre = item.categoria_snapshot_nombre
         if cat_id is None or not cat_nombre:
-            cat_id, cat_nombre = _categoria_snapshot(item.producto)
+            cat_id, cat_nombre = snapshots.get(item.producto_id, (None, ""))
         total_linea = item.precio_unitario * item.cantidad
-        OrderItem.objects.create(
-            order=order,
-            producto=item.producto,
-            cantidad=item.cantidad,
-            precio_unitario=item.precio_unitario,
-            total_linea=total_linea,
-            categoria_snapshot_id=cat_id,
-            categoria_snapshot_nombre=cat_nombre or "",
+        lineas.append(
+            OrderItem(
+                producto_id=item.producto_id,
+                cantidad=item.cantidad,
+                precio_unitario=item.precio_unitario,
+                total_linea=total_linea,
+                categoria_snapshot_id=cat_id,
+                categoria_snapshot_nombre=cat_nombre or "",
+            )
         )
         total_items += item.cantidad
         subtotal += total_linea
+        cantidades[item.producto_id] += item.cantidad
 
-    order.total_items = total_items
-    order.subtotal = subtotal
-    order.total = subtotal
-    order.save(update_fields=["total_items", "subtotal", "total", "updated_at"])
+    # Verificar y retener es check-then-insert: el bloqueo por producto evita que dos checkouts
+    # concurrentes pasen ambos la verificacion sobre el mismo stock libre.
+    _bloquear_productos(cantidades)
+    _verificar_disponibilidad(cantidades)
+    order = Order.objects.create(
+        user=user,
+        tienda=tienda,
+        cart=cart,
+        status=Order.Status.PENDIENTE,
+        total_items=total_items,
+        subtotal=subtotal,
+        total=subtotal,
+    )
+    for linea in lineas:
+        linea.order = order
+    OrderItem.objects.bulk_create(lineas)
+    _retener_stock(order, cantidades)
 
     cart.status = Cart.Status.FINALIZADO
     cart.save(update_fields=["status", "updated_at"])
+    invalidate_cart(cart.user_id, cart.tienda_id)
     return order
 
 
+def descontar_stock(cantidades: Dict[int, int], order: Order | None = None) -> None:
+    """
+    Descuenta stock de todos los productos con un unico UPDATE condicionado:
+    `stock = stock - n WHERE stock - retenido_por_otras_ordenes >= n`. Las retenciones activas no
+    vencidas de otras ordenes cuentan como stock ocupado (las de `order` no), asi una orden cuya
+    retencion vencio no puede pagar con unidades que otra orden tiene retenidas. Los productos se
+    bloquean antes del UPDATE para que la subconsulta vea las retenciones confirmadas por checkouts
+    concurrentes. Si alguna linea no alcanza se revierte todo y se reportan todas las lineas cortas.
+    """
+    cantidades = {pid: n for pid, n in cantidades.items() if n > 0}
+    if not cantidades:
+        return
+
+    pedido = Case(
+        *[When(pk=pid, then=Value(n)) for pid, n in cantidades.items()],
+        output_field=IntegerField(),
+    )
+    with transaction.atomic():
+        _bloquear_productos(cantidades)
+        actualizados = Producto.objects.filter(
+            pk__in=cantidades, stock__gte=pedido + _retenciones_activas(excluir_order=order)
+        ).update(stock=F("stock") - pedido)
+        if actualizados == len(cantidades):
+            return
+        # Alguna fila no cumplio la condicion: se revierte el savepoint completo.
+        transaction.set_rollback(True)
+
+    faltantes = {}
+    nombres = {}
+    libres = (
+        Producto.objects.filter(pk__in=cantidades)
+        .annotate(libre=F("stock") - _retenciones_activas(excluir_order=order))
+        .values_list("id", "nombre", "libre")
+    )
+    for pid, nombre, libre in libres:
+        if libre < cantidades[pid]:
+            faltantes[pid] = (cantidades[pid], libre)
+            nombres[pid] = nombre
+    raise StockInsuficiente(faltantes, nombres)
+
+
 @transaction.atomic
 def confirm_payment(order: Order, provider: str, external_id: str | None = None, raw_response=None) -> Order:
     if order.status == Order.Status.PAGADA:
         return order
+    # Bloquea la orden: dos pagos simultaneos de la misma orden no descuentan stock dos veces.
+    if Order.objects.select_for_update().values_list("status", flat=True).get(pk=order.pk) == Order.Status.PAGADA:
+        order.refresh_from_db()
+        return order
 
     payment_defaults = {
         "provider": provider,
@@ -151,12 +372,13 @@ def confirm_payment(order: Order, provider: str, external_id: str | None = None,
         payment.amount = order.total
         payment.save(update_fields=["status", "raw_response", "provider", "amount"])
 
-    for item in order.items.select_related("producto"):
-        producto = item.producto
-        if producto.stock is not None and producto.stock < item.cantidad:
-            raise ValidationError(f"Stock insuficiente para {producto.nombre}.")
-        producto.stock = (producto.stock or 0) - item.cantidad
-        producto.save(update_fields=["stock"])
+    cantidades = defaultdict(int)
+    for producto_id, cantidad in order.items.values_list("producto_id", "cantidad"):
+        cantidades[producto_id] += cantidad
+    descontar_stock(cantidades, order=order)
+    order.stock_reservations.filter(status=StockReservation.Status.ACTIVA).update(
+        status=StockReservation.Status.CONSUMIDA, updated_at=timezone.now()
+    )
 
     order.status = Order.Status.PAGADA
     order.paid_at = timezone.now()
@@ -167,6 +389,26 @@ def confirm_payment(order: Order, provider: str, external_id: str | None = None,
     return order
 
 
+def liberar_reservas_expiradas(batch_size: int = 500) -> int:
+    """
+    Marca como liberadas las retenciones vencidas en lotes de `batch_size`.
+    El stock disponible ya ignora retenciones vencidas; esto solo limpia su estado.
+    """
+    ahora = timezone.now()
+    liberadas = 0
+    while True:
+        ids = list(
+            StockReservation.objects.filter(status=StockReservation.Status.ACTIVA, expires_at__lte=ahora)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return liberadas
+        liberadas += StockReservation.objects.filter(pk__in=ids, status=StockReservation.Status.ACTIVA).update(
+            status=StockReservation.Status.LIBERADA, updated_at=ahora
+        )
+
+
 def _crear_checkins_para_order(order: Order) -> None:
     for item in order.items.select_related("producto"):
         producto = item.producto
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from ecommerce.models import Producto
+from ecommerce.services import producto_cambio
+
+from .cache import invalidate_carts
+from .models import Cart
+
+
+@receiver(post_save, sender=Producto)
+def invalidar_carritos_del_producto(sender, instance: Producto, created=False, **kwargs):
+    # El resumen del carrito muestra el nombre del producto; solo se consulta si nombre o precio cambiaron.
+    if created or not producto_cambio(instance, ("nombre", "precio")):
+        return
+    invalidate_carts(
+        Cart.objects.filter(status=Cart.Status.ABIERTO, items__producto_id=instance.pk)
+        .values_list("user_id", "tienda_id")
+        .distinct()
+    )
@@ -1,12 +1,28 @@
+import threading
+import time
 from decimal import Decimal
 from datetime import timedelta
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import OperationalError, connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework.test import APITestCase
 
-from commerce.models import CheckIn, Order
+from commerce.models import CartItem, CheckIn, Order, OrderItem, StockReservation
+from commerce.services import (
+    StockInsuficiente,
+    cart_summary,
+    checkout_cart,
+    confirm_payment,
+    descontar_stock,
+    get_or_create_cart,
+    liberar_reservas_expiradas,
+)
 from sales.models import SaleEvent, SaleItem
 from users.models import Cuenta
 from ecommerce.models import Producto, Tienda
@@ -15,6 +31,7 @@ from scheduling.models import RecursoReservable, ReglaDisponibilidadRecurrente,
 
 class CommerceFlowTests(APITestCase):
     def setUp(self):
+        cache.clear()
         User = get_user_model()
         self.user = User.objects.create_superuser("admin", "admin@example.com", "pass1234")
         self.client.force_authenticate(self.user)
@@ -113,3 +130,233 @@ class CommerceFlowTests(APITestCase):
         )
         self.assertEqual(SaleEvent.objects.filter(cita_id=cita_id).count(), 1)
         self.assertEqual(CheckIn.objects.filter(cita_id=cita_id).count(), 1)
+
+    def _llenar_carrito(self, tienda, lineas: int):
+        cart = get_or_create_cart(self.user, tienda)
+        productos = Producto.objects.bulk_create(
+            [Producto(nombre=f"Linea {i}", precio=Decimal("5.00"), stock=100) for i in range(lineas)]
+        )
+        CartItem.objects.bulk_create(
+            [CartItem(cart=cart, producto=p, cantidad=2, precio_unitario=p.precio) for p in productos]
+        )
+
+    def test_checkout_cantidad_de_consultas_constante(self):
+        tienda_chica = Tienda.objects.create(nombre="Chica", cuenta=self.cuenta)
+        tienda_grande = Tienda.objects.create(nombre="Grande", cuenta=self.cuenta)
+        self._llenar_carrito(tienda_chica, 2)
+        self._llenar_carrito(tienda_grande, 60)
+
+        with CaptureQueriesContext(connection) as chica:
+            checkout_cart(self.user, tienda_chica)
+        with CaptureQueriesContext(connection) as grande:
+            order = checkout_cart(self.user, tienda_grande)
+
+        self.assertEqual(len(grande), len(chica))
+        self.assertLessEqual(len(grande), 11)
+        self.assertEqual(order.items.count(), 60)
+        self.assertEqual(order.total_items, 120)
+        self.assertEqual(order.total, Decimal("600.00"))
+
+    def test_cart_summary_una_consulta(self):
+        self._llenar_carrito(self.tienda, 100)
+        cart = get_or_create_cart(self.user, self.tienda)
+        with self.assertNumQueries(1):
+            resumen = cart_summary(cart)
+        self.assertEqual(len(resumen["items"]), 100)
+        self.assertEqual(resumen["total_items"], 200)
+        self.assertEqual(resumen["subtotal"], Decimal("1000.00"))
+        self.assertEqual(resumen["items"][0]["producto_nombre"], "Linea 0")
+
+    def test_resumen_cacheado_no_consulta_la_base(self):
+        url = f"/api/commerce/cart/summary/?tienda_id={self.tienda.id}"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                "/api/commerce/cart/items/",
+                {"tienda_id": self.tienda.id, "producto_id": self.producto.id, "quantity": 2},
+                format="json",
+            )
+        # La mutacion invalida; la primera lectura recalcula y guarda, la siguiente sale del cache.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(url)
+        with self.assertNumQueries(0):
+            resp = self.client.get(url)
+        self.assertEqual(resp.data["total_items"], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.patch(
+                f"/api/commerce/cart/items/{self.producto.id}/?tienda_id={self.tienda.id}", {"quantity": 5}, format="json"
+            )
+        self.assertEqual(resp.data["total_items"], 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).data["total_items"], 5)
+
+        # Renombrar el producto invalida los carritos abiertos que lo tienen.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.nombre = "Producto Renombrado"
+            self.producto.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.get(url).data["items"][0]["producto_nombre"], "Producto Renombrado")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/commerce/checkout/", {"tienda_id": self.tienda.id}, format="json")
+        self.assertEqual(self.client.get(url).data["total_items"], 0)
+
+    def test_batch_de_operaciones_en_un_request(self):
+        otro = Producto.objects.create(nombre="Otro", precio=Decimal("3.00"), stock=10)
+        tercero = Producto.objects.create(nombre="Tercero", precio=Decimal("1.00"), stock=10)
+        resp = self.client.post(
+            "/api/commerce/cart/batch/",
+            {
+                "tienda_id": self.tienda.id,
+                "operations": [
+                    {"op": "add", "producto_id": self.producto.id, "quantity": 1},
+                    {"op": "add", "producto_id": otro.id, "quantity": 2},
+                    {"op": "add", "producto_id": tercero.id},
+                    {"op": "add", "producto_id": self.producto.id, "quantity": 2},
+                    {"op": "set", "producto_id": otro.id, "quantity": 4},
+                    {"op": "remove", "producto_id": tercero.id},
+                ],
+            },
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 200)
+        cantidades = {item["producto_id"]: item["cantidad"] for item in resp.data["items"]}
+        self.assertEqual(cantidades, {self.producto.id: 3, otro.id: 4})
+        self.assertEqual(resp.data["subtotal"], Decimal("72.00"))
+
+        resp = self.client.post(
+            "/api/commerce/cart/batch/",
+            {
+                "tienda_id": self.tienda.id,
+                "operations": [
+                    {"op": "set", "producto_id": self.producto.id, "quantity": 0},
+                    {"op": "set", "producto_id": tercero.id, "quantity": 1},
+                ],
+            },
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(CartItem.objects.get(producto=self.producto).cantidad, 3)
+
+    def test_descontar_stock_reporta_todas_las_lineas_cortas(self):
+        otro = Producto.objects.create(nombre="Otro", precio=Decimal("1.00"), stock=1)
+        tercero = Producto.objects.create(nombre="Tercero", precio=Decimal("1.00"), stock=5)
+        with self.assertRaises(StockInsuficiente) as ctx:
+            descontar_stock({self.producto.id: 11, otro.id: 2, tercero.id: 5})
+        self.assertEqual(set(ctx.exception.faltantes), {self.producto.id, otro.id})
+        tercero.refresh_from_db()
+        self.assertEqual(tercero.stock, 5)
+
+    def test_checkout_retiene_stock_hasta_vencer(self):
+        User = get_user_model()
+        otro = User.objects.create_user("otro", "otro@example.com", "pass1234")
+        CartItem.objects.create(
+            cart=get_or_create_cart(self.user, self.tienda),
+            producto=self.producto,
+            cantidad=8,
+            precio_unitario=Decimal("20.00"),
+        )
+        order = checkout_cart(self.user, self.tienda)
+        self.assertEqual(order.stock_reservations.get().cantidad, 8)
+
+        CartItem.objects.create(
+            cart=get_or_create_cart(otro, self.tienda),
+            producto=self.producto,
+            cantidad=3,
+            precio_unitario=Decimal("20.00"),
+        )
+        with self.assertRaises(StockInsuficiente):
+            checkout_cart(otro, self.tienda)
+
+        order.stock_reservations.update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(liberar_reservas_expiradas(batch_size=1), 1)
+        self.assertEqual(StockReservation.objects.get(order=order).status, StockReservation.Status.LIBERADA)
+        self.assertEqual(checkout_cart(otro, self.tienda).total_items, 3)
+
+    def test_pago_con_retencion_vencida_no_toma_stock_retenido_por_otra_orden(self):
+        User = get_user_model()
+        otro = User.objects.create_user("otro", "otro@example.com", "pass1234")
+        ordenes = []
+        for user in (self.user, otro):
+            CartItem.objects.create(
+                cart=get_or_create_cart(user, self.tienda),
+                producto=self.producto,
+                cantidad=8,
+                precio_unitario=Decimal("20.00"),
+            )
+            ordenes.append(checkout_cart(user, self.tienda))
+            # La retencion de la primera vence antes del checkout de la segunda.
+            StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        vencida, vigente = ordenes
+        vigente.stock_reservations.update(expires_at=timezone.now() + timedelta(minutes=10))
+
+        with self.assertRaises(StockInsuficiente) as ctx:
+            confirm_payment(vencida, provider="testpay")
+        self.assertEqual(ctx.exception.faltantes, {self.producto.id: (8, 2)})
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 10)
+
+        confirm_payment(vigente, provider="testpay")
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 2)
+
+
+class StockConcurrenteTests(TransactionTestCase):
+    """Pagos simultaneos sobre el mismo producto nunca dejan stock negativo."""
+
+    STOCK_INICIAL = 5
+    COMPRADORES = 12
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user("comprador", "c@example.com", "pass1234")
+        cuenta = Cuenta.objects.create(user=self.user, nombre="C", nombre_usuario="c", contrasena="x")
+        self.tienda = Tienda.objects.create(nombre="T", cuenta=cuenta)
+        self.producto = Producto.objects.create(
+            nombre="Flash", precio=Decimal("10.00"), stock=self.STOCK_INICIAL, agendable=False
+        )
+        self.orders = []
+        for _ in range(self.COMPRADORES):
+            order = Order.objects.create(
+                user=self.user, tienda=self.tienda, total=Decimal("10.00"), subtotal=Decimal("10.00"), total_items=1
+            )
+            OrderItem.objects.create(
+                order=order,
+                producto=self.producto,
+                cantidad=1,
+                precio_unitario=Decimal("10.00"),
+                total_linea=Decimal("10.00"),
+            )
+            self.orders.append(order)
+
+    def test_pagos_concurrentes_sin_sobreventa(self):
+        barrera = threading.Barrier(self.COMPRADORES)
+
+        def pagar(order):
+            barrera.wait()
+            try:
+                # SQLite serializa escrituras con "database is locked": se reintenta como lo haria un cliente.
+                for _ in range(500):
+                    try:
+                        # Se relee la orden en cada intento: un COMMIT fallido deja `status` en memoria como pagada.
+                        confirm_payment(Order.objects.get(pk=order.pk), "testpay", f"ext-{order.pk}")
+                        return
+                    except OperationalError:
+                        time.sleep(0.005)
+                    except ValidationError:
+                        return
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=pagar, args=(order,)) for order in self.orders]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.producto.refresh_from_db()
+        pagadas = Order.objects.filter(status=Order.Status.PAGADA).count()
+        self.assertEqual(self.producto.stock, 0)
+        self.assertEqual(pagadas, self.STOCK_INICIAL)
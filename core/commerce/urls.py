@@ -2,6 +2,7 @@ from django.urls import path
 
 from .views import (
     ActiveCartView,
+    CartBatchView,
     CartItemAddView,
     CartItemDetailView,
     CartSummaryView,
@@ -17,6 +18,7 @@ urlpatterns = [
     path("cart/active/", ActiveCartView.as_view(), name="commerce-cart-active"),
     path("cart/items/", CartItemAddView.as_view(), name="commerce-cart-items"),
     path("cart/items/<int:producto_id>/", CartItemDetailView.as_view(), name="commerce-cart-item-detail"),
+    path("cart/batch/", CartBatchView.as_view(), name="commerce-cart-batch"),
     path("cart/summary/", CartSummaryView.as_view(), name="commerce-cart-summary"),
     path("checkout/", CheckoutView.as_view(), name="commerce-checkout"),
     path("orders/", OrderListView.as_view(), name="commerce-orders"),
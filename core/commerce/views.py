@@ -6,18 +6,21 @@ from rest_framework.views import APIView
 from django.utils import timezone
 
 from ecommerce.models import Producto, Tienda
-from common.pagination import get_page_number_pagination
+from common.pagination import get_keyset_pagination, get_page_number_pagination
 
 from .models import Cart, CheckIn, Order
 from .serializers import (
     AddCartItemSerializer,
+    CartBatchSerializer,
     CartSerializer,
     CheckInSerializer,
     OrderSerializer,
     UpdateCartItemSerializer,
 )
+from .cache import cached_summary
 from .services import (
     add_item_to_cart,
+    apply_cart_operations,
     cart_summary,
     checkout_cart,
     confirm_payment,
@@ -31,17 +34,26 @@ def _get_tienda(tienda_id):
     return get_object_or_404(Tienda, pk=tienda_id)
 
 
+def _active_cart_summary(request):
+    """Lectura del carrito activo: con cache caliente no consulta Tienda ni Cart."""
+    tienda_id = request.query_params.get("tienda_id")
+    if not tienda_id:
+        return Response({"detail": "tienda_id es requerido"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        tienda_id = int(tienda_id)
+    except ValueError:
+        return Response({"detail": "tienda_id invalido"}, status=status.HTTP_400_BAD_REQUEST)
+    data = cached_summary(
+        request.user.id, tienda_id, lambda: cart_summary(get_or_create_cart(request.user, _get_tienda(tienda_id)))
+    )
+    return Response(data)
+
+
 class ActiveCartView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        tienda_id = request.query_params.get("tienda_id")
-        if not tienda_id:
-            return Response({"detail": "tienda_id es requerido"}, status=status.HTTP_400_BAD_REQUEST)
-        tienda = _get_tienda(tienda_id)
-        cart = get_or_create_cart(request.user, tienda)
-        data = cart_summary(cart)
-        return Response(data)
+        return _active_cart_summary(request)
 
 
 class CartItemAddView(APIView):
@@ -89,16 +101,27 @@ class CartItemDetailView(APIView):
         return Response(cart_summary(cart), status=status.HTTP_200_OK)
 
 
+class CartBatchView(APIView):
+    """Aplica varias operaciones sobre el carrito en un solo request y devuelve un unico resumen."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tienda = _get_tienda(serializer.validated_data["tienda_id"])
+        try:
+            cart = apply_cart_operations(request.user, tienda, serializer.validated_data["operations"])
+        except ValidationError as exc:
+            return Response({"detail": exc.messages}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(cart_summary(cart))
+
+
 class CartSummaryView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        tienda_id = request.query_params.get("tienda_id")
-        if not tienda_id:
-            return Response({"detail": "tienda_id es requerido"}, status=status.HTTP_400_BAD_REQUEST)
-        tienda = _get_tienda(tienda_id)
-        cart = get_or_create_cart(request.user, tienda)
-        return Response(cart_summary(cart))
+        return _active_cart_summary(request)
 
 
 class CheckoutView(APIView):
@@ -119,10 +142,14 @@ class CheckoutView(APIView):
 class OrderListView(generics.ListAPIView):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = get_page_number_pagination(20)
+    pagination_class = get_keyset_pagination(("-created_at", "-id"), 20)
 
     def get_queryset(self):
-        qs = Order.objects.select_related("tienda", "user").prefetch_related("items").order_by("-created_at")
+        qs = (
+            Order.objects.select_related("tienda", "user")
+            .prefetch_related("items")
+            .order_by("-created_at", "-id")
+        )
         tienda_id = self.request.query_params.get("tienda_id")
         if tienda_id:
             qs = qs.filter(tienda_id=tienda_id)
@@ -0,0 +1,53 @@
+"""
+Conteos estimados para paginación sobre tablas grandes.
+
+En PostgreSQL se usa primero la estimación del planner: `pg_class.reltuples` si el queryset no
+filtra, o las filas estimadas del nodo raíz de `EXPLAIN` si filtra o usa `.distinct()`. Si la
+estimación queda bajo el umbral se hace el COUNT(*) exacto, que ahí es barato y evita mostrar
+totales aproximados en resultados chicos. En otros motores no hay estimación y el conteo es exacto.
+"""
+import json
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.db import connections
+
+
+class Conteo(NamedTuple):
+    total: int
+    exacto: bool
+
+
+def umbral_por_defecto() -> int:
+    return getattr(settings, "CONTEO_ESTIMADO_UMBRAL", 10_000)
+
+
+def estimar_filas(queryset) -> int:
+    """Filas estimadas por el planner de PostgreSQL (-1 si no hay estimación)."""
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return -1
+    queryset = queryset.order_by()
+    if not queryset.query.where and not queryset.query.distinct:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [connection.ops.quote_name(queryset.model._meta.db_table)],
+            )
+            fila = cursor.fetchone()
+        # reltuples vale -1 en tablas nunca analizadas (PostgreSQL 14+): se cae al EXPLAIN.
+        if fila and fila[0] >= 0:
+            return int(fila[0])
+    plan = json.loads(queryset.explain(format="json"))
+    if isinstance(plan, list):
+        plan = plan[0]
+    return int(plan["Plan"]["Plan Rows"])
+
+
+def contar(queryset, umbral: Optional[int] = None) -> Conteo:
+    """COUNT(*) exacto bajo `umbral` filas estimadas; estimación del planner por encima."""
+    umbral = umbral_por_defecto() if umbral is None else umbral
+    estimado = estimar_filas(queryset)
+    if estimado >= umbral:
+        return Conteo(estimado, False)
+    return Conteo(queryset.count(), True)
@@ -1,15 +1,250 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Optional, Sequence
 
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
-def get_page_number_pagination(page_size: int = 20, max_page_size: int = 100):
+from .counts import contar
+
+
+class PaginadorConteoEstimado(Paginator):
+    """Paginator cuyo `count` usa `common.counts.contar`: exacto en resultados chicos, estimado en grandes."""
+
+    count_exacto = True
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return len(self.object_list)
+        conteo = contar(self.object_list)
+        self.count_exacto = conteo.exacto
+        return conteo.total
+
+
+class ConteoEstimadoPagination(PageNumberPagination):
+    """PageNumberPagination con conteo estimado sobre el umbral; la respuesta agrega `count_exacto`."""
+
+    django_paginator_class = PaginadorConteoEstimado
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("count", self.page.paginator.count),
+                    ("count_exacto", self.page.paginator.count_exacto),
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        respuesta = super().get_paginated_response_schema(schema)
+        respuesta["properties"]["count_exacto"] = {"type": "boolean"}
+        return respuesta
+
+
+def get_page_number_pagination(page_size: int = 20, max_page_size: int = 100, conteo_estimado: bool = False):
     """
     Devuelve una clase de paginación PageNumberPagination parametrizable.
     page_size: cantidad de elementos por página por defecto.
     max_page_size: límite superior configurable via query param page_size.
+    conteo_estimado: sobre CONTEO_ESTIMADO_UMBRAL filas usa la estimación del planner en vez de COUNT(*).
     """
     attrs = {
         "page_size": page_size,
         "page_size_query_param": "page_size",
         "max_page_size": max_page_size,
     }
-    return type("DynamicPageNumberPagination", (PageNumberPagination,), attrs)
+    base = ConteoEstimadoPagination if conteo_estimado else PageNumberPagination
+    return type("DynamicPageNumberPagination", (base,), attrs)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por keyset: el cursor guarda los valores del orden (p.ej. created_at e id) del borde
+    de la página y la siguiente se pide con `WHERE (created_at, id) < (...)` en vez de OFFSET, así
+    el costo es el mismo en la página 1 que en la 10.000. Los campos del orden no deben ser nulos
+    y el último debe ser único (normalmente `id`).
+
+    Sin COUNT(*) por defecto; con `?con_total=1` agrega `count` contando a lo sumo `conteo_maximo`
+    filas (`count_exacto=false` si hay más), o con la estimación de `common.counts` si la clase
+    tiene `conteo_estimado`. Si la request trae `page` o el queryset llega con otro
+    orden (p.ej. `?ordering=`), delega en la paginación por número de página.
+    """
+
+    ordering: Sequence[str] = ("-created_at", "-id")
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    conteo_query_param = "con_total"
+    conteo_maximo = 1000
+    conteo_estimado = False
+    fallback_class = PageNumberPagination
+    invalid_cursor_message = "Cursor invalido."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self._fallback = None
+        if "page" in request.query_params or tuple(queryset.query.order_by) != tuple(self.ordering):
+            self._fallback = self.fallback_class()
+            return self._fallback.paginate_queryset(queryset, request, view)
+
+        self.page_size = self.get_page_size(request)
+        self._modelo = queryset.model
+        atras, valores = self.decodificar_cursor(request.query_params.get(self.cursor_query_param))
+        self.conteo = self.contar(queryset) if self._pide_conteo(request) else None
+
+        if valores is not None:
+            queryset = queryset.filter(self._filtro(valores, atras))
+        if atras:
+            queryset = queryset.order_by(*(self._invertir(campo) for campo in self.ordering))
+        resultados = list(queryset[: self.page_size + 1])
+        hay_mas = len(resultados) > self.page_size
+        resultados = resultados[: self.page_size]
+        if atras:
+            resultados.reverse()
+
+        # Al retroceder siempre queda una página siguiente (la de origen); al avanzar, una anterior si hubo cursor.
+        hay_siguiente, hay_anterior = (True, hay_mas) if atras else (hay_mas, valores is not None)
+        self.siguiente = self._valores(resultados[-1]) if resultados and hay_siguiente else None
+        self.anterior = self._valores(resultados[0]) if resultados and hay_anterior else None
+        return resultados
+
+    def get_page_size(self, request) -> int:
+        try:
+            solicitado = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(solicitado, self.max_page_size) if solicitado > 0 else self.page_size
+
+    def _pide_conteo(self, request) -> bool:
+        return request.query_params.get(self.conteo_query_param, "").lower() in ("1", "true")
+
+    def contar(self, queryset) -> dict:
+        """Cuenta hasta `conteo_maximo` (+1 para saber si hay más) sin recorrer la tabla completa."""
+        if self.conteo_estimado:
+            conteo = contar(queryset)
+            return {"count": conteo.total, "count_exacto": conteo.exacto}
+        total = queryset.order_by()[: self.conteo_maximo + 1].count()
+        if total > self.conteo_maximo:
+            return {"count": self.conteo_maximo, "count_exacto": False}
+        return {"count": total, "count_exacto": True}
+
+    # --- cursor ------------------------------------------------------------------
+
+    @staticmethod
+    def _invertir(campo: str) -> str:
+        return campo[1:] if campo.startswith("-") else f"-{campo}"
+
+    def _valores(self, obj) -> list:
+        return [getattr(obj, campo.lstrip("-")) for campo in self.ordering]
+
+    def _filtro(self, valores: list, atras: bool) -> Q:
+        """(a, b) < (x, y) como `a <= x AND (a < x OR b < y)`, para que el índice de `a` acote el rango."""
+        condiciones = []
+        for n, campo in enumerate(self.ordering):
+            nombre = campo.lstrip("-")
+            descendente = campo.startswith("-") != atras
+            iguales = {orden.lstrip("-"): valor for orden, valor in zip(self.ordering[:n], valores)}
+            condiciones.append(Q(**iguales, **{f"{nombre}__{'lt' if descendente else 'gt'}": valores[n]}))
+        filtro = Q()
+        for condicion in condiciones:
+            filtro |= condicion
+        primero = self.ordering[0]
+        cota = "lte" if primero.startswith("-") != atras else "gte"
+        return Q(**{f"{primero.lstrip('-')}__{cota}": valores[0]}) & filtro
+
+    def codificar_cursor(self, valores: list, atras: bool) -> str:
+        serializados = [valor.isoformat() if isinstance(valor, (date, datetime)) else valor for valor in valores]
+        crudo = json.dumps({"a": int(atras), "v": serializados}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip("=")
+
+    def decodificar_cursor(self, cursor: Optional[str]):
+        if not cursor:
+            return False, None
+        try:
+            crudo = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            valores = crudo["v"]
+            if len(valores) != len(self.ordering):
+                raise ValueError
+            return bool(crudo["a"]), self._tipar(valores)
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _tipar(self, valores: list) -> list:
+        tipados = []
+        for campo, valor in zip(self.ordering, valores):
+            try:
+                tipados.append(self._modelo._meta.get_field(campo.lstrip("-")).to_python(valor))
+            except ValidationError:
+                raise ValueError
+        return tipados
+
+    # --- respuesta ---------------------------------------------------------------
+
+    def _url(self, valores: Optional[list], atras: bool) -> Optional[str]:
+        if valores is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.codificar_cursor(valores, atras))
+
+    def get_paginated_response(self, data):
+        if self._fallback is not None:
+            return self._fallback.get_paginated_response(data)
+        cuerpo = OrderedDict(
+            [("next", self._url(self.siguiente, False)), ("previous", self._url(self.anterior, True))]
+        )
+        if self.conteo is not None:
+            cuerpo.update(self.conteo)
+        cuerpo["results"] = data
+        return Response(cuerpo)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "count": {"type": "integer"},
+                "count_exacto": {"type": "boolean"},
+                "results": schema,
+            },
+        }
+
+
+def get_keyset_pagination(
+    ordering: Sequence[str] = ("-created_at", "-id"),
+    page_size: int = 20,
+    max_page_size: int = 100,
+    conteo_maximo: int = 1000,
+    conteo_estimado: bool = False,
+):
+    """
+    Devuelve una clase de paginación por keyset (cursor opaco) sobre `ordering`.
+    ordering: orden estable del queryset de la vista; el último campo debe ser único.
+    conteo_maximo: tope del conteo opcional (`?con_total=1`).
+    conteo_estimado: el conteo opcional (y el de la paginación por página) usa `common.counts.contar`.
+    Las requests con `page` o con otro orden usan PageNumberPagination con el mismo page_size.
+    """
+    attrs = {
+        "ordering": tuple(ordering),
+        "page_size": page_size,
+        "max_page_size": max_page_size,
+        "conteo_maximo": conteo_maximo,
+        "conteo_estimado": conteo_estimado,
+        "fallback_class": get_page_number_pagination(page_size, max_page_size, conteo_estimado),
+    }
+    return type("DynamicKeysetPagination", (KeysetPagination,), attrs)
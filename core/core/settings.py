@@ -74,6 +74,16 @@ DATABASES = {
 }
 # --- FIN ---
 
+# Cache: LocMem por defecto; con REDIS_URL se usa el backend Redis nativo de Django.
+REDIS_URL = os.getenv('REDIS_URL')
+CACHES = {
+    'default': (
+        {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}
+        if REDIS_URL
+        else {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    )
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -140,3 +150,32 @@ EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER", "")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD", "")
 EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "true").lower() == "true"
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", EMAIL_HOST_USER or "noreply@example.com")
+
+# Commerce: minutos que el checkout retiene stock antes de que el sweeper lo libere
+COMMERCE_RESERVATION_TTL = timedelta(minutes=int(os.getenv("COMMERCE_RESERVATION_TTL_MINUTES", 15)))
+
+# Commerce: alias de CACHES y vigencia (segundos) del resumen cacheado del carrito activo
+COMMERCE_CART_CACHE_ALIAS = os.getenv("COMMERCE_CART_CACHE_ALIAS", "default")
+COMMERCE_CART_CACHE_TIMEOUT = int(os.getenv("COMMERCE_CART_CACHE_TIMEOUT", 300))
+
+# Paginacion: desde cuantas filas estimadas las vistas con conteo estimado dejan de hacer COUNT(*) exacto
+CONTEO_ESTIMADO_UMBRAL = int(os.getenv("CONTEO_ESTIMADO_UMBRAL", 10000))
+
+# Ecommerce: vigencia (segundos) del indice de busqueda en memoria (solo motores sin tsvector)
+ECOMMERCE_BUSQUEDA_TTL = int(os.getenv("ECOMMERCE_BUSQUEDA_TTL", 300))
+
+# Ecommerce: indices de trigramas de nombres para /productos/similares/ (tiendas en LRU, segundos de vigencia)
+ECOMMERCE_SIMILARES_MAX_TIENDAS = int(os.getenv("ECOMMERCE_SIMILARES_MAX_TIENDAS", 64))
+ECOMMERCE_SIMILARES_TTL = int(os.getenv("ECOMMERCE_SIMILARES_TTL", 300))
+
+# Agents: alias de CACHES y vigencia (segundos) del contexto de catalogo cacheado por flujo
+AGENTS_CONTEXTO_CACHE_ALIAS = os.getenv("AGENTS_CONTEXTO_CACHE_ALIAS", "default")
+AGENTS_CONTEXTO_TIMEOUT = int(os.getenv("AGENTS_CONTEXTO_TIMEOUT", 3600))
+
+# Scheduling: indice de disponibilidad en memoria (recursos en LRU, dias hacia adelante, segundos de vigencia)
+SCHEDULING_INDICE_MAX_RECURSOS = int(os.getenv("SCHEDULING_INDICE_MAX_RECURSOS", 256))
+SCHEDULING_INDICE_HORIZONTE_DIAS = int(os.getenv("SCHEDULING_INDICE_HORIZONTE_DIAS", 60))
+SCHEDULING_INDICE_TTL = int(os.getenv("SCHEDULING_INDICE_TTL", 300))
+
+# Scheduling: dias hacia adelante que cubre la tabla DisponibilidadDiaria
+SCHEDULING_DISPONIBILIDAD_HORIZONTE_DIAS = int(os.getenv("SCHEDULING_DISPONIBILIDAD_HORIZONTE_DIAS", 90))
@@ -44,6 +44,7 @@ from users.views import CuentaViewSet
 from sales import urls as sales_urls
 from scheduling.views import (
     CitaViewSet,
+    DisponibilidadDiariaViewSet,
     ExcepcionDisponibilidadViewSet,
     ReglaDisponibilidadRecurrenteViewSet,
     RecursoReservableViewSet,
@@ -73,6 +74,7 @@ router.register(r'servicios', ServicioViewSet, basename='servicios')
 router.register(r'reglas-disponibilidad', ReglaDisponibilidadRecurrenteViewSet, basename='reglas-disponibilidad')
 router.register(r'excepciones-disponibilidad', ExcepcionDisponibilidadViewSet, basename='excepciones-disponibilidad')
 router.register(r'citas', CitaViewSet, basename='citas')
+router.register(r'disponibilidad-diaria', DisponibilidadDiariaViewSet, basename='disponibilidad-diaria')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -1,9 +1,10 @@
 from django.contrib import admin
 
-from .models import Agenda, Categoria, CategoriaTienda, Producto, ProductoCategoria, Tienda
+from .models import Agenda, Categoria, CategoriaTienda, Producto, ProductoCategoria, ProductoTienda, Tienda
 admin.site.register(Tienda)
 admin.site.register(Producto)
 admin.site.register(Categoria)
 admin.site.register(CategoriaTienda)
 admin.site.register(ProductoCategoria)
 admin.site.register(Agenda)
+admin.site.register(ProductoTienda)
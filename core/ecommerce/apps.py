@@ -5,3 +5,7 @@ class EcommerceConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "ecommerce"
     verbose_name = "Ecommerce"
+
+    def ready(self):
+        # Import signals para mantener el mapeo producto -> tienda.
+        from . import signals  # noqa: F401
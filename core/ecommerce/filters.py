@@ -1,12 +1,35 @@
 import django_filters
+from django.db.models import Exists, OuterRef
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
 
-from .models import Producto
+from .models import Producto, ProductoCategoria
+from .search import buscar_productos
 
 
 class ProductoFilter(django_filters.FilterSet):
-    categoria_id = django_filters.NumberFilter(field_name="categoria_relaciones__categoria_id")
+    categoria_id = django_filters.NumberFilter(method="filtrar_categoria")
     nombre = django_filters.CharFilter(field_name="nombre", lookup_expr="icontains")
 
+    def filtrar_categoria(self, queryset, name, value):
+        # EXISTS en vez de JOIN: un producto no se repite aunque tenga varias filas en producto_categoria.
+        return queryset.filter(
+            Exists(ProductoCategoria.objects.filter(producto_id=OuterRef("pk"), categoria_id=value))
+        )
+
     class Meta:
         model = Producto
         fields = ["categoria_id", "nombre"]
+
+
+class BusquedaProductoFilter(BaseFilterBackend):
+    """
+    `?search=` sobre nombre, descripcion y descripcion_prompt con `ecommerce.search`: prefijos, sin
+    acentos y ordenado por relevancia (un `?ordering=` explicito lo reemplaza).
+    """
+
+    search_param = api_settings.SEARCH_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        texto = request.query_params.get(self.search_param, "").strip()
+        return buscar_productos(queryset, texto) if texto else queryset
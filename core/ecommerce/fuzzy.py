@@ -0,0 +1,193 @@
+"""
+Busqueda aproximada de productos por nombre (trigramas), pensada para las tool calls de los agentes.
+
+Por tienda se arma en memoria un indice de trigramas de los nombres de sus productos activos
+(via `producto_tienda`), con expulsion LRU (ECOMMERCE_SIMILARES_MAX_TIENDAS) y vigencia
+ECOMMERCE_SIMILARES_TTL. Los trigramas siguen a pg_trgm: cada palabra plegada se rellena con dos
+espacios delante y uno detras, y la similitud es |A ∩ B| / |A ∪ B|. No requiere la extension:
+funciona igual en PostgreSQL y en SQLite, y una tool call no viaja a la base salvo para cargar.
+"""
+import heapq
+import threading
+import time as monotonic_time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Union
+
+from django.conf import settings
+
+from .models import ProductoTienda
+from .search import palabras
+
+
+class Coincidencia(NamedTuple):
+    producto_id: int
+    nombre: str
+    similitud: float
+
+
+def trigramas(texto: Optional[str]) -> FrozenSet[str]:
+    resultado = set()
+    for palabra in palabras(texto):
+        relleno = f"  {palabra} "
+        resultado.update(relleno[n : n + 3] for n in range(len(relleno) - 2))
+    return frozenset(resultado)
+
+
+class IndiceTrigramas:
+    """
+    Trigramas de los nombres de un catalogo. Cada trigrama guarda las posiciones de los productos que
+    lo contienen: como lista si es raro y como mascara de bits (int) si aparece en mas de 1/64 del
+    catalogo, que ademas ocupa menos. La consulta suma las mascaras en contadores por planos de bits
+    (un sumador con acarreo sobre ints grandes, en C), asi el costo no crece con las listas largas.
+    """
+
+    def __init__(self, productos: Iterable[tuple]):
+        self.ids: List[int] = []
+        self.nombres: List[str] = []
+        self.tamanos: List[int] = []
+        postings: Dict[str, List[int]] = {}
+        for producto_id, nombre in productos:
+            posicion = len(self.ids)
+            propios = trigramas(nombre)
+            self.ids.append(producto_id)
+            self.nombres.append(nombre)
+            self.tamanos.append(len(propios))
+            for trigrama in propios:
+                postings.setdefault(trigrama, []).append(posicion)
+        total = len(self.ids)
+        self._postings: Dict[str, Union[int, List[int]]] = {
+            trigrama: self._mascara(posiciones) if len(posiciones) * 64 >= total else posiciones
+            for trigrama, posiciones in postings.items()
+        }
+        self.producto_ids = frozenset(self.ids)
+        self.construido_en = monotonic_time.monotonic()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _mascara(self, posiciones: List[int]) -> int:
+        bits = bytearray(len(self.ids) // 8 + 1)
+        for posicion in posiciones:
+            bits[posicion >> 3] |= 1 << (posicion & 7)
+        return int.from_bytes(bits, "little")
+
+    @staticmethod
+    def _sumar(planos: List[int], mascara: int) -> None:
+        acarreo = mascara
+        for nivel, plano in enumerate(planos):
+            planos[nivel] = plano ^ acarreo
+            acarreo &= plano
+            if not acarreo:
+                return
+        planos.append(acarreo)
+
+    @staticmethod
+    def _al_menos(planos: List[int], minimo: int, todos: int) -> int:
+        """Mascara de las posiciones cuyo contador (en planos de bits) es >= minimo."""
+        mayor, igual = 0, todos
+        for nivel in range(len(planos) - 1, -1, -1):
+            if minimo >> nivel & 1:
+                igual &= planos[nivel]
+            else:
+                mayor |= igual & planos[nivel]
+                igual &= ~planos[nivel]
+        return mayor | igual
+
+    @staticmethod
+    def _posiciones(mascara: int) -> List[int]:
+        bits = bin(mascara)
+        ultimo = len(bits) - 1
+        posiciones = []
+        indice = bits.find("1", 2)
+        while indice != -1:
+            posiciones.append(ultimo - indice)
+            indice = bits.find("1", indice + 1)
+        return posiciones
+
+    def buscar(self, texto: str, k: int = 5, minimo: float = 0.0) -> List[Coincidencia]:
+        consulta = trigramas(texto)
+        planos: List[int] = []
+        for trigrama in consulta:
+            posting = self._postings.get(trigrama)
+            if posting is not None:
+                self._sumar(planos, posting if isinstance(posting, int) else self._mascara(posting))
+        if not planos or k < 1:
+            return []
+
+        # Candidatos por nivel de trigramas compartidos, de mayor a menor. Con `comunes` trigramas en comun la
+        # similitud no pasa de comunes / tamano (nombre sin trigramas propios), asi que se baja de nivel mientras
+        # esa cota alcance al k-esimo mejor; cada nivel se puntua completo porque el tamano del nombre decide.
+        todos = (1 << len(self.ids)) - 1
+        tamano = len(consulta)
+        mejores: List[tuple] = []  # heap de (similitud, -posicion) con el k-esimo mejor en la raiz
+        anteriores = 0
+        for comunes in range(min(tamano, (1 << len(planos)) - 1), 0, -1):
+            cota = comunes / tamano
+            if cota < minimo or (len(mejores) == k and cota < mejores[0][0]):
+                break
+            alcanzan = self._al_menos(planos, comunes, todos)
+            for posicion in self._posiciones(alcanzan & ~anteriores):
+                similitud = comunes / (tamano + self.tamanos[posicion] - comunes)
+                if similitud < minimo:
+                    continue
+                if len(mejores) < k:
+                    heapq.heappush(mejores, (similitud, -posicion))
+                elif (similitud, -posicion) > mejores[0]:
+                    heapq.heapreplace(mejores, (similitud, -posicion))
+            anteriores = alcanzan
+        return [
+            Coincidencia(self.ids[-negativa], self.nombres[-negativa], round(similitud, 4))
+            for similitud, negativa in sorted(mejores, reverse=True)
+        ]
+
+
+class RegistroTrigramas:
+    def __init__(self, max_tiendas: int, ttl: float):
+        self.max_tiendas = max_tiendas
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._indices: "OrderedDict[int, IndiceTrigramas]" = OrderedDict()
+
+    def obtener(self, tienda_id: int) -> IndiceTrigramas:
+        with self._lock:
+            indice = self._indices.get(tienda_id)
+            if indice is not None and monotonic_time.monotonic() - indice.construido_en <= self.ttl:
+                self._indices.move_to_end(tienda_id)
+                return indice
+
+        # La carga se hace fuera del lock para no serializar tiendas distintas.
+        indice = IndiceTrigramas(
+            ProductoTienda.objects.filter(tienda_id=tienda_id, producto__esta_activa=True)
+            .order_by("producto_id")
+            .values_list("producto_id", "producto__nombre")
+        )
+        with self._lock:
+            self._indices[tienda_id] = indice
+            self._indices.move_to_end(tienda_id)
+            while len(self._indices) > self.max_tiendas:
+                self._indices.popitem(last=False)
+        return indice
+
+    def buscar(self, tienda_id: int, texto: str, k: int = 5, minimo: float = 0.0) -> List[Coincidencia]:
+        return self.obtener(tienda_id).buscar(texto, k=k, minimo=minimo)
+
+    def invalidar(self, tienda_ids: Optional[Iterable[int]] = None) -> None:
+        with self._lock:
+            if tienda_ids is None:
+                self._indices.clear()
+                return
+            for tienda_id in tienda_ids:
+                self._indices.pop(tienda_id, None)
+
+    def invalidar_producto(self, producto_id: int) -> None:
+        """Descarta los indices cargados que contienen el producto (sin consultar la base)."""
+        with self._lock:
+            afectadas = [tienda_id for tienda_id, indice in self._indices.items() if producto_id in indice.producto_ids]
+            for tienda_id in afectadas:
+                del self._indices[tienda_id]
+
+
+registro_similares = RegistroTrigramas(
+    max_tiendas=getattr(settings, "ECOMMERCE_SIMILARES_MAX_TIENDAS", 64),
+    ttl=getattr(settings, "ECOMMERCE_SIMILARES_TTL", 300),
+)
@@ -0,0 +1,91 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ecommerce.models import Producto
+from ecommerce.search import buscar_productos, indice, reconstruir_busqueda, usa_postgres
+
+PALABRAS = (
+    "corte cabello barba color tinte manicure pedicure masaje facial limpieza depilacion cejas pestanas "
+    "alisado keratina peinado maquillaje novia unas gel acrilico spa relajante descontracturante piedras "
+    "calientes exfoliacion hidratacion tratamiento capilar nutricion brillo ondas rizos"
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera productos sinteticos (en una transaccion que se revierte) y compara `nombre__icontains` "
+        "contra la busqueda por texto completo: tiempo y calidad del ranking (precision@k)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--productos", type=int, default=50_000)
+        parser.add_argument("--relevantes", type=int, default=20, help="Productos con el termino en el nombre.")
+        parser.add_argument("--semilla", type=int, default=7)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._ejecutar(options)
+                transaction.set_rollback(True)
+        finally:
+            indice.invalidar()
+
+    def _ejecutar(self, options):
+        azar = random.Random(options["semilla"])
+        termino, relevantes = "Depilación", options["relevantes"]
+        objetivo = "depilacion"
+        vocabulario = [palabra for palabra in PALABRAS if palabra != objetivo]
+
+        def frase(n):
+            return " ".join(azar.choice(vocabulario) for _ in range(n))
+
+        productos = [
+            Producto(nombre=f"{termino} {frase(2)}", descripcion=frase(12), precio=Decimal("10.00"))
+            for _ in range(relevantes)
+        ]
+        # Ruido: el termino aparece solo en la descripcion o el prompt (debe quedar por debajo).
+        productos += [
+            Producto(nombre=frase(3), descripcion=f"{frase(6)} depilacion {frase(6)}", precio=Decimal("10.00"))
+            for _ in range(relevantes * 5)
+        ]
+        productos += [
+            Producto(nombre=frase(3), descripcion=frase(12), descripcion_prompt=frase(8), precio=Decimal("10.00"))
+            for _ in range(max(options["productos"] - len(productos), 0))
+        ]
+        Producto.objects.bulk_create(productos, batch_size=2000)
+        esperados = {producto.pk for producto in productos[:relevantes]}
+
+        inicio = time.perf_counter()
+        reconstruir_busqueda()
+        indice.invalidar()
+        self.stdout.write(f"Indexados {len(productos)} productos en {time.perf_counter() - inicio:.1f} s")
+        backend = "tsvector + GIN" if usa_postgres(Producto.objects.all()) else "indice en memoria"
+        self.stdout.write(f"Backend: {backend}")
+
+        # Primera busqueda (incluye la carga perezosa del indice en memoria si aplica).
+        inicio = time.perf_counter()
+        list(buscar_productos(Producto.objects.all(), "depil")[:relevantes])
+        self.stdout.write(f"Primera consulta: {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+        consultas = {
+            "nombre__icontains": lambda: Producto.objects.filter(nombre__icontains="depil").order_by("id"),
+            "texto completo": lambda: buscar_productos(Producto.objects.all(), "depil"),
+        }
+        for nombre, consulta in consultas.items():
+            tiempos = []
+            for _ in range(5):
+                inicio = time.perf_counter()
+                top = list(consulta()[:relevantes].values_list("id", flat=True))
+                tiempos.append(time.perf_counter() - inicio)
+            precision = len(esperados & set(top)) / relevantes
+            self.stdout.write(
+                f"{nombre}: mejor de 5 {min(tiempos) * 1000:.1f} ms | precision@{relevantes} {precision:.2f}"
+            )
+
+        top = buscar_productos(Producto.objects.all(), "DEPILACIÓN")[:relevantes].values_list("id", flat=True)
+        precision = len(esperados & set(top)) / relevantes
+        self.stdout.write(f"Plegado de acentos ('DEPILACIÓN'): precision@{relevantes} {precision:.2f}")
@@ -0,0 +1,90 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ecommerce.fuzzy import registro_similares
+from ecommerce.models import Producto, ProductoTienda, Tienda
+from users.models import Cuenta
+
+from .benchmark_busqueda import PALABRAS
+
+
+def _con_error(azar, nombre):
+    """Un error de tipeo: se borra, duplica o intercambia una letra al azar."""
+    posicion = azar.randrange(1, len(nombre) - 1)
+    operacion = azar.choice(("borrar", "duplicar", "intercambiar"))
+    if operacion == "borrar":
+        return nombre[:posicion] + nombre[posicion + 1 :]
+    if operacion == "duplicar":
+        return nombre[:posicion] + nombre[posicion] + nombre[posicion:]
+    return nombre[: posicion - 1] + nombre[posicion] + nombre[posicion - 1] + nombre[posicion + 1 :]
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera una tienda con productos sinteticos (en una transaccion que se revierte) y mide la "
+        "busqueda por similitud de nombres: carga del indice, latencia p50/p95 y acierto top-1/top-k "
+        "con consultas con errores de tipeo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--productos", type=int, default=50_000)
+        parser.add_argument("--consultas", type=int, default=200)
+        parser.add_argument("--k", type=int, default=5)
+        parser.add_argument("--semilla", type=int, default=7)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._ejecutar(options)
+                transaction.set_rollback(True)
+        finally:
+            registro_similares.invalidar()
+
+    def _ejecutar(self, options):
+        azar = random.Random(options["semilla"])
+        usuario = get_user_model().objects.create_user(username="benchmark-similares", password="x")
+        cuenta = Cuenta.objects.create(
+            user=usuario, nombre="Benchmark", nombre_usuario="benchmark-similares", contrasena="x"
+        )
+        tienda = Tienda.objects.create(nombre="Benchmark", cuenta=cuenta)
+
+        nombres = set()
+        while len(nombres) < options["productos"]:
+            nombres.add(" ".join(azar.choice(PALABRAS) for _ in range(azar.randint(2, 4))).capitalize())
+        productos = Producto.objects.bulk_create(
+            [Producto(nombre=nombre, precio=Decimal("10.00")) for nombre in nombres], batch_size=2000
+        )
+        ProductoTienda.objects.bulk_create(
+            [ProductoTienda(producto_id=producto.pk, tienda_id=tienda.pk) for producto in productos], batch_size=2000
+        )
+
+        inicio = time.perf_counter()
+        indice = registro_similares.obtener(tienda.pk)
+        self.stdout.write(f"Indice de {len(indice)} productos cargado en {time.perf_counter() - inicio:.2f} s")
+
+        k = options["k"]
+        tiempos, top1, topk = [], 0, 0
+        for producto in azar.sample(productos, min(options["consultas"], len(productos))):
+            consulta = _con_error(azar, producto.nombre)
+            inicio = time.perf_counter()
+            coincidencias = registro_similares.buscar(tienda.pk, consulta, k=k)
+            tiempos.append(time.perf_counter() - inicio)
+            similitudes = {coincidencia.producto_id: coincidencia.similitud for coincidencia in coincidencias}
+            # Los trigramas no ven el orden de las palabras: un empate con el primero cuenta como acierto.
+            top1 += bool(coincidencias) and similitudes.get(producto.pk) == coincidencias[0].similitud
+            topk += producto.pk in similitudes
+
+        tiempos.sort()
+        p95 = tiempos[int(len(tiempos) * 0.95) - 1]
+        self.stdout.write(
+            f"Consultas: {len(tiempos)} | p50 {statistics.median(tiempos) * 1000:.2f} ms | p95 {p95 * 1000:.2f} ms"
+        )
+        self.stdout.write(
+            f"Acierto top-1 (con empates) {top1 / len(tiempos):.2f} | top-{k} {topk / len(tiempos):.2f}"
+        )
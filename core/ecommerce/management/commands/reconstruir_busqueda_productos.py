@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce.search import reconstruir_busqueda
+
+
+class Command(BaseCommand):
+    help = "Recalcula el texto de busqueda (y el tsvector en PostgreSQL) de todos los productos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = reconstruir_busqueda(options["lote"])
+        self.stdout.write(self.style.SUCCESS(f"Productos indexados: {total}"))
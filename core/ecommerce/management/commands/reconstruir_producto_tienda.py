@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce.services import reconstruir_producto_tienda
+
+
+class Command(BaseCommand):
+    help = "Recalcula la tabla producto_tienda desde producto_categoria y categoria_tienda."
+
+    def handle(self, *args, **options):
+        filas = reconstruir_producto_tienda()
+        self.stdout.write(self.style.SUCCESS(f"Filas producto_tienda: {filas}"))
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def poblar_producto_tienda(apps, schema_editor):
+    ProductoCategoria = apps.get_model("ecommerce", "ProductoCategoria")
+    ProductoTienda = apps.get_model("ecommerce", "ProductoTienda")
+    pares = set(
+        ProductoCategoria.objects.filter(producto__isnull=False, categoria__tiendas__tienda__isnull=False).values_list(
+            "producto_id", "categoria__tiendas__tienda_id"
+        )
+    )
+    ProductoTienda.objects.bulk_create(
+        [ProductoTienda(producto_id=producto_id, tienda_id=tienda_id) for producto_id, tienda_id in pares],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoTienda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tiendas_mapeadas', to='ecommerce.producto')),
+                ('tienda', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='productos_mapeados', to='ecommerce.tienda')),
+            ],
+            options={
+                'db_table': 'producto_tienda',
+                'indexes': [models.Index(fields=['tienda', 'producto'], name='producto_ti_tienda__dc8632_idx')],
+                'constraints': [models.UniqueConstraint(fields=('producto', 'tienda'), name='uniq_producto_tienda')],
+            },
+        ),
+        migrations.RunPython(poblar_producto_tienda, migrations.RunPython.noop),
+    ]
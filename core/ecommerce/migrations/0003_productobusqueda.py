@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:42
+
+import unicodedata
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+
+
+def _plegar(texto):
+    descompuesto = unicodedata.normalize("NFKD", texto or "")
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def poblar_busqueda(apps, schema_editor):
+    Producto = apps.get_model("ecommerce", "Producto")
+    ProductoBusqueda = apps.get_model("ecommerce", "ProductoBusqueda")
+    ProductoBusqueda.objects.bulk_create(
+        [
+            ProductoBusqueda(
+                producto_id=pk,
+                nombre=_plegar(nombre),
+                descripcion=_plegar(descripcion),
+                descripcion_prompt=_plegar(descripcion_prompt),
+            )
+            for pk, nombre, descripcion, descripcion_prompt in Producto.objects.values_list(
+                "id", "nombre", "descripcion", "descripcion_prompt"
+            )
+        ],
+        batch_size=1000,
+    )
+    if schema_editor.connection.vendor == "postgresql":
+        ProductoBusqueda.objects.update(
+            vector=SearchVector("nombre", weight="A", config="spanish")
+            + SearchVector("descripcion", weight="B", config="spanish")
+            + SearchVector("descripcion_prompt", weight="C", config="spanish")
+        )
+
+
+def crear_indice_gin(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS producto_busqueda_vector_gin ON producto_busqueda USING gin (vector)"
+        )
+
+
+def borrar_indice_gin(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS producto_busqueda_vector_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0002_productotienda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoBusqueda',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='busqueda', serialize=False, to='ecommerce.producto')),
+                ('nombre', models.TextField(blank=True, default='')),
+                ('descripcion', models.TextField(blank=True, default='')),
+                ('descripcion_prompt', models.TextField(blank=True, default='')),
+                ('vector', django.contrib.postgres.search.SearchVectorField(blank=True, null=True)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'producto_busqueda',
+            },
+        ),
+        # GIN solo existe en PostgreSQL; en otros motores la busqueda usa el indice en memoria.
+        migrations.RunPython(crear_indice_gin, borrar_indice_gin),
+        migrations.RunPython(poblar_busqueda, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,4 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
 
@@ -76,6 +77,44 @@ class ProductoCategoria(models.Model):
         db_table = "producto_categoria"
 
 
+class ProductoTienda(models.Model):
+    """
+    Tiendas alcanzables por cada producto (producto -> categoria -> categoria_tienda -> tienda),
+    desnormalizado. Lo mantienen las señales de ProductoCategoria y CategoriaTienda
+    (`ecommerce.signals`); `manage.py reconstruir_producto_tienda` lo recalcula completo.
+    """
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="tiendas_mapeadas")
+    tienda = models.ForeignKey(Tienda, on_delete=models.CASCADE, related_name="productos_mapeados")
+
+    class Meta:
+        db_table = "producto_tienda"
+        constraints = [
+            models.UniqueConstraint(fields=["producto", "tienda"], name="uniq_producto_tienda"),
+        ]
+        indexes = [
+            models.Index(fields=["tienda", "producto"]),
+        ]
+
+
+class ProductoBusqueda(models.Model):
+    """
+    Texto de busqueda precalculado por producto (`ecommerce.search`): nombre, descripcion y
+    descripcion_prompt en minusculas y sin acentos, y en PostgreSQL el `tsvector` ponderado
+    (A/B/C) con indice GIN. Se actualiza al guardar cada Producto.
+    """
+
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, primary_key=True, related_name="busqueda")
+    nombre = models.TextField(blank=True, default="")
+    descripcion = models.TextField(blank=True, default="")
+    descripcion_prompt = models.TextField(blank=True, default="")
+    vector = SearchVectorField(null=True, blank=True)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "producto_busqueda"
+
+
 class Agenda(models.Model):
     id = models.AutoField(primary_key=True)
     inicio = models.DateTimeField()
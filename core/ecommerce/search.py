@@ -0,0 +1,258 @@
+"""
+Busqueda de productos por texto completo sobre nombre, descripcion y descripcion_prompt.
+
+El texto se pliega (minusculas, sin acentos) y se guarda en `ProductoBusqueda` al guardar cada
+Producto. En PostgreSQL se consulta el `tsvector` ponderado (nombre A, descripcion B, prompt C)
+con indice GIN: `to_tsquery('spanish', 'termino:* & ...')` y `ts_rank`. En otros motores se usa
+un indice invertido en memoria por proceso (BM25 con los mismos pesos por campo), construido de
+forma perezosa desde `ProductoBusqueda` y actualizado en el proceso que escribe;
+ECOMMERCE_BUSQUEDA_TTL (segundos) acota cuanto puede atrasarse frente a otros procesos.
+En ambos casos cada termino de la consulta es un prefijo y todos deben aparecer.
+"""
+import math
+import re
+import threading
+import time as monotonic_time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections, transaction
+from django.db.models import Case, F, FloatField, QuerySet, Value, When
+
+from .models import Producto, ProductoBusqueda
+
+CAMPOS = ("nombre", "descripcion", "descripcion_prompt")
+PESOS = {"nombre": 1.0, "descripcion": 0.4, "descripcion_prompt": 0.2}
+CONFIG = "spanish"
+MAX_RESULTADOS_EN_MEMORIA = 1000
+
+VECTOR = (
+    SearchVector("nombre", weight="A", config=CONFIG)
+    + SearchVector("descripcion", weight="B", config=CONFIG)
+    + SearchVector("descripcion_prompt", weight="C", config=CONFIG)
+)
+
+_PALABRA = re.compile(r"[a-z0-9]+")
+
+
+def plegar(texto: Optional[str]) -> str:
+    """Minusculas y sin marcas diacriticas: 'Depilación' -> 'depilacion'."""
+    descompuesto = unicodedata.normalize("NFKD", texto or "")
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def _raiz(palabra: str) -> str:
+    # Plural espanol basico: 'cortes' -> 'corte', 'unas' -> 'una'. El resto lo cubre el prefijo.
+    if len(palabra) > 4 and palabra.endswith("es"):
+        return palabra[:-2]
+    if len(palabra) > 3 and palabra.endswith("s"):
+        return palabra[:-1]
+    return palabra
+
+
+def palabras(texto: Optional[str]) -> List[str]:
+    """Palabras plegadas del texto; tokenizador compartido por la busqueda y los trigramas."""
+    return _PALABRA.findall(plegar(texto))
+
+
+def terminos(texto: Optional[str]) -> List[str]:
+    return [_raiz(palabra) for palabra in palabras(texto)]
+
+
+def usa_postgres(queryset: QuerySet) -> bool:
+    return connections[queryset.db].vendor == "postgresql"
+
+
+# --- indexacion ----------------------------------------------------------------------
+
+
+def _fila(producto: Producto) -> ProductoBusqueda:
+    return ProductoBusqueda(producto_id=producto.pk, **{campo: plegar(getattr(producto, campo)) for campo in CAMPOS})
+
+
+def _guardar_filas(filas: List[ProductoBusqueda]) -> int:
+    if filas:
+        ProductoBusqueda.objects.bulk_create(
+            filas, update_conflicts=True, unique_fields=["producto"], update_fields=[*CAMPOS, "actualizado_en"]
+        )
+    return len(filas)
+
+
+def indexar_productos(productos: Iterable[Producto]) -> None:
+    """Upsert de las filas de busqueda (y del tsvector en PostgreSQL) de esos productos."""
+    filas = [_fila(producto) for producto in productos]
+    if not _guardar_filas(filas):
+        return
+    pks = [fila.producto_id for fila in filas]
+    if usa_postgres(ProductoBusqueda.objects.all()):
+        ProductoBusqueda.objects.filter(pk__in=pks).update(vector=VECTOR)
+    transaction.on_commit(lambda: indice.actualizar(filas))
+
+
+@transaction.atomic
+def reconstruir_busqueda(lote: int = 1000) -> int:
+    """Recalcula ProductoBusqueda para todo el catalogo; devuelve la cantidad de productos."""
+    total = 0
+    filas = []
+    for producto in Producto.objects.only("id", *CAMPOS).iterator(chunk_size=lote):
+        filas.append(_fila(producto))
+        if len(filas) == lote:
+            total += _guardar_filas(filas)
+            filas = []
+    total += _guardar_filas(filas)
+    if usa_postgres(ProductoBusqueda.objects.all()):
+        ProductoBusqueda.objects.update(vector=VECTOR)
+    transaction.on_commit(indice.invalidar)
+    return total
+
+
+# --- indice invertido en memoria -----------------------------------------------------
+
+
+class IndiceBusqueda:
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._construido_en: Optional[float] = None
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._vocabulario: List[str] = []
+        self._terminos_por_doc: Dict[int, set] = {}
+        self._largo: Dict[int, float] = {}
+
+    def _vigente(self) -> bool:
+        return self._construido_en is not None and monotonic_time.monotonic() - self._construido_en <= self.ttl
+
+    def _cargar(self) -> None:
+        filas = list(ProductoBusqueda.objects.values_list("producto_id", *CAMPOS))
+        with self._lock:
+            self._postings, self._vocabulario, self._terminos_por_doc, self._largo = {}, [], {}, {}
+            for pk, *textos in filas:
+                self._agregar(pk, dict(zip(CAMPOS, textos)))
+            self._vocabulario.sort()
+            self._construido_en = monotonic_time.monotonic()
+
+    def _agregar(self, pk: int, textos: Dict[str, str], ordenado: bool = False) -> None:
+        frecuencias: Dict[str, float] = defaultdict(float)
+        largo = 0.0
+        for campo, texto in textos.items():
+            palabras = terminos(texto)
+            largo += PESOS[campo] * len(palabras)
+            for palabra in palabras:
+                frecuencias[palabra] += PESOS[campo]
+        for termino, frecuencia in frecuencias.items():
+            postings = self._postings.get(termino)
+            if postings is None:
+                postings = self._postings[termino] = {}
+                if ordenado:
+                    insort(self._vocabulario, termino)
+                else:
+                    self._vocabulario.append(termino)
+            postings[pk] = frecuencia
+        self._terminos_por_doc[pk] = set(frecuencias)
+        self._largo[pk] = largo
+
+    def _quitar(self, pk: int) -> None:
+        for termino in self._terminos_por_doc.pop(pk, ()):
+            postings = self._postings[termino]
+            postings.pop(pk, None)
+            if not postings:
+                del self._postings[termino]
+                del self._vocabulario[bisect_left(self._vocabulario, termino)]
+        self._largo.pop(pk, None)
+
+    def actualizar(self, filas: Iterable[ProductoBusqueda]) -> None:
+        with self._lock:
+            if self._construido_en is None:
+                return
+            for fila in filas:
+                self._quitar(fila.producto_id)
+                self._agregar(fila.producto_id, {campo: getattr(fila, campo) for campo in CAMPOS}, ordenado=True)
+
+    def eliminar(self, pk: int) -> None:
+        with self._lock:
+            self._quitar(pk)
+
+    def invalidar(self) -> None:
+        with self._lock:
+            self._construido_en = None
+
+    def _expandir(self, prefijo: str) -> List[str]:
+        inicio = bisect_left(self._vocabulario, prefijo)
+        fin = bisect_left(self._vocabulario, prefijo + "\uffff", inicio)
+        return self._vocabulario[inicio:fin]
+
+    def buscar(self, texto: str, limite: Optional[int] = None) -> List[Tuple[int, float]]:
+        """[(producto_id, puntaje)] ordenado por puntaje BM25; todos los terminos (como prefijo) deben aparecer."""
+        consulta = terminos(texto)
+        if not consulta:
+            return []
+        if not self._vigente():
+            self._cargar()
+        with self._lock:
+            documentos = len(self._largo) or 1
+            promedio = sum(self._largo.values()) / documentos or 1.0
+            puntajes: Optional[Dict[int, float]] = None
+            for termino in dict.fromkeys(consulta):
+                # Por documento, la mejor expansion del prefijo (no la suma: 'corte' no cuenta dos veces).
+                mejores: Dict[int, float] = {}
+                for expandido in self._expandir(termino):
+                    postings = self._postings[expandido]
+                    idf = math.log(1 + (documentos - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for pk, frecuencia in postings.items():
+                        norma = self.K1 * (1 - self.B + self.B * self._largo[pk] / promedio)
+                        valor = idf * frecuencia * (self.K1 + 1) / (frecuencia + norma)
+                        if valor > mejores.get(pk, 0.0):
+                            mejores[pk] = valor
+                if puntajes is None:
+                    puntajes = mejores
+                else:
+                    puntajes = {pk: puntaje + mejores[pk] for pk, puntaje in puntajes.items() if pk in mejores}
+                if not puntajes:
+                    return []
+        return sorted(puntajes.items(), key=lambda par: (-par[1], par[0]))[:limite]
+
+
+indice = IndiceBusqueda(ttl=getattr(settings, "ECOMMERCE_BUSQUEDA_TTL", 300))
+
+
+# --- consulta --------------------------------------------------------------------------
+
+
+def buscar_productos(queryset: QuerySet, texto: str) -> QuerySet:
+    """
+    Filtra `queryset` (de Producto) a los que coinciden con `texto`, anotados con `relevancia` y
+    ordenados de mayor a menor. En memoria se consideran los MAX_RESULTADOS_EN_MEMORIA mejores de
+    los que `queryset` incluye: el recorte se hace despues de aplicar su alcance (tiendas, filtros).
+    """
+    consulta = terminos(texto)
+    if not consulta:
+        return queryset
+    if usa_postgres(queryset):
+        tsquery = SearchQuery(" & ".join(f"{termino}:*" for termino in consulta), search_type="raw", config=CONFIG)
+        return (
+            queryset.filter(busqueda__vector=tsquery)
+            .annotate(relevancia=SearchRank(F("busqueda__vector"), tsquery))
+            .order_by("-relevancia", "id")
+        )
+    resultados = indice.buscar(texto)
+    if len(resultados) > MAX_RESULTADOS_EN_MEMORIA:
+        # Una consulta mas solo con muchas coincidencias: los ids del alcance antes de recortar.
+        permitidos = set(queryset.order_by().values_list("pk", flat=True))
+        resultados = [par for par in resultados if par[0] in permitidos][:MAX_RESULTADOS_EN_MEMORIA]
+    if not resultados:
+        return queryset.none()
+    relevancia = Case(
+        *(When(pk=pk, then=Value(puntaje)) for pk, puntaje in resultados), output_field=FloatField()
+    )
+    return (
+        queryset.filter(pk__in=[pk for pk, _ in resultados])
+        .annotate(relevancia=relevancia)
+        .order_by("-relevancia", "id")
+    )
@@ -38,3 +38,15 @@ class AgendaSerializer(serializers.ModelSerializer):
         model = Agenda
         fields = "__all__"
 
+
+class SimilaresQuerySerializer(serializers.Serializer):
+    tienda_id = serializers.IntegerField()
+    q = serializers.CharField(max_length=200)
+    k = serializers.IntegerField(min_value=1, max_value=50, default=5)
+    minimo = serializers.FloatField(min_value=0.0, max_value=1.0, default=0.1)
+
+
+class SimilarSerializer(serializers.Serializer):
+    id = serializers.IntegerField(source="producto_id")
+    nombre = serializers.CharField()
+    similitud = serializers.FloatField()
@@ -0,0 +1,97 @@
+from typing import Dict, Iterable, Optional
+
+from django.db import transaction
+
+from .fuzzy import registro_similares
+from .models import ProductoCategoria, ProductoTienda, Tienda
+
+
+# Campos de Producto cuyo valor al cargar la instancia se recuerda (post_init) para detectar cambios.
+CAMPOS_PRODUCTO_RECORDADOS = ("nombre", "precio", "esta_activa")
+
+
+def producto_cambio(producto, campos: Iterable[str]) -> bool:
+    """Si alguno de `campos` difiere del valor con que se cargo la instancia, sin consultar la base."""
+    cargados = getattr(producto, "_valores_cargados", {})
+    return any(producto.__dict__.get(campo) != cargados.get(campo) for campo in campos)
+
+
+def _pares_esperados(producto_ids=None) -> set:
+    qs = ProductoCategoria.objects.filter(producto__isnull=False, categoria__tiendas__tienda__isnull=False)
+    if producto_ids is not None:
+        qs = qs.filter(producto_id__in=producto_ids)
+    return set(qs.values_list("producto_id", "categoria__tiendas__tienda_id"))
+
+
+@transaction.atomic
+def sincronizar_producto_tienda(producto_ids: Iterable[int]) -> None:
+    """
+    Recalcula las filas de ProductoTienda de esos productos: borra las que sobran e inserta las que
+    faltan. Al confirmar, descarta los indices de similares de las tiendas cuyo catalogo cambio.
+    """
+    producto_ids = {pk for pk in producto_ids if pk is not None}
+    if not producto_ids:
+        return
+    esperados = _pares_esperados(producto_ids)
+    actuales = dict(
+        ((producto_id, tienda_id), pk)
+        for pk, producto_id, tienda_id in ProductoTienda.objects.filter(producto_id__in=producto_ids).values_list(
+            "id", "producto_id", "tienda_id"
+        )
+    )
+    sobrantes = {par: pk for par, pk in actuales.items() if par not in esperados}
+    if sobrantes:
+        ProductoTienda.objects.filter(pk__in=list(sobrantes.values())).delete()
+    faltantes = esperados - actuales.keys()
+    if faltantes:
+        ProductoTienda.objects.bulk_create(
+            [ProductoTienda(producto_id=producto_id, tienda_id=tienda_id) for producto_id, tienda_id in faltantes],
+            ignore_conflicts=True,
+        )
+    tiendas = {tienda_id for _, tienda_id in (*sobrantes, *faltantes)}
+    if tiendas:
+        transaction.on_commit(lambda: registro_similares.invalidar(tiendas))
+
+
+def productos_de_categorias(categoria_ids: Iterable[int]) -> set:
+    categoria_ids = {pk for pk in categoria_ids if pk is not None}
+    if not categoria_ids:
+        return set()
+    return set(
+        ProductoCategoria.objects.filter(categoria_id__in=categoria_ids, producto__isnull=False).values_list(
+            "producto_id", flat=True
+        )
+    )
+
+
+@transaction.atomic
+def reconstruir_producto_tienda() -> int:
+    """Recalcula ProductoTienda completo desde producto_categoria y categoria_tienda; devuelve las filas escritas."""
+    ProductoTienda.objects.all().delete()
+    filas = ProductoTienda.objects.bulk_create(
+        [ProductoTienda(producto_id=producto_id, tienda_id=tienda_id) for producto_id, tienda_id in _pares_esperados()],
+        batch_size=1000,
+    )
+    transaction.on_commit(registro_similares.invalidar)
+    return len(filas)
+
+
+def tienda_de_producto(producto_id: int) -> Optional[Tienda]:
+    """Tienda de un producto (la de menor id si hay varias) con una lectura del indice de producto_tienda."""
+    fila = (
+        ProductoTienda.objects.filter(producto_id=producto_id).select_related("tienda").order_by("tienda_id").first()
+    )
+    return fila.tienda if fila else None
+
+
+def tiendas_de_productos(producto_ids: Iterable[int]) -> Dict[int, Optional[int]]:
+    """{producto_id: tienda_id o None} para varios productos en una consulta (misma regla que tienda_de_producto)."""
+    producto_ids = set(producto_ids)
+    tiendas: Dict[int, Optional[int]] = dict.fromkeys(producto_ids)
+    for producto_id, tienda_id in (
+        ProductoTienda.objects.filter(producto_id__in=producto_ids)
+        .order_by("-tienda_id")
+        .values_list("producto_id", "tienda_id")
+    ):
+        tiendas[producto_id] = tienda_id
+    return tiendas
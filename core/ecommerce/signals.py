@@ -0,0 +1,73 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from .fuzzy import registro_similares
+from .models import CategoriaTienda, Producto, ProductoCategoria, ProductoTienda
+from .search import indexar_productos, indice
+from .services import (
+    CAMPOS_PRODUCTO_RECORDADOS,
+    producto_cambio,
+    productos_de_categorias,
+    sincronizar_producto_tienda,
+)
+
+
+def _anterior(sender, instance, campos):
+    if instance.pk is None:
+        return None
+    return sender.objects.filter(pk=instance.pk).values_list(*campos).first()
+
+
+@receiver(pre_save, sender=ProductoCategoria)
+@receiver(pre_save, sender=CategoriaTienda)
+def recordar_relacion_anterior(sender, instance, **kwargs):
+    campos = ("producto_id", "categoria_id") if sender is ProductoCategoria else ("categoria_id", "tienda_id")
+    instance._relacion_anterior = _anterior(sender, instance, campos)
+
+
+@receiver(post_save, sender=ProductoCategoria)
+@receiver(post_delete, sender=ProductoCategoria)
+def mapear_producto_categoria(sender, instance: ProductoCategoria, **kwargs):
+    productos = {instance.producto_id}
+    anterior = getattr(instance, "_relacion_anterior", None)
+    if anterior:
+        productos.add(anterior[0])
+    sincronizar_producto_tienda(productos)
+
+
+@receiver(post_save, sender=CategoriaTienda)
+@receiver(post_delete, sender=CategoriaTienda)
+def mapear_categoria_tienda(sender, instance: CategoriaTienda, **kwargs):
+    categorias = {instance.categoria_id}
+    anterior = getattr(instance, "_relacion_anterior", None)
+    if anterior:
+        categorias.add(anterior[0])
+    sincronizar_producto_tienda(productos_de_categorias(categorias))
+
+
+@receiver(post_init, sender=Producto)
+def recordar_producto_cargado(sender, instance: Producto, **kwargs):
+    # Lee __dict__ para no disparar la carga de campos diferidos.
+    instance._valores_cargados = {campo: instance.__dict__.get(campo) for campo in CAMPOS_PRODUCTO_RECORDADOS}
+
+
+@receiver(post_save, sender=Producto)
+def indexar_busqueda_producto(sender, instance: Producto, created=False, **kwargs):
+    indexar_productos([instance])
+    # Los indices de similares solo dependen del nombre y de si esta activo; un producto nuevo todavia no
+    # tiene tiendas (las suma sincronizar_producto_tienda). Via el mapeo: uno que se reactiva no esta
+    # en los indices cargados.
+    if created or not producto_cambio(instance, ("nombre", "esta_activa")):
+        return
+    tiendas = list(ProductoTienda.objects.filter(producto_id=instance.pk).values_list("tienda_id", flat=True))
+    if tiendas:
+        transaction.on_commit(lambda: registro_similares.invalidar(tiendas))
+
+
+@receiver(post_delete, sender=Producto)
+def quitar_busqueda_producto(sender, instance: Producto, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: indice.eliminar(pk))
+    # El mapeo ya se borro en cascada: se buscan las tiendas en los indices cargados.
+    transaction.on_commit(lambda: registro_similares.invalidar_producto(pk))
@@ -0,0 +1,56 @@
+"""
+Alcance por tenant (cuenta -> tiendas -> categorias) de la request.
+
+Los ids de tiendas y categorias accesibles se resuelven con una consulta y se memoizan en la
+request, asi las vistas filtran con `IN (...)` / `EXISTS` (productos via `producto_tienda`) en vez
+de unir producto -> producto_categoria -> categoria -> categoria_tienda -> tienda -> cuenta y
+deduplicar con DISTINCT.
+"""
+from functools import cached_property
+from typing import FrozenSet
+
+from django.db.models import Exists, OuterRef, QuerySet
+
+from .models import ProductoTienda, Tienda
+
+
+class AlcanceTenant:
+    def __init__(self, user):
+        self.user = user
+        self.es_global = bool(user.is_staff)
+
+    @cached_property
+    def _filas(self):
+        return list(Tienda.objects.filter(cuenta__user=self.user).values_list("id", "categorias__categoria_id"))
+
+    @cached_property
+    def tienda_ids(self) -> FrozenSet[int]:
+        return frozenset(tienda_id for tienda_id, _ in self._filas)
+
+    @cached_property
+    def categoria_ids(self) -> FrozenSet[int]:
+        return frozenset(categoria_id for _, categoria_id in self._filas if categoria_id is not None)
+
+    def productos(self, qs: QuerySet, campo: str = "pk") -> QuerySet:
+        """Filtra `qs` a filas cuyo producto (`campo`) llega a alguna tienda accesible (mapeo `producto_tienda`)."""
+        if self.es_global:
+            return qs
+        if not self.tienda_ids:
+            return qs.none()
+        return qs.filter(
+            Exists(ProductoTienda.objects.filter(producto_id=OuterRef(campo), tienda_id__in=self.tienda_ids))
+        )
+
+    def categorias(self, qs: QuerySet, campo: str = "pk") -> QuerySet:
+        if self.es_global:
+            return qs
+        return qs.filter(**{f"{campo}__in": self.categoria_ids}) if self.categoria_ids else qs.none()
+
+
+def alcance_de(request) -> AlcanceTenant:
+    """AlcanceTenant del usuario de la request, construido una vez por request."""
+    request = getattr(request, "_request", request)
+    alcance = getattr(request, "_alcance_tenant", None)
+    if alcance is None or alcance.user != request.user:
+        alcance = request._alcance_tenant = AlcanceTenant(request.user)
+    return alcance
@@ -0,0 +1,176 @@
+import random
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from commerce.models import CartItem
+from commerce.services import checkout_cart, confirm_payment, get_or_create_cart
+from ecommerce.fuzzy import IndiceTrigramas, registro_similares, trigramas
+from ecommerce.management.commands.benchmark_busqueda import PALABRAS
+from ecommerce.models import Categoria, CategoriaTienda, Producto, ProductoCategoria, ProductoTienda, Tienda
+from ecommerce.search import MAX_RESULTADOS_EN_MEMORIA, buscar_productos, indexar_productos
+from ecommerce.search import indice as indice_busqueda
+from sales.services import guess_tienda_from_producto
+from users.models import Cuenta
+
+
+class CatalogoTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "pass1234")
+        self.client.force_authenticate(self.user)
+        self.cuenta = Cuenta.objects.create(
+            user=self.user, nombre="Cuenta Test", nombre_usuario="ctest", contrasena="x"
+        )
+        self.tienda = Tienda.objects.create(nombre="Tienda Test", cuenta=self.cuenta)
+        self.producto = Producto.objects.create(
+            nombre="Producto Test", precio=Decimal("20.00"), stock=10, agendable=True
+        )
+
+    def test_conteo_estimado_informa_si_es_exacto(self):
+        resp = self.client.get(reverse("productos-list"))
+        self.assertEqual((resp.data["count"], resp.data["count_exacto"]), (1, True))
+        resp = self.client.get(reverse("productos-total"), {"estimado": 1})
+        self.assertEqual(resp.data, {"total": 1, "exacto": True})
+
+        CartItem.objects.create(
+            cart=get_or_create_cart(self.user, self.tienda),
+            producto=self.producto,
+            cantidad=1,
+            precio_unitario=self.producto.precio,
+        )
+        confirm_payment(checkout_cart(self.user, self.tienda), "testpay")
+        resp = self.client.get(reverse("sales-events"), {"con_total": 1})
+        self.assertEqual((resp.data["count"], resp.data["count_exacto"]), (1, True))
+        resp = self.client.get(reverse("sales-events"), {"page": 1})
+        self.assertEqual((resp.data["count"], resp.data["count_exacto"]), (1, True))
+
+    def test_productos_se_limitan_a_categorias_de_las_tiendas_del_usuario(self):
+        User = get_user_model()
+        vendedor = User.objects.create_user("vendedor", "vendedor@example.com", "pass1234")
+        cuenta = Cuenta.objects.create(user=vendedor, nombre="V", nombre_usuario="v")
+        tienda = Tienda.objects.create(nombre="Propia", cuenta=cuenta)
+        categorias = Categoria.objects.bulk_create([Categoria(nombre=nombre) for nombre in "ABC"])
+        for categoria in categorias[:2]:
+            CategoriaTienda.objects.create(categoria=categoria, tienda=tienda)
+        propio = Producto.objects.create(nombre="Propio", precio=Decimal("1.00"))
+        for producto, categoria in ((propio, categorias[0]), (propio, categorias[1]), (self.producto, categorias[2])):
+            ProductoCategoria.objects.create(producto=producto, categoria=categoria)
+        self.assertEqual(list(ProductoTienda.objects.values_list("producto_id", "tienda_id")), [(propio.id, tienda.id)])
+        with self.assertNumQueries(1):
+            self.assertEqual(guess_tienda_from_producto(propio), tienda)
+
+        self.client.force_authenticate(vendedor)
+        with self.assertNumQueries(3):
+            resp = self.client.get(reverse("productos-list"))
+        self.assertEqual([p["id"] for p in resp.data["results"]], [propio.id])
+        self.assertEqual(resp.data["count"], 1)
+        resp = self.client.get(reverse("productos-list"), {"categoria_id": categorias[1].id})
+        self.assertEqual([p["id"] for p in resp.data["results"]], [propio.id])
+        self.assertEqual(self.client.get(reverse("productos-total")).data["total"], 1)
+        resp = self.client.get(reverse("categorias-list"))
+        self.assertEqual(sorted(c["id"] for c in resp.data["results"]), [c.id for c in categorias[:2]])
+
+        # El mapeo sigue a las relaciones: mover la categoria C a la tienda publica el producto de la prueba.
+        ProductoCategoria.objects.filter(producto=propio).delete()
+        relacion = CategoriaTienda.objects.filter(tienda=tienda).first()
+        relacion.categoria = categorias[2]
+        relacion.save()
+        self.assertEqual(list(ProductoTienda.objects.values_list("producto_id", flat=True)), [self.producto.id])
+        ProductoTienda.objects.all().delete()
+        call_command("reconstruir_producto_tienda", stdout=StringIO())
+        self.assertEqual(list(ProductoTienda.objects.values_list("producto_id", flat=True)), [self.producto.id])
+
+    def test_busqueda_de_productos_rankea_y_pliega_acentos(self):
+        indice_busqueda.invalidar()
+        en_nombre = Producto.objects.create(nombre="Depilación láser", precio=Decimal("1.00"))
+        en_descripcion = Producto.objects.create(
+            nombre="Pack verano", descripcion="Incluye depilacion de piernas", precio=Decimal("1.00")
+        )
+        Producto.objects.create(nombre="Cortes de pelo", descripcion_prompt="Corte clasico", precio=Decimal("1.00"))
+
+        for texto in ("depilacion", "DEPILACIÓN", "depil"):
+            resp = self.client.get(reverse("productos-list"), {"search": texto})
+            self.assertEqual([p["id"] for p in resp.data["results"]], [en_nombre.id, en_descripcion.id], texto)
+        resp = self.client.get(reverse("productos-list"), {"search": "corte pelo"})
+        self.assertEqual([p["nombre"] for p in resp.data["results"]], ["Cortes de pelo"])
+        resp = self.client.get(reverse("productos-list"), {"search": "depil", "ordering": "-id"})
+        self.assertEqual([p["id"] for p in resp.data["results"]], [en_descripcion.id, en_nombre.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            en_descripcion.descripcion = "Incluye masajes"
+            en_descripcion.save()
+        self.assertEqual(en_descripcion.busqueda.descripcion, "incluye masajes")
+        resp = self.client.get(reverse("productos-list"), {"search": "depil"})
+        self.assertEqual([p["id"] for p in resp.data["results"]], [en_nombre.id])
+
+        # Con mas de MAX_RESULTADOS_EN_MEMORIA coincidencias el recorte respeta el alcance del queryset.
+        otros = Producto.objects.bulk_create(
+            [Producto(nombre=f"Depilacion {n}", precio=Decimal("1.00")) for n in range(MAX_RESULTADOS_EN_MEMORIA)]
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            indexar_productos(otros)
+        alcance = Producto.objects.exclude(pk__in=[producto.pk for producto in otros])
+        with self.assertNumQueries(2):
+            encontrados = list(buscar_productos(alcance, "depil").values_list("id", flat=True))
+        self.assertEqual(encontrados, [en_nombre.id])
+
+    def test_productos_similares_por_tienda_toleran_errores_de_tipeo(self):
+        registro_similares.invalidar()
+        categoria = Categoria.objects.create(nombre="Servicios")
+        CategoriaTienda.objects.create(categoria=categoria, tienda=self.tienda)
+        nombres = ("Corte de pelo", "Coloración completa", "Depilación láser")
+        propios = [Producto.objects.create(nombre=nombre, precio=Decimal("1.00")) for nombre in nombres]
+        for producto in propios:
+            ProductoCategoria.objects.create(producto=producto, categoria=categoria)
+        Producto.objects.create(nombre="Corte de pelo premium", precio=Decimal("1.00"))  # sin tienda
+        url = reverse("productos-similares")
+
+        resp = self.client.get(url, {"tienda_id": self.tienda.id, "q": "corte de pleo", "k": 2})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data[0]["id"], propios[0].id)
+        self.assertTrue(0 < resp.data[0]["similitud"] < 1)
+        self.assertLessEqual(len(resp.data), 2)
+        resp = self.client.get(url, {"tienda_id": self.tienda.id, "q": "COLORACION"})
+        self.assertEqual(resp.data[0]["nombre"], "Coloración completa")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            propios[0].nombre = "Corte de cabello"
+            propios[0].save()
+        resp = self.client.get(url, {"tienda_id": self.tienda.id, "q": "corte cabelo", "k": 1})
+        self.assertEqual([(p["id"], p["nombre"]) for p in resp.data], [(propios[0].id, "Corte de cabello")])
+
+        # Guardar sin tocar nombre ni estado no consulta el mapeo ni descarta el indice cargado.
+        indice_tienda = registro_similares.obtener(self.tienda.id)
+        propios[1].descripcion = "Tinte y matiz"
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as consultas:
+            propios[1].save()
+        self.assertFalse([q for q in consultas.captured_queries if ProductoTienda._meta.db_table in q["sql"]])
+        self.assertIs(registro_similares.obtener(self.tienda.id), indice_tienda)
+
+        ajeno = get_user_model().objects.create_user("ajeno", "ajeno@example.com", "pass1234")
+        self.client.force_authenticate(ajeno)
+        self.assertEqual(self.client.get(url, {"tienda_id": self.tienda.id, "q": "corte"}).status_code, 404)
+
+    def test_similares_coinciden_con_la_similitud_exacta(self):
+        azar = random.Random(7)
+        nombres = [" ".join(azar.choice(PALABRAS) for _ in range(azar.randint(1, 5))) for _ in range(4000)]
+        nombres += nombres[:200]  # empates exactos con ids distintos
+        indice = IndiceTrigramas(enumerate(nombres, start=1))
+        for _ in range(60):
+            consulta = " ".join(azar.choice(PALABRAS) for _ in range(azar.randint(1, 4)))
+            propios = trigramas(consulta)
+            exactos = []
+            for producto_id, nombre in enumerate(nombres, start=1):
+                otros = trigramas(nombre)
+                similitud = len(propios & otros) / len(propios | otros)
+                if similitud >= 0.1:
+                    exactos.append((-similitud, producto_id))
+            esperado = [producto_id for _, producto_id in sorted(exactos)[:10]]
+            self.assertEqual([c.producto_id for c in indice.buscar(consulta, k=10, minimo=0.1)], esperado, consulta)
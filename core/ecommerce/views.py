@@ -1,12 +1,15 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, permissions, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from common.counts import contar
 from common.pagination import get_page_number_pagination
 from common.permissions import IsAdminOrOwner
 
-from .filters import ProductoFilter
+from .filters import BusquedaProductoFilter, ProductoFilter
+from .fuzzy import registro_similares
 from .models import Agenda, Categoria, CategoriaTienda, Producto, ProductoCategoria, Tienda
 from .serializers import (
     AgendaSerializer,
@@ -14,8 +17,11 @@ from .serializers import (
     CategoriaTiendaSerializer,
     ProductoCategoriaSerializer,
     ProductoSerializer,
+    SimilaresQuerySerializer,
+    SimilarSerializer,
     TiendaSerializer,
 )
+from .tenancy import alcance_de
 
 
 class TiendaViewSet(viewsets.ModelViewSet):
@@ -48,36 +54,47 @@ class CategoriaViewSet(viewsets.ModelViewSet):
     ordering_fields = ["nombre", "id"]
 
     def get_queryset(self):
-        qs = Categoria.objects.all().order_by("id")
-        if self.request.user.is_staff:
-            return qs
         # Categorias vinculadas a tiendas del usuario
-        return qs.filter(categoriatienda__tienda__cuenta__user=self.request.user).distinct()
+        return alcance_de(self.request).categorias(Categoria.objects.all().order_by("id"))
 
 
 class ProductoViewSet(viewsets.ModelViewSet):
     serializer_class = ProductoSerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = get_page_number_pagination(20)
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    pagination_class = get_page_number_pagination(20, conteo_estimado=True)
+    filter_backends = [DjangoFilterBackend, BusquedaProductoFilter, filters.OrderingFilter]
     filterset_class = ProductoFilter
-    search_fields = ["nombre"]
     ordering_fields = ["nombre", "precio", "id"]
 
     def get_queryset(self):
-        qs = Producto.objects.all().order_by("id")
-        user = self.request.user
-
-        if not user.is_staff:
-            qs = qs.filter(categoria_relaciones__categoria__categoriatienda__tienda__cuenta__user=user).distinct()
-
-        return qs.distinct()
+        return alcance_de(self.request).productos(Producto.objects.all().order_by("id"))
 
     @action(detail=False, methods=["get"], url_path="total")
     def total(self, request):
-        """Devuelve total de productos accesibles por el usuario autenticado."""
-        total = self.filter_queryset(self.get_queryset()).count()
-        return Response({"total": total})
+        """
+        Devuelve total de productos accesibles por el usuario autenticado. Con `?estimado=1` usa la
+        estimacion del planner sobre CONTEO_ESTIMADO_UMBRAL filas (`exacto` indica cual se uso).
+        """
+        qs = self.filter_queryset(self.get_queryset())
+        if request.query_params.get("estimado", "").lower() in ("1", "true"):
+            conteo = contar(qs)
+            return Response({"total": conteo.total, "exacto": conteo.exacto})
+        return Response({"total": qs.count(), "exacto": True})
+
+    @action(detail=False, methods=["get"], url_path="similares")
+    def similares(self, request):
+        """
+        Top-k productos activos de una tienda cuyo nombre se parece a `q` (trigramas, tolera errores de
+        tipeo y acentos), con su similitud de 0 a 1. Pensado para resolver nombres en tool calls de agentes.
+        """
+        params = SimilaresQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        datos = params.validated_data
+        alcance = alcance_de(request)
+        if not alcance.es_global and datos["tienda_id"] not in alcance.tienda_ids:
+            return Response({"detail": "Tienda no encontrada."}, status=404)
+        coincidencias = registro_similares.buscar(datos["tienda_id"], datos["q"], k=datos["k"], minimo=datos["minimo"])
+        return Response(SimilarSerializer(coincidencias, many=True).data)
 
     @action(detail=False, methods=["get"], url_path="por-categoria")
     def por_categoria(self, request):
@@ -85,7 +102,9 @@ class ProductoViewSet(viewsets.ModelViewSet):
         categoria_id = request.query_params.get("categoria_id")
         if not categoria_id:
             return Response({"detail": "categoria_id es requerido"}, status=400)
-        qs = self.filter_queryset(self.get_queryset()).filter(categoria_relaciones__categoria_id=categoria_id).distinct()
+        qs = self.filter_queryset(self.get_queryset()).filter(
+            Exists(ProductoCategoria.objects.filter(producto_id=OuterRef("pk"), categoria_id=categoria_id))
+        )
         page = self.paginate_queryset(qs)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -103,9 +122,7 @@ class ProductoCategoriaViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         qs = ProductoCategoria.objects.select_related("producto", "categoria").order_by("id")
-        if self.request.user.is_staff:
-            return qs
-        return qs.filter(categoria__categoriatienda__tienda__cuenta__user=self.request.user).distinct()
+        return alcance_de(self.request).categorias(qs, "categoria_id")
 
 
 class CategoriaTiendaViewSet(viewsets.ModelViewSet):
@@ -117,9 +134,10 @@ class CategoriaTiendaViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         qs = CategoriaTienda.objects.select_related("categoria", "tienda").order_by("id")
-        if self.request.user.is_staff:
+        alcance = alcance_de(self.request)
+        if alcance.es_global:
             return qs
-        return qs.filter(tienda__cuenta__user=self.request.user)
+        return qs.filter(tienda_id__in=alcance.tienda_ids)
 
 
 class AgendaViewSet(viewsets.ModelViewSet):
@@ -131,8 +149,4 @@ class AgendaViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         qs = Agenda.objects.select_related("producto").order_by("inicio", "id")
-        if self.request.user.is_staff:
-            return qs
-        return qs.filter(
-            producto__categoria_relaciones__categoria__categoriatienda__tienda__cuenta__user=self.request.user
-        ).distinct()
+        return alcance_de(self.request).productos(qs, "producto_id")
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import SaleEvent, SaleItem
+from .models import SaleEvent, SaleItem, VentaDiariaCategoria, VentaDiariaProducto
 
 
 class SaleItemInline(admin.TabularInline):
@@ -23,3 +23,16 @@ class SaleEventAdmin(admin.ModelAdmin):
     search_fields = ("user__username",)
     inlines = [SaleItemInline]
 
+
+@admin.register(VentaDiariaProducto)
+class VentaDiariaProductoAdmin(admin.ModelAdmin):
+    list_display = ("fecha", "tienda", "producto_nombre", "unidades", "revenue")
+    list_filter = ("tienda",)
+    date_hierarchy = "fecha"
+
+
+@admin.register(VentaDiariaCategoria)
+class VentaDiariaCategoriaAdmin(admin.ModelAdmin):
+    list_display = ("fecha", "tienda", "categoria_snapshot_nombre", "unidades", "revenue")
+    list_filter = ("tienda",)
+    date_hierarchy = "fecha"
@@ -0,0 +1,82 @@
+"""
+Exportacion en streaming de ventas (CSV / NDJSON).
+
+Las filas se generan a medida que el cliente las consume: el queryset se recorre con
+`iterator(chunk_size=...)` (cursor del lado del servidor en PostgreSQL) y los items se
+precargan por bloque, asi la memoria no depende del tamaño del rango exportado.
+"""
+import csv
+import json
+from typing import Iterable, Iterator
+
+from django.db.models import Prefetch, QuerySet
+
+from .models import SaleEvent, SaleItem
+
+CHUNK_SIZE = 2000
+
+COLUMNAS_EVENTO = ["sale_event_id", "created_at", "source", "tienda_id", "user_id", "order_id", "cita_id",
+                   "total_amount", "total_items"]
+COLUMNAS_ITEM = ["producto_id", "producto_nombre", "categoria_snapshot_id", "categoria_snapshot_nombre", "cantidad",
+                 "precio_unitario", "total_linea"]
+
+
+class _Eco:
+    """Buffer minimo para csv.writer: devuelve la linea en vez de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+def eventos_para_exportar(qs: QuerySet, chunk_size: int = CHUNK_SIZE) -> Iterator[SaleEvent]:
+    qs = qs.select_related(None).prefetch_related(None)
+    qs = qs.prefetch_related(Prefetch("items", queryset=SaleItem.objects.order_by("id")))
+    return qs.iterator(chunk_size=chunk_size)
+
+
+def _evento(venta: SaleEvent) -> list:
+    return [
+        venta.pk,
+        venta.created_at.isoformat(),
+        venta.source,
+        venta.tienda_id,
+        venta.user_id,
+        venta.order_id,
+        venta.cita_id,
+        venta.total_amount,
+        venta.total_items,
+    ]
+
+
+def _item(item: SaleItem) -> list:
+    return [
+        item.producto_id,
+        item.producto_nombre,
+        item.categoria_snapshot_id,
+        item.categoria_snapshot_nombre,
+        item.cantidad,
+        item.precio_unitario,
+        item.total_linea,
+    ]
+
+
+def filas_csv(ventas: Iterable[SaleEvent]) -> Iterator[str]:
+    """Una linea por SaleItem con las columnas del evento repetidas; eventos sin items van con columnas vacias."""
+    writer = csv.writer(_Eco())
+    yield writer.writerow(COLUMNAS_EVENTO + COLUMNAS_ITEM)
+    vacio = [""] * len(COLUMNAS_ITEM)
+    for venta in ventas:
+        evento = _evento(venta)
+        items = venta.items.all()
+        if not items:
+            yield writer.writerow(evento + vacio)
+        for item in items:
+            yield writer.writerow(evento + _item(item))
+
+
+def filas_ndjson(ventas: Iterable[SaleEvent]) -> Iterator[str]:
+    """Un objeto JSON por SaleEvent con sus items anidados."""
+    for venta in ventas:
+        fila = dict(zip(COLUMNAS_EVENTO, _evento(venta)))
+        fila["items"] = [dict(zip(COLUMNAS_ITEM, _item(item))) for item in venta.items.all()]
+        yield json.dumps(fila, default=str, ensure_ascii=False) + "\n"
@@ -0,0 +1,113 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from ecommerce.models import Producto, Tienda
+from sales.models import SaleEvent, SaleItem
+from sales.services import rango_local
+from users.models import Cuenta
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera ventas sinteticas (en una transaccion que se revierte) y compara el filtro "
+        "`created_at__date` contra el rango semiabierto: plan (EXPLAIN) y tiempo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=5_000_000, help="Filas de SaleItem a generar.")
+        parser.add_argument("--items-por-venta", type=int, default=3)
+        parser.add_argument("--dias", type=int, default=730, help="Historial sintetico en dias.")
+        parser.add_argument("--tiendas", type=int, default=20)
+        parser.add_argument("--productos", type=int, default=200)
+        parser.add_argument("--lote", type=int, default=20_000)
+        parser.add_argument("--semilla", type=int, default=7)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._ejecutar(options)
+            transaction.set_rollback(True)
+
+    def _ejecutar(self, options):
+        azar = random.Random(options["semilla"])
+        sufijo = int(time.time())
+        User = get_user_model()
+        user = User.objects.create_user(f"benchmark-{sufijo}")
+        cuenta = Cuenta.objects.create(user=user, nombre="benchmark", nombre_usuario=f"benchmark-{sufijo}")
+        tiendas = Tienda.objects.bulk_create(
+            [Tienda(nombre=f"benchmark {n}", cuenta=cuenta) for n in range(options["tiendas"])]
+        )
+        productos = Producto.objects.bulk_create(
+            [Producto(nombre=f"benchmark {n}", precio=Decimal("10.00")) for n in range(options["productos"])]
+        )
+
+        inicio_carga = time.perf_counter()
+        self._generar(options, azar, tiendas, productos)
+        self.stdout.write(f"Generados {options['items']} items en {time.perf_counter() - inicio_carga:.1f} s")
+
+        tienda = tiendas[0]
+        hasta = timezone.localdate()
+        desde = hasta - timedelta(days=30)
+        inicio, fin = rango_local(desde, hasta)
+        base = SaleItem.objects.filter(sale_event__tienda=tienda)
+        consultas = {
+            "created_at__date (cast)": base.filter(
+                sale_event__created_at__date__gte=desde, sale_event__created_at__date__lte=hasta
+            ),
+            "rango semiabierto": base.filter(sale_event__created_at__gte=inicio, sale_event__created_at__lt=fin),
+        }
+        for nombre, qs in consultas.items():
+            agregado = qs.values("producto_id").annotate(unidades=Sum("cantidad"), revenue=Sum("total_linea"))
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {nombre}"))
+            self.stdout.write(agregado.explain())
+            tiempos = []
+            for _ in range(3):
+                inicio_consulta = time.perf_counter()
+                filas = len(list(agregado.all()))
+                tiempos.append(time.perf_counter() - inicio_consulta)
+            self.stdout.write(f"{filas} productos | mejor de 3: {min(tiempos) * 1000:.1f} ms")
+
+    def _generar(self, options, azar, tiendas, productos):
+        # created_at es auto_now_add: se desactiva solo durante la carga para repartir fechas.
+        campo = SaleEvent._meta.get_field("created_at")
+        campo.auto_now_add = False
+        try:
+            ahora = timezone.now()
+            por_venta = options["items_por_venta"]
+            restantes = options["items"]
+            while restantes > 0:
+                cantidad = min(options["lote"], restantes)
+                ventas = SaleEvent.objects.bulk_create(
+                    [
+                        SaleEvent(
+                            tienda=azar.choice(tiendas),
+                            source=SaleEvent.Source.MANUAL,
+                            created_at=ahora - timedelta(minutes=azar.randrange(options["dias"] * 24 * 60)),
+                        )
+                        for _ in range(-(-cantidad // por_venta))
+                    ]
+                )
+                items = []
+                for n in range(cantidad):
+                    producto = azar.choice(productos)
+                    items.append(
+                        SaleItem(
+                            sale_event=ventas[n // por_venta],
+                            producto=producto,
+                            producto_nombre=producto.nombre,
+                            cantidad=1,
+                            precio_unitario=producto.precio,
+                            total_linea=producto.precio,
+                        )
+                    )
+                SaleItem.objects.bulk_create(items)
+                restantes -= cantidad
+        finally:
+            campo.auto_now_add = True
@@ -0,0 +1,19 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from sales.services import reconstruir_rollups
+
+
+class Command(BaseCommand):
+    help = "Recalcula los rollups diarios de ventas (por producto y por categoria) desde SaleItem."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", type=date.fromisoformat, help="Fecha inicial YYYY-MM-DD (inclusive).")
+        parser.add_argument("--hasta", type=date.fromisoformat, help="Fecha final YYYY-MM-DD (inclusive).")
+
+    def handle(self, *args, **options):
+        productos, categorias = reconstruir_rollups(options["desde"], options["hasta"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Filas por producto: {productos} | filas por categoria: {categorias}")
+        )
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:29
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Max, Sum
+from django.db.models.functions import TruncDate
+
+
+def poblar_rollups(apps, schema_editor):
+    # Mismo calculo que reconstruir_rollups (sales.services) sobre todo el historial de SaleItem.
+    SaleItem = apps.get_model("sales", "SaleItem")
+    VentaDiariaProducto = apps.get_model("sales", "VentaDiariaProducto")
+    VentaDiariaCategoria = apps.get_model("sales", "VentaDiariaCategoria")
+    items = SaleItem.objects.annotate(fecha=TruncDate("sale_event__created_at"))
+    totales = {"unidades": Sum("cantidad"), "revenue": Sum("total_linea")}
+    VentaDiariaProducto.objects.bulk_create(
+        (
+            VentaDiariaProducto(
+                tienda_id=fila["sale_event__tienda_id"],
+                fecha=fila["fecha"],
+                producto_id=fila["producto_id"],
+                producto_nombre=fila["nombre"],
+                unidades=fila["unidades"],
+                revenue=fila["revenue"],
+            )
+            for fila in items.values("sale_event__tienda_id", "fecha", "producto_id")
+            .annotate(nombre=Max("producto_nombre"), **totales)
+            .order_by()
+            .iterator()
+        ),
+        batch_size=1000,
+    )
+    VentaDiariaCategoria.objects.bulk_create(
+        (
+            VentaDiariaCategoria(
+                tienda_id=fila["sale_event__tienda_id"],
+                fecha=fila["fecha"],
+                categoria_snapshot_id=fila["categoria_snapshot_id"],
+                categoria_snapshot_nombre=fila["nombre"] or "",
+                unidades=fila["unidades"],
+                revenue=fila["revenue"],
+            )
+            for fila in items.values("sale_event__tienda_id", "fecha", "categoria_snapshot_id")
+            .annotate(nombre=Max("categoria_snapshot_nombre"), **totales)
+            .order_by()
+            .iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0001_initial'),
+        ('sales', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaDiariaCategoria',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('categoria_snapshot_id', models.IntegerField(blank=True, null=True)),
+                ('categoria_snapshot_nombre', models.CharField(blank=True, max_length=255)),
+                ('unidades', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('tienda', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ventas_diarias_categoria', to='ecommerce.tienda')),
+            ],
+            options={
+                'db_table': 'sales_rollup_categoria_dia',
+                'indexes': [models.Index(fields=['tienda', 'fecha', 'categoria_snapshot_id'], name='sales_rollu_tienda__5416aa_idx'), models.Index(fields=['fecha'], name='sales_rollu_fecha_c7a109_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VentaDiariaProducto',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('producto_nombre', models.CharField(max_length=255)),
+                ('unidades', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ventas_diarias', to='ecommerce.producto')),
+                ('tienda', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='ventas_diarias_producto', to='ecommerce.tienda')),
+            ],
+            options={
+                'db_table': 'sales_rollup_producto_dia',
+                'indexes': [models.Index(fields=['tienda', 'fecha', 'producto'], name='sales_rollu_tienda__31a622_idx'), models.Index(fields=['fecha'], name='sales_rollu_fecha_7c176e_idx')],
+            },
+        ),
+        migrations.RunPython(poblar_rollups, migrations.RunPython.noop),
+    ]
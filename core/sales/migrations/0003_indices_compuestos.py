@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0002_rollups_diarios'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='saleevent',
+            name='sales_event_tienda__9ce6dd_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='saleitem',
+            name='sales_item_sale_ev_b124ff_idx',
+        ),
+        migrations.AddIndex(
+            model_name='saleevent',
+            index=models.Index(fields=['tienda', 'created_at'], name='sales_event_tienda__d26d9b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saleevent',
+            index=models.Index(fields=['created_at'], name='sales_event_created_8ce03f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saleitem',
+            index=models.Index(fields=['sale_event', 'producto'], name='sales_item_sale_ev_18bb6f_idx'),
+        ),
+    ]
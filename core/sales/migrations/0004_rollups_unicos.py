@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:59
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fusionar_duplicados(apps, schema_editor):
+    # Antes de la clave unica podian quedar varias filas por clave: se suman en la de menor id.
+    claves = {
+        "VentaDiariaProducto": ("tienda_id", "fecha", "producto_id"),
+        "VentaDiariaCategoria": ("tienda_id", "fecha", "categoria_snapshot_id"),
+    }
+    for nombre, clave in claves.items():
+        modelo = apps.get_model("sales", nombre)
+        grupos = (
+            modelo.objects.values(*clave)
+            .annotate(
+                filas=Count("id"), primera=Min("id"), unidades_total=Sum("unidades"), revenue_total=Sum("revenue")
+            )
+            .filter(filas__gt=1)
+        )
+        for grupo in grupos:
+            filtro = {}
+            for campo in clave:
+                if grupo[campo] is None:
+                    filtro[f"{campo}__isnull"] = True
+                else:
+                    filtro[campo] = grupo[campo]
+            modelo.objects.filter(**filtro).exclude(pk=grupo["primera"]).delete()
+            modelo.objects.filter(pk=grupo["primera"]).update(
+                unidades=grupo["unidades_total"], revenue=grupo["revenue_total"]
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0003_indices_compuestos'),
+    ]
+
+    operations = [
+        migrations.RunPython(fusionar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ventadiariacategoria',
+            constraint=models.UniqueConstraint(Coalesce('tienda', Value(0)), models.F('fecha'), Coalesce('categoria_snapshot_id', Value(0)), name='uq_rollup_categoria_dia'),
+        ),
+        migrations.AddConstraint(
+            model_name='ventadiariaproducto',
+            constraint=models.UniqueConstraint(Coalesce('tienda', Value(0)), models.F('fecha'), models.F('producto'), name='uq_rollup_producto_dia'),
+        ),
+    ]
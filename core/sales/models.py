@@ -3,6 +3,8 @@ from decimal import Decimal
 from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models.functions import Coalesce
+
 from ecommerce.models import Producto, Tienda
 
 
@@ -31,7 +33,8 @@ class SaleEvent(models.Model):
         db_table = "sales_event"
         indexes = [
             models.Index(fields=["source"]),
-            models.Index(fields=["tienda"]),
+            models.Index(fields=["tienda", "created_at"]),
+            models.Index(fields=["created_at"]),
         ]
         constraints = [
             models.UniqueConstraint(fields=["order"], name="uq_sale_por_order", condition=models.Q(order__isnull=False)),
@@ -57,9 +60,72 @@ class SaleItem(models.Model):
     class Meta:
         db_table = "sales_item"
         indexes = [
-            models.Index(fields=["sale_event"]),
+            models.Index(fields=["sale_event", "producto"]),
             models.Index(fields=["producto"]),
         ]
 
     def __str__(self):
         return f"{self.producto_nombre} x{self.cantidad}"
+
+
+class VentaDiariaProducto(models.Model):
+    """
+    Acumulado diario de ventas por tienda y producto (fecha local de `SaleEvent.created_at`).
+    Se mantiene en `sales.services` al registrar cada venta y se recalcula con `reconstruir_rollups_ventas`.
+    """
+
+    tienda = models.ForeignKey(
+        Tienda, on_delete=models.PROTECT, related_name="ventas_diarias_producto", null=True, blank=True
+    )
+    fecha = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.PROTECT, related_name="ventas_diarias")
+    producto_nombre = models.CharField(max_length=255)
+    unidades = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+
+    class Meta:
+        db_table = "sales_rollup_producto_dia"
+        constraints = [
+            # COALESCE: con tienda NULL la clave sigue siendo unica (NULL no choca con NULL en un UNIQUE).
+            models.UniqueConstraint(
+                Coalesce("tienda", models.Value(0)), "fecha", "producto", name="uq_rollup_producto_dia"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["tienda", "fecha", "producto"]),
+            models.Index(fields=["fecha"]),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.producto_nombre}: {self.unidades}"
+
+
+class VentaDiariaCategoria(models.Model):
+    """Acumulado diario de ventas por tienda y categoria snapshot de la linea vendida."""
+
+    tienda = models.ForeignKey(
+        Tienda, on_delete=models.PROTECT, related_name="ventas_diarias_categoria", null=True, blank=True
+    )
+    fecha = models.DateField()
+    categoria_snapshot_id = models.IntegerField(null=True, blank=True)
+    categoria_snapshot_nombre = models.CharField(max_length=255, blank=True)
+    unidades = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+
+    class Meta:
+        db_table = "sales_rollup_categoria_dia"
+        constraints = [
+            models.UniqueConstraint(
+                Coalesce("tienda", models.Value(0)),
+                "fecha",
+                Coalesce("categoria_snapshot_id", models.Value(0)),
+                name="uq_rollup_categoria_dia",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["tienda", "fecha", "categoria_snapshot_id"]),
+            models.Index(fields=["fecha"]),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.categoria_snapshot_nombre}: {self.unidades}"
@@ -1,3 +1,6 @@
+from datetime import timedelta
+
+from django.utils import timezone
 from rest_framework import serializers
 
 from .models import SaleEvent, SaleItem
@@ -43,3 +46,36 @@ class SalesSummaryItemSerializer(serializers.Serializer):
     unidades = serializers.IntegerField()
     revenue = serializers.DecimalField(max_digits=12, decimal_places=2)
 
+
+class SalesTimeseriesQuerySerializer(serializers.Serializer):
+    MAX_BUCKETS = 400
+
+    interval = serializers.ChoiceField(choices=["day", "week", "month"], default="day")
+    split = serializers.ChoiceField(choices=["producto", "categoria"], required=False)
+    tienda_id = serializers.IntegerField(required=False)
+    desde = serializers.DateField(required=False)
+    hasta = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        hasta = attrs.setdefault("hasta", timezone.localdate())
+        desde = attrs.setdefault("desde", hasta - timedelta(days=29))
+        if hasta < desde:
+            raise serializers.ValidationError({"hasta": "hasta debe ser posterior o igual a desde."})
+        dias = (hasta - desde).days + 1
+        buckets = {"day": dias, "week": dias // 7 + 1, "month": dias // 28 + 1}[attrs["interval"]]
+        if buckets > self.MAX_BUCKETS:
+            raise serializers.ValidationError(f"El rango genera mas de {self.MAX_BUCKETS} buckets.")
+        return attrs
+
+
+class SalesRangoQuerySerializer(serializers.Serializer):
+    """Filtros opcionales de resumen, listado y exportacion: tienda y rango de fechas locales inclusive."""
+
+    tienda_id = serializers.IntegerField(required=False)
+    desde = serializers.DateField(required=False)
+    hasta = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if "desde" in attrs and "hasta" in attrs and attrs["hasta"] < attrs["desde"]:
+            raise serializers.ValidationError({"hasta": "hasta debe ser posterior o igual a desde."})
+        return attrs
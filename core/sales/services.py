@@ -1,11 +1,16 @@
+from datetime import date, datetime, time, timedelta
 from decimal import Decimal
-from typing import Tuple
+from typing import Dict, Iterable, Tuple
 
-from django.db import transaction
+from django.db import connections, router, transaction
+from django.db.models import Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
 
-from ecommerce.models import Categoria, Producto
+from ecommerce.models import Categoria, Producto, ProductoCategoria
+from ecommerce.services import tienda_de_producto, tiendas_de_productos
 
-from .models import SaleEvent, SaleItem
+from .models import SaleEvent, SaleItem, VentaDiariaCategoria, VentaDiariaProducto
 
 
 def guess_categoria_snapshot(producto: Producto) -> Tuple[int | None, str]:
@@ -20,6 +25,20 @@ def guess_categoria_snapshot(producto: Producto) -> Tuple[int | None, str]:
     return None, ""
 
 
+def guess_categoria_snapshots(producto_ids: Iterable[int]) -> Dict[int, Tuple[int | None, str]]:
+    """Version en lote de guess_categoria_snapshot: una sola consulta para todos los productos."""
+    snapshots: Dict[int, Tuple[int | None, str]] = {}
+    relaciones = (
+        ProductoCategoria.objects.filter(producto_id__in=set(producto_ids), categoria__esta_activa=True)
+        .select_related("categoria")
+        .order_by("producto_id", "id")
+    )
+    for relacion in relaciones:
+        if relacion.producto_id not in snapshots:
+            snapshots[relacion.producto_id] = (relacion.categoria.id, relacion.categoria.nombre)
+    return snapshots
+
+
 @transaction.atomic
 def create_sale_from_order(order) -> SaleEvent:
     sale, created = SaleEvent.objects.get_or_create(
@@ -33,26 +52,35 @@ def create_sale_from_order(order) -> SaleEvent:
     if not created:
         return sale
 
-    total_amount = Decimal("0.00")
-    total_items = 0
-    for item in order.items.select_related("producto"):
-        cat_id, cat_nombre = guess_categoria_snapshot(item.producto)
-        SaleItem.objects.create(
-            sale_event=sale,
-            producto=item.producto,
-            producto_nombre=item.producto.nombre,
-            categoria_snapshot_id=item.categoria_snapshot_id or cat_id,
-            categoria_snapshot_nombre=item.categoria_snapshot_nombre or (cat_nombre or ""),
-            cantidad=item.cantidad,
-            precio_unitario=item.precio_unitario,
-            total_linea=item.total_linea,
+    order_items = list(order.items.select_related("producto"))
+    sin_snapshot = [
+        item.producto_id
+        for item in order_items
+        if item.categoria_snapshot_id is None or not item.categoria_snapshot_nombre
+    ]
+    snapshots = guess_categoria_snapshots(sin_snapshot) if sin_snapshot else {}
+
+    items = []
+    for item in order_items:
+        cat_id, cat_nombre = snapshots.get(item.producto_id, (None, ""))
+        items.append(
+            SaleItem(
+                sale_event=sale,
+                producto=item.producto,
+                producto_nombre=item.producto.nombre,
+                categoria_snapshot_id=item.categoria_snapshot_id or cat_id,
+                categoria_snapshot_nombre=item.categoria_snapshot_nombre or (cat_nombre or ""),
+                cantidad=item.cantidad,
+                precio_unitario=item.precio_unitario,
+                total_linea=item.total_linea,
+            )
         )
-        total_amount += item.total_linea
-        total_items += item.cantidad
+    SaleItem.objects.bulk_create(items)
 
-    sale.total_amount = total_amount
-    sale.total_items = total_items
+    sale.total_amount = sum((item.total_linea for item in items), Decimal("0.00"))
+    sale.total_items = sum(item.cantidad for item in items)
     sale.save(update_fields=["total_amount", "total_items"])
+    acumular_rollups([(sale, items)])
     return sale
 
 
@@ -75,7 +103,7 @@ def create_sale_from_cita(cita) -> SaleEvent:
     producto = cita.producto
     cat_id, cat_nombre = guess_categoria_snapshot(producto)
     precio = producto.precio or Decimal("0.00")
-    SaleItem.objects.create(
+    item = SaleItem.objects.create(
         sale_event=sale,
         producto=producto,
         producto_nombre=producto.nombre,
@@ -88,18 +116,191 @@ def create_sale_from_cita(cita) -> SaleEvent:
     sale.total_items = 1
     sale.total_amount = precio
     sale.save(update_fields=["total_items", "total_amount"])
+    acumular_rollups([(sale, [item])])
     return sale
 
 
 def guess_tienda_from_producto(producto: Producto):
-    relacion = (
-        producto.categoria_relaciones.select_related("categoria")
-        .filter(categoria__tiendas__isnull=False)
-        .first()
+    """Tienda del producto segun el mapeo desnormalizado `ProductoTienda` (una lectura indexada)."""
+    return tienda_de_producto(producto.pk)
+
+
+@transaction.atomic
+def create_sales_from_citas(citas) -> list:
+    """
+    Version en lote de create_sale_from_cita para citas recien creadas: una consulta de
+    idempotencia, snapshots de categoria y tienda por producto distinto y dos bulk_create.
+    """
+    citas = [cita for cita in citas if cita.producto_id]
+    existentes = set(
+        SaleEvent.objects.filter(cita__in=[cita.pk for cita in citas]).values_list("cita_id", flat=True)
     )
-    if relacion and relacion.categoria:
-        categoria = relacion.categoria
-        tienda_rel = categoria.tiendas.select_related("tienda").first()
-        if tienda_rel:
-            return tienda_rel.tienda
-    return None
+    citas = [cita for cita in citas if cita.pk not in existentes]
+    if not citas:
+        return []
+
+    productos = {cita.producto_id: cita.producto for cita in citas}
+    snapshots = guess_categoria_snapshots(productos)
+    tiendas = tiendas_de_productos(productos)
+
+    ventas = SaleEvent.objects.bulk_create(
+        SaleEvent(
+            cita=cita,
+            user=getattr(cita, "user", None),
+            source=SaleEvent.Source.RESERVATION,
+            tienda_id=tiendas[cita.producto_id],
+            total_items=1,
+            total_amount=cita.producto.precio or Decimal("0.00"),
+        )
+        for cita in citas
+    )
+    items = []
+    for venta, cita in zip(ventas, citas):
+        cat_id, cat_nombre = snapshots.get(cita.producto_id, (None, ""))
+        items.append(
+            SaleItem(
+                sale_event=venta,
+                producto=cita.producto,
+                producto_nombre=cita.producto.nombre,
+                categoria_snapshot_id=cat_id,
+                categoria_snapshot_nombre=cat_nombre or "",
+                cantidad=1,
+                precio_unitario=venta.total_amount,
+                total_linea=venta.total_amount,
+            )
+        )
+    SaleItem.objects.bulk_create(items)
+    acumular_rollups([(venta, [item]) for venta, item in zip(ventas, items)])
+    return ventas
+
+
+def rango_local(desde: date | None, hasta: date | None) -> Tuple[datetime | None, datetime | None]:
+    """
+    Fechas locales inclusive -> rango semiabierto [desde 00:00, hasta+1 00:00) en la zona actual.
+    Filtrar `created_at__gte/__lt` con esto usa el indice; `created_at__date` castea la columna.
+    """
+    tz = timezone.get_current_timezone()
+    inicio = datetime.combine(desde, time.min, tzinfo=tz) if desde else None
+    fin = datetime.combine(hasta + timedelta(days=1), time.min, tzinfo=tz) if hasta else None
+    return inicio, fin
+
+
+def _upsert_rollups(modelo, clave: Tuple[str, ...], nombre: str, filas: list, lote: int = 500) -> None:
+    """
+    Suma `filas` [(clave..., nombre, unidades, revenue)] al rollup con un INSERT ... ON CONFLICT DO
+    UPDATE por lote. El conflicto se resuelve contra la clave unica (uq_rollup_*, con COALESCE de las
+    columnas nulables): pagos concurrentes suman sobre la misma fila en vez de duplicarla. Las filas
+    van ordenadas por clave para que dos transacciones bloqueen en el mismo orden.
+    """
+    connection = connections[router.db_for_write(modelo)]
+    qn = connection.ops.quote_name
+    tabla = qn(modelo._meta.db_table)
+    columnas = ", ".join(qn(columna) for columna in (*clave, nombre, "unidades", "revenue"))
+    nulables = {campo.column for campo in modelo._meta.concrete_fields if campo.null}
+    conflicto = ", ".join(f"COALESCE({qn(columna)}, 0)" if columna in nulables else qn(columna) for columna in clave)
+    filas = sorted(filas, key=lambda fila: tuple(valor or 0 for valor in fila[: len(clave)]))
+    for inicio in range(0, len(filas), lote):
+        bloque = filas[inicio : inicio + lote]
+        marcadores = ", ".join(["(" + ", ".join(["%s"] * (len(clave) + 3)) + ")"] * len(bloque))
+        sql = (
+            f"INSERT INTO {tabla} ({columnas}) VALUES {marcadores} "
+            f"ON CONFLICT ({conflicto}) DO UPDATE SET "
+            f"{qn('unidades')} = {tabla}.{qn('unidades')} + EXCLUDED.{qn('unidades')}, "
+            f"{qn('revenue')} = {tabla}.{qn('revenue')} + EXCLUDED.{qn('revenue')}, "
+            f"{qn(nombre)} = EXCLUDED.{qn(nombre)}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [valor for fila in bloque for valor in fila])
+
+
+def acumular_rollups(ventas) -> None:
+    """
+    Suma lineas vendidas a los rollups diarios. `ventas`: iterable de (SaleEvent, [SaleItem]).
+    Agrupa en memoria por clave y escribe cada tabla con un upsert (`_upsert_rollups`): el costo
+    no depende de cuantos productos o categorias distintos tenga la venta.
+    """
+    por_producto: Dict[tuple, list] = {}
+    por_categoria: Dict[tuple, list] = {}
+    for sale, items in ventas:
+        fecha = timezone.localdate(sale.created_at)
+        for item in items:
+            acumulado = por_producto.setdefault((sale.tienda_id, fecha, item.producto_id), [0, Decimal("0.00"), ""])
+            acumulado[0] += item.cantidad
+            acumulado[1] += item.total_linea
+            acumulado[2] = item.producto_nombre
+            acumulado = por_categoria.setdefault(
+                (sale.tienda_id, fecha, item.categoria_snapshot_id), [0, Decimal("0.00"), ""]
+            )
+            acumulado[0] += item.cantidad
+            acumulado[1] += item.total_linea
+            acumulado[2] = item.categoria_snapshot_nombre or acumulado[2]
+
+    destinos = (
+        (VentaDiariaProducto, ("tienda_id", "fecha", "producto_id"), "producto_nombre", por_producto),
+        (
+            VentaDiariaCategoria,
+            ("tienda_id", "fecha", "categoria_snapshot_id"),
+            "categoria_snapshot_nombre",
+            por_categoria,
+        ),
+    )
+    for modelo, clave, nombre, acumulados in destinos:
+        filas = [(*key, texto, unidades, revenue) for key, (unidades, revenue, texto) in acumulados.items()]
+        if filas:
+            _upsert_rollups(modelo, clave, nombre, filas)
+
+
+@transaction.atomic
+def reconstruir_rollups(desde: date | None = None, hasta: date | None = None) -> Tuple[int, int]:
+    """
+    Recalcula los rollups del rango de fechas (inclusive; todo el historial si no se indica)
+    desde SaleItem con dos agregaciones en la base. Devuelve (filas_producto, filas_categoria).
+    """
+    items = SaleItem.objects.annotate(fecha=TruncDate("sale_event__created_at"))
+    rollups = [VentaDiariaProducto.objects.all(), VentaDiariaCategoria.objects.all()]
+    inicio, fin = rango_local(desde, hasta)
+    if inicio:
+        items = items.filter(sale_event__created_at__gte=inicio)
+        rollups = [qs.filter(fecha__gte=desde) for qs in rollups]
+    if fin:
+        items = items.filter(sale_event__created_at__lt=fin)
+        rollups = [qs.filter(fecha__lte=hasta) for qs in rollups]
+    for qs in rollups:
+        qs.delete()
+
+    totales = {"unidades": Sum("cantidad"), "revenue": Sum("total_linea")}
+    productos = VentaDiariaProducto.objects.bulk_create(
+        (
+            VentaDiariaProducto(
+                tienda_id=fila["sale_event__tienda_id"],
+                fecha=fila["fecha"],
+                producto_id=fila["producto_id"],
+                producto_nombre=fila["nombre"],
+                unidades=fila["unidades"],
+                revenue=fila["revenue"],
+            )
+            for fila in items.values("sale_event__tienda_id", "fecha", "producto_id")
+            .annotate(nombre=Max("producto_nombre"), **totales)
+            .order_by()
+            .iterator()
+        ),
+        batch_size=1000,
+    )
+    categorias = VentaDiariaCategoria.objects.bulk_create(
+        (
+            VentaDiariaCategoria(
+                tienda_id=fila["sale_event__tienda_id"],
+                fecha=fila["fecha"],
+                categoria_snapshot_id=fila["categoria_snapshot_id"],
+                categoria_snapshot_nombre=fila["nombre"] or "",
+                unidades=fila["unidades"],
+                revenue=fila["revenue"],
+            )
+            for fila in items.values("sale_event__tienda_id", "fecha", "categoria_snapshot_id")
+            .annotate(nombre=Max("categoria_snapshot_nombre"), **totales)
+            .order_by()
+            .iterator()
+        ),
+        batch_size=1000,
+    )
+    return len(productos), len(categorias)
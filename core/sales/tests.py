@@ -0,0 +1,179 @@
+import csv
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from zoneinfo import ZoneInfo
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from commerce.models import CartItem
+from commerce.services import checkout_cart, confirm_payment, get_or_create_cart
+from ecommerce.models import Producto, Tienda
+from sales.models import SaleEvent, SaleItem, VentaDiariaCategoria, VentaDiariaProducto
+from sales.services import acumular_rollups, rango_local
+from users.models import Cuenta
+
+
+class VentasTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "pass1234")
+        self.client.force_authenticate(self.user)
+        self.cuenta = Cuenta.objects.create(
+            user=self.user, nombre="Cuenta Test", nombre_usuario="ctest", contrasena="x"
+        )
+        self.tienda = Tienda.objects.create(nombre="Tienda Test", cuenta=self.cuenta)
+        self.producto = Producto.objects.create(
+            nombre="Producto Test", precio=Decimal("20.00"), stock=10, agendable=True
+        )
+
+    def test_resumen_de_ventas_lee_rollups(self):
+        otro = Producto.objects.create(nombre="Otro", precio=Decimal("5.00"), stock=10)
+        for cantidades in ({self.producto: 2, otro: 1}, {self.producto: 1}):
+            cart = get_or_create_cart(self.user, self.tienda)
+            CartItem.objects.bulk_create(
+                [CartItem(cart=cart, producto=p, cantidad=n, precio_unitario=p.precio) for p, n in cantidades.items()]
+            )
+            confirm_payment(checkout_cart(self.user, self.tienda), "testpay")
+        self.assertEqual(VentaDiariaProducto.objects.get(producto=self.producto).unidades, 3)
+
+        esperado = [
+            {"key": "Producto Test", "unidades": 3, "revenue": Decimal("60.00")},
+            {"key": "Otro", "unidades": 1, "revenue": Decimal("5.00")},
+        ]
+        with self.assertNumQueries(1):
+            resp = self.client.get(reverse("sales-summary"), {"tienda_id": self.tienda.id})
+        self.assertEqual(resp.data, esperado)
+
+        # La reconstruccion desde SaleItem deja los mismos totales.
+        VentaDiariaProducto.objects.update(unidades=0)
+        call_command("reconstruir_rollups_ventas", stdout=StringIO())
+        self.assertEqual(self.client.get(reverse("sales-summary"), {"tienda_id": self.tienda.id}).data, esperado)
+
+    def test_rollups_se_suman_con_un_upsert_por_tabla(self):
+        productos = [Producto.objects.create(nombre=f"P{n}", precio=Decimal("2.00")) for n in range(30)]
+        # Sin tienda ni categoria: la clave unica con COALESCE igual evita filas duplicadas.
+        venta = SaleEvent.objects.create(source=SaleEvent.Source.CART_CHECKOUT, total_items=30)
+        items = [
+            SaleItem(sale_event=venta, producto=p, producto_nombre=p.nombre, cantidad=1, total_linea=Decimal("2.00"))
+            for p in productos
+        ]
+        for _ in range(2):
+            with self.assertNumQueries(2):
+                acumular_rollups([(venta, items)])
+        self.assertEqual(VentaDiariaProducto.objects.count(), 30)
+        self.assertEqual(set(VentaDiariaProducto.objects.values_list("unidades", flat=True)), {2})
+        categoria = VentaDiariaCategoria.objects.get()
+        self.assertEqual((categoria.tienda_id, categoria.unidades, categoria.revenue), (None, 60, Decimal("120.00")))
+
+    def test_serie_temporal_de_ventas_completa_buckets_vacios(self):
+        otro = Producto.objects.create(nombre="Otro", precio=Decimal("5.00"), stock=10)
+        VentaDiariaProducto.objects.bulk_create(
+            [
+                VentaDiariaProducto(tienda=self.tienda, fecha=date(2026, 3, 2), producto=self.producto,
+                                    producto_nombre="Producto Test", unidades=2, revenue=Decimal("40.00")),
+                VentaDiariaProducto(tienda=self.tienda, fecha=date(2026, 3, 4), producto=self.producto,
+                                    producto_nombre="Producto Test", unidades=1, revenue=Decimal("20.00")),
+                VentaDiariaProducto(tienda=self.tienda, fecha=date(2026, 3, 17), producto=otro,
+                                    producto_nombre="Otro", unidades=1, revenue=Decimal("5.00")),
+            ]
+        )
+        params = {"tienda_id": self.tienda.id, "desde": "2026-03-01", "hasta": "2026-03-20", "interval": "week"}
+        with self.assertNumQueries(1):
+            resp = self.client.get(reverse("sales-timeseries"), params)
+        self.assertEqual(resp.status_code, 200)
+        (total,) = resp.data["series"]
+        self.assertEqual(
+            [(p["bucket"], p["unidades"], p["revenue"]) for p in total["puntos"]],
+            [
+                (date(2026, 2, 23), 0, Decimal("0.00")),
+                (date(2026, 3, 2), 3, Decimal("60.00")),
+                (date(2026, 3, 9), 0, Decimal("0.00")),
+                (date(2026, 3, 16), 1, Decimal("5.00")),
+            ],
+        )
+
+        resp = self.client.get(reverse("sales-timeseries"), {**params, "interval": "day", "split": "producto"})
+        self.assertEqual([serie["key"] for serie in resp.data["series"]], ["Producto Test", "Otro"])
+        self.assertEqual(len(resp.data["series"][1]["puntos"]), 20)
+
+    def test_exportar_ventas_en_streaming(self):
+        otro = Producto.objects.create(nombre="Otro", precio=Decimal("5.00"), stock=10)
+        for cantidades in ({self.producto: 2, otro: 1}, {self.producto: 1}):
+            cart = get_or_create_cart(self.user, self.tienda)
+            CartItem.objects.bulk_create(
+                [CartItem(cart=cart, producto=p, cantidad=n, precio_unitario=p.precio) for p, n in cantidades.items()]
+            )
+            confirm_payment(checkout_cart(self.user, self.tienda), "testpay")
+        primera, segunda = SaleEvent.objects.order_by("created_at", "id")
+
+        resp = self.client.get(reverse("sales-events-export"), {"tienda_id": self.tienda.id})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "text/csv; charset=utf-8")
+        filas = list(csv.DictReader(StringIO(b"".join(resp.streaming_content).decode())))
+        self.assertEqual(
+            [(int(f["sale_event_id"]), f["producto_nombre"], f["cantidad"]) for f in filas],
+            [(primera.id, "Producto Test", "2"), (primera.id, "Otro", "1"), (segunda.id, "Producto Test", "1")],
+        )
+
+        resp = self.client.get(reverse("sales-events-export"), {"tienda_id": self.tienda.id, "formato": "ndjson"})
+        eventos = [json.loads(linea) for linea in b"".join(resp.streaming_content).decode().splitlines()]
+        self.assertEqual([e["sale_event_id"] for e in eventos], [primera.id, segunda.id])
+        self.assertEqual(eventos[0]["items"][1]["total_linea"], "5.00")
+
+        manana = (timezone.localdate() + timedelta(days=1)).isoformat()
+        resp = self.client.get(reverse("sales-events-export"), {"desde": manana, "formato": "ndjson"})
+        self.assertEqual(b"".join(resp.streaming_content), b"")
+        self.assertEqual(self.client.get(reverse("sales-events-export"), {"formato": "xml"}).status_code, 400)
+
+
+class SaleEventFiltrosTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "pass1234")
+        self.client.force_authenticate(self.user)
+        cuenta = Cuenta.objects.create(user=self.user, nombre="Cuenta Test", nombre_usuario="ctest", contrasena="x")
+        self.tienda = Tienda.objects.create(nombre="Tienda Test", cuenta=cuenta)
+        self.tz = ZoneInfo("America/Santiago")
+
+    def _evento(self, dia: date, hora: time) -> SaleEvent:
+        evento = SaleEvent.objects.create(tienda=self.tienda, user=self.user, source=SaleEvent.Source.MANUAL)
+        SaleEvent.objects.filter(pk=evento.pk).update(created_at=datetime.combine(dia, hora, tzinfo=self.tz))
+        return evento
+
+    def test_rango_local_es_semiabierto_en_medianoche_local(self):
+        with timezone.override(self.tz):
+            inicio, fin = rango_local(date(2026, 3, 2), date(2026, 3, 2))
+        self.assertEqual(inicio, datetime(2026, 3, 2, tzinfo=self.tz))
+        self.assertEqual(fin, datetime(2026, 3, 3, tzinfo=self.tz))
+        self.assertEqual(rango_local(None, None), (None, None))
+
+    def test_desde_hasta_filtran_por_fecha_local(self):
+        self._evento(date(2026, 3, 1), time(23, 59, 59))
+        medianoche = self._evento(date(2026, 3, 2), time(0))
+        ultimo_segundo = self._evento(date(2026, 3, 2), time(23, 59, 59))
+        self._evento(date(2026, 3, 3), time(0))
+
+        with timezone.override(self.tz):
+            resp = self.client.get(reverse("sales-events"), {"desde": "2026-03-02", "hasta": "2026-03-02"})
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual([r["id"] for r in resp.data["results"]], [ultimo_segundo.id, medianoche.id])
+
+            resp = self.client.get(reverse("sales-events"), {"desde": "2026-03-02"})
+            self.assertEqual(len(resp.data["results"]), 3)
+            resp = self.client.get(reverse("sales-events"), {"hasta": "2026-03-01"})
+            self.assertEqual(len(resp.data["results"]), 1)
+
+    def test_fechas_invalidas_responden_400(self):
+        for url in (reverse("sales-events"), reverse("sales-events-export"), reverse("sales-summary")):
+            resp = self.client.get(url, {"desde": "2025-02-30"})
+            self.assertEqual(resp.status_code, 400, url)
+            self.assertIn("desde", resp.data)
+            resp = self.client.get(url, {"desde": "2025-03-02", "hasta": "2025-03-01"})
+            self.assertEqual(resp.status_code, 400, url)
+            self.assertIn("hasta", resp.data)
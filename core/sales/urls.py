@@ -1,10 +1,18 @@
 from django.urls import path
 
-from .views import SaleEventDetailView, SaleEventListView, SalesSummaryView
+from .views import (
+    SaleEventDetailView,
+    SaleEventExportView,
+    SaleEventListView,
+    SalesSummaryView,
+    SalesTimeseriesView,
+)
 
 urlpatterns = [
     path("summary/", SalesSummaryView.as_view(), name="sales-summary"),
+    path("timeseries/", SalesTimeseriesView.as_view(), name="sales-timeseries"),
     path("events/", SaleEventListView.as_view(), name="sales-events"),
+    path("events/export/", SaleEventExportView.as_view(), name="sales-events-export"),
     path("events/<int:pk>/", SaleEventDetailView.as_view(), name="sales-event-detail"),
 ]
 
@@ -1,87 +1,204 @@
+from datetime import date, timedelta
 from decimal import Decimal
 
-from django.db.models import Sum
-from django.utils.dateparse import parse_date
-from rest_framework import generics, permissions
+from django.db.models import F, Max, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.http import StreamingHttpResponse
+from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from common.pagination import get_page_number_pagination
+from common.pagination import get_keyset_pagination
 from common.permissions import IsAdminOrOwner
 
-from .models import SaleEvent, SaleItem
-from .serializers import SaleEventSerializer
+from .exports import eventos_para_exportar, filas_csv, filas_ndjson
+from .models import SaleEvent, VentaDiariaCategoria, VentaDiariaProducto
+from .serializers import SaleEventSerializer, SalesRangoQuerySerializer, SalesTimeseriesQuerySerializer
+from .services import rango_local
 
 
 class SalesSummaryView(APIView):
+    """
+    Totales por producto o categoria leidos de los rollups diarios (`VentaDiariaProducto`,
+    `VentaDiariaCategoria`): el costo depende de dias x claves del rango, no de la cantidad de ventas.
+    """
+
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
         group_by = request.query_params.get("group_by", "producto")
-        qs = SaleItem.objects.select_related("sale_event")
-        tienda_id = request.query_params.get("tienda_id")
-        if tienda_id:
-            qs = qs.filter(sale_event__tienda_id=tienda_id)
-
-        desde = request.query_params.get("desde")
-        hasta = request.query_params.get("hasta")
-        if desde:
-            fecha = parse_date(desde)
-            if fecha:
-                qs = qs.filter(sale_event__created_at__date__gte=fecha)
-        if hasta:
-            fecha = parse_date(hasta)
-            if fecha:
-                qs = qs.filter(sale_event__created_at__date__lte=fecha)
-
         if group_by == "categoria":
-            data = (
-                qs.values("categoria_snapshot_id", "categoria_snapshot_nombre")
-                .annotate(unidades=Sum("cantidad"), revenue=Sum("total_linea"))
-                .order_by("-revenue")
-            )
-            respuesta = [
-                {
-                    "key": item["categoria_snapshot_nombre"] or f"categoria-{item['categoria_snapshot_id']}",
-                    "unidades": item["unidades"] or 0,
-                    "revenue": item["revenue"] or Decimal("0"),
-                }
-                for item in data
-            ]
+            qs = VentaDiariaCategoria.objects.all()
+            claves = ("categoria_snapshot_id",)
+            nombre = Max("categoria_snapshot_nombre")
         else:
-            data = (
-                qs.values("producto_id", "producto_nombre")
-                .annotate(unidades=Sum("cantidad"), revenue=Sum("total_linea"))
-                .order_by("-revenue")
-            )
-            respuesta = [
-                {
-                    "key": item["producto_nombre"] or f"producto-{item['producto_id']}",
-                    "unidades": item["unidades"] or 0,
-                    "revenue": item["revenue"] or Decimal("0"),
-                }
-                for item in data
-            ]
+            qs = VentaDiariaProducto.objects.all()
+            claves = ("producto_id",)
+            nombre = Max("producto_nombre")
+
+        filtros = SalesRangoQuerySerializer(data=request.query_params)
+        filtros.is_valid(raise_exception=True)
+        datos = filtros.validated_data
+        if "tienda_id" in datos:
+            qs = qs.filter(tienda_id=datos["tienda_id"])
+        if "desde" in datos:
+            qs = qs.filter(fecha__gte=datos["desde"])
+        if "hasta" in datos:
+            qs = qs.filter(fecha__lte=datos["hasta"])
+
+        data = (
+            qs.values(*claves)
+            .annotate(nombre=nombre, unidades=Sum("unidades"), revenue=Sum("revenue"))
+            .order_by("-revenue")
+        )
+        prefijo = "categoria" if group_by == "categoria" else "producto"
+        respuesta = [
+            {
+                "key": item["nombre"] or f"{prefijo}-{item[claves[0]]}",
+                "unidades": item["unidades"] or 0,
+                "revenue": item["revenue"] or Decimal("0"),
+            }
+            for item in data
+        ]
         return Response(respuesta)
 
 
-class SaleEventListView(generics.ListAPIView):
-    serializer_class = SaleEventSerializer
-    permission_classes = [IsAdminOrOwner]
-    pagination_class = get_page_number_pagination(20)
+def _inicio_bucket(fecha: date, interval: str) -> date:
+    if interval == "week":
+        return fecha - timedelta(days=fecha.weekday())
+    if interval == "month":
+        return fecha.replace(day=1)
+    return fecha
+
+
+def _siguiente_bucket(fecha: date, interval: str) -> date:
+    if interval == "week":
+        return fecha + timedelta(days=7)
+    if interval == "month":
+        return (fecha.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return fecha + timedelta(days=1)
+
+
+class SalesTimeseriesView(APIView):
+    """
+    Serie temporal de ventas por dia/semana (lunes)/mes, total o separada por producto/categoria.
+    Una sola consulta agregada sobre los rollups diarios con Trunc; los buckets sin ventas se
+    completan con cero en memoria. Con interval=week/month el primer y el ultimo bucket pueden
+    quedar parciales: solo suman los dias dentro de [desde, hasta].
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    TRUNC = {"day": None, "week": TruncWeek, "month": TruncMonth}
+
+    def get(self, request):
+        serializer = SalesTimeseriesQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+        interval, split = datos["interval"], datos.get("split")
+
+        if split == "categoria":
+            modelo, clave, campo_nombre = VentaDiariaCategoria, "categoria_snapshot_id", "categoria_snapshot_nombre"
+        else:
+            modelo, clave, campo_nombre = VentaDiariaProducto, "producto_id", "producto_nombre"
+        qs = modelo.objects.filter(fecha__gte=datos["desde"], fecha__lte=datos["hasta"])
+        if "tienda_id" in datos:
+            qs = qs.filter(tienda_id=datos["tienda_id"])
+
+        trunc = self.TRUNC[interval]
+        qs = qs.annotate(bucket=trunc("fecha") if trunc else F("fecha"))
+        agrupado = ("bucket", clave) if split else ("bucket",)
+        extra = {"nombre": Max(campo_nombre)} if split else {}
+        filas = qs.values(*agrupado).annotate(unidades=Sum("unidades"), revenue=Sum("revenue"), **extra).order_by()
+
+        buckets = []
+        bucket = _inicio_bucket(datos["desde"], interval)
+        while bucket <= datos["hasta"]:
+            buckets.append(bucket)
+            bucket = _siguiente_bucket(bucket, interval)
+
+        series = {}
+        for fila in filas:
+            id_serie = fila[clave] if split else None
+            serie = series.setdefault(id_serie, {"id": id_serie, "key": "total", "revenue": Decimal("0"), "puntos": {}})
+            if split:
+                serie["key"] = fila["nombre"] or f"{split}-{id_serie}"
+            serie["revenue"] += fila["revenue"] or Decimal("0")
+            serie["puntos"][fila["bucket"]] = (fila["unidades"] or 0, fila["revenue"] or Decimal("0"))
+        if not split and not series:
+            series[None] = {"id": None, "key": "total", "revenue": Decimal("0"), "puntos": {}}
+
+        cero = (0, Decimal("0.00"))
+        respuesta = []
+        for serie in sorted(series.values(), key=lambda serie: serie["revenue"], reverse=True):
+            puntos = []
+            for bucket in buckets:
+                unidades, revenue = serie["puntos"].get(bucket, cero)
+                puntos.append({"bucket": bucket, "unidades": unidades, "revenue": revenue})
+            respuesta.append({"id": serie["id"], "key": serie["key"], "puntos": puntos})
+        return Response(
+            {
+                "interval": interval,
+                "split": split,
+                "desde": datos["desde"],
+                "hasta": datos["hasta"],
+                "series": respuesta,
+            }
+        )
+
+
+class SaleEventFiltrosMixin:
+    """Filtros compartidos por el listado y la exportacion: tienda_id, desde/hasta (fechas locales) y dueño."""
 
     def get_queryset(self):
-        qs = SaleEvent.objects.select_related("tienda", "user", "order", "cita").prefetch_related("items").order_by(
-            "-created_at"
+        qs = (
+            SaleEvent.objects.select_related("tienda", "user", "order", "cita")
+            .prefetch_related("items")
+            .order_by("-created_at", "-id")
         )
-        tienda_id = self.request.query_params.get("tienda_id")
-        if tienda_id:
-            qs = qs.filter(tienda_id=tienda_id)
+        filtros = SalesRangoQuerySerializer(data=self.request.query_params)
+        filtros.is_valid(raise_exception=True)
+        datos = filtros.validated_data
+        if "tienda_id" in datos:
+            qs = qs.filter(tienda_id=datos["tienda_id"])
+        desde, hasta = rango_local(datos.get("desde"), datos.get("hasta"))
+        if desde:
+            qs = qs.filter(created_at__gte=desde)
+        if hasta:
+            qs = qs.filter(created_at__lt=hasta)
         if self.request.user.is_staff:
             return qs
         return qs.filter(user=self.request.user)
 
 
+class SaleEventListView(SaleEventFiltrosMixin, generics.ListAPIView):
+    serializer_class = SaleEventSerializer
+    permission_classes = [IsAdminOrOwner]
+    pagination_class = get_keyset_pagination(("-created_at", "-id"), 20, conteo_estimado=True)
+
+
+class SaleEventExportView(SaleEventFiltrosMixin, APIView):
+    """
+    Exporta los eventos de venta filtrados (mismos parametros que el listado) en streaming:
+    `formato=csv` (una fila por item, por defecto) o `formato=ndjson` (un evento por linea).
+    """
+
+    permission_classes = [IsAdminOrOwner]
+    FORMATOS = {
+        "csv": (filas_csv, "text/csv; charset=utf-8", "csv"),
+        "ndjson": (filas_ndjson, "application/x-ndjson", "ndjson"),
+    }
+
+    def get(self, request):
+        formato = request.query_params.get("formato", "csv")
+        if formato not in self.FORMATOS:
+            return Response({"formato": "Formato invalido. Use csv o ndjson."}, status=status.HTTP_400_BAD_REQUEST)
+        generar, content_type, extension = self.FORMATOS[formato]
+        ventas = eventos_para_exportar(self.get_queryset().order_by("created_at", "id"))
+        response = StreamingHttpResponse(generar(ventas), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="ventas.{extension}"'
+        return response
+
+
 class SaleEventDetailView(generics.RetrieveAPIView):
     serializer_class = SaleEventSerializer
     permission_classes = [IsAdminOrOwner]
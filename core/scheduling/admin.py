@@ -1,6 +1,13 @@
 from django.contrib import admin
 
-from .models import Cita, ExcepcionDisponibilidad, ReglaDisponibilidadRecurrente, RecursoReservable, Servicio
+from .models import (
+    Cita,
+    DisponibilidadDiaria,
+    ExcepcionDisponibilidad,
+    ReglaDisponibilidadRecurrente,
+    RecursoReservable,
+    Servicio,
+)
 
 
 @admin.register(RecursoReservable)
@@ -35,3 +42,9 @@ class CitaAdmin(admin.ModelAdmin):
     list_filter = ("estado", "pago_confirmado", "recurso", "servicio")
     search_fields = ("titulo", "producto__nombre", "user__username")
 
+
+@admin.register(DisponibilidadDiaria)
+class DisponibilidadDiariaAdmin(admin.ModelAdmin):
+    list_display = ("recurso", "servicio", "fecha", "slots_libres", "capacidad_restante", "actualizado_en")
+    list_filter = ("recurso",)
+    date_hierarchy = "fecha"
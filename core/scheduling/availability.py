@@ -0,0 +1,251 @@
+"""
+Motor de disponibilidad en memoria.
+
+`CalendarioRecurso` carga una sola vez las reglas recurrentes, excepciones y citas agendadas de
+un recurso para un rango de fechas y luego responde en memoria: ventanas abiertas por dia,
+ocupacion de un intervalo y busqueda de slots. Las reglas son las mismas de `Cita.clean`:
+una excepcion `closed` que solapa bloquea; una excepcion `open` o una regla vigente deben
+cubrir el intervalo completo; la ocupacion no puede alcanzar la `capacidad` del recurso.
+"""
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from django.db.models import Q
+
+from .models import Cita, ExcepcionDisponibilidad, RecursoReservable, ReglaDisponibilidadRecurrente, Servicio
+from .timezones import zona_de_recurso
+
+
+class Slot(NamedTuple):
+    inicio: datetime
+    fin: datetime
+    capacidad_restante: int
+
+
+def _rango_fechas(desde: date, hasta: date) -> Iterable[date]:
+    dia = desde
+    while dia <= hasta:
+        yield dia
+        dia += timedelta(days=1)
+
+
+class CalendarioRecurso:
+    """Disponibilidad de un recurso entre `desde` y `hasta` (fechas locales, inclusive)."""
+
+    def __init__(self, recurso: RecursoReservable, desde: date, hasta: date, reglas, excepciones, citas):
+        self.recurso = recurso
+        self.desde = desde
+        self.hasta = hasta
+        self.tz = self.zona(recurso)
+
+        self._reglas_por_dia: Dict[int, list] = defaultdict(list)
+        for regla in reglas:
+            self._reglas_por_dia[regla.dia_semana].append(regla)
+
+        self._excepciones_por_fecha: Dict[date, list] = defaultdict(list)
+        for excepcion in excepciones:
+            self._excepciones_por_fecha[excepcion.fecha].append(excepcion)
+
+        # Citas ordenadas por inicio (y fines ordenados aparte para ocupacion puntual); la duracion
+        # maxima acota la busqueda de solapes con bisect.
+        self._citas: List[Tuple[datetime, datetime, int]] = sorted((c.inicio, c.fin, c.pk) for c in citas)
+        self._inicios = [inicio for inicio, _, _ in self._citas]
+        self._fines = sorted(fin for _, fin, _ in self._citas)
+        self._por_pk = {pk: (inicio, fin) for inicio, fin, pk in self._citas}
+        self._duracion_maxima = max((fin - inicio for inicio, fin, _ in self._citas), default=timedelta())
+
+    @staticmethod
+    def zona(recurso: RecursoReservable) -> ZoneInfo:
+        return zona_de_recurso(recurso)
+
+    @classmethod
+    def cargar(cls, recurso: RecursoReservable, desde: date, hasta: date) -> "CalendarioRecurso":
+        return cls.cargar_varios([recurso], desde, hasta)[recurso.pk]
+
+    @classmethod
+    def cargar_varios(
+        cls, recursos: Iterable[RecursoReservable], desde: date, hasta: date
+    ) -> Dict[int, "CalendarioRecurso"]:
+        """Carga varios recursos con tres consultas en total (reglas, excepciones, citas)."""
+        recursos = {recurso.pk: recurso for recurso in recursos}
+        reglas = defaultdict(list)
+        for regla in ReglaDisponibilidadRecurrente.objects.filter(
+            Q(vigente_desde__isnull=True) | Q(vigente_desde__lte=hasta),
+            Q(vigente_hasta__isnull=True) | Q(vigente_hasta__gte=desde),
+            recurso_id__in=recursos,
+            esta_activa=True,
+        ):
+            reglas[regla.recurso_id].append(regla)
+
+        excepciones = defaultdict(list)
+        for excepcion in ExcepcionDisponibilidad.objects.filter(
+            recurso_id__in=recursos, esta_activa=True, fecha__gte=desde, fecha__lte=hasta
+        ):
+            excepciones[excepcion.recurso_id].append(excepcion)
+
+        # Margen de un dia a cada lado: cubre cualquier desfase de zona horaria entre recursos.
+        limite_inferior = datetime.combine(desde - timedelta(days=1), time.min, tzinfo=dt_timezone.utc)
+        limite_superior = datetime.combine(hasta + timedelta(days=2), time.min, tzinfo=dt_timezone.utc)
+        citas = defaultdict(list)
+        for cita in Cita.objects.filter(
+            recurso_id__in=recursos,
+            estado=Cita.Estado.AGENDADA,
+            inicio__lt=limite_superior,
+            fin__gt=limite_inferior,
+        ).only("id", "recurso_id", "inicio", "fin"):
+            citas[cita.recurso_id].append(cita)
+
+        return {
+            pk: cls(recurso, desde, hasta, reglas[pk], excepciones[pk], citas[pk])
+            for pk, recurso in recursos.items()
+        }
+
+    # --- consultas en memoria -------------------------------------------------
+
+    def incluye(self, recurso_id: int, fecha: date) -> bool:
+        return self.recurso.pk == recurso_id and self.desde <= fecha <= self.hasta
+
+    def agregar_cita(self, pk: int, inicio: datetime, fin: datetime) -> None:
+        self.quitar_cita(pk)
+        insort(self._citas, (inicio, fin, pk))
+        insort(self._inicios, inicio)
+        insort(self._fines, fin)
+        self._por_pk[pk] = (inicio, fin)
+        self._duracion_maxima = max(self._duracion_maxima, fin - inicio)
+
+    def quitar_cita(self, pk: int) -> None:
+        intervalo = self._por_pk.pop(pk, None)
+        if intervalo is None:
+            return
+        inicio, fin = intervalo
+        del self._citas[bisect_left(self._citas, (inicio, fin, pk))]
+        del self._inicios[bisect_left(self._inicios, inicio)]
+        del self._fines[bisect_left(self._fines, fin)]
+
+    def capacidad_restante(self, instante: datetime) -> int:
+        """Capacidad libre en un instante: citas con inicio <= instante < fin, en O(log n)."""
+        activas = bisect_right(self._inicios, instante) - bisect_right(self._fines, instante)
+        return self.recurso.capacidad - activas
+
+    def ventanas(self, fecha: date, servicio_id: Optional[int]) -> List[Tuple[time, time]]:
+        """Ventanas abiertas del dia (reglas vigentes + excepciones `open`), sin fusionar."""
+        ventanas = [
+            (regla.hora_inicio, regla.hora_fin)
+            for regla in self._reglas_por_dia.get(fecha.weekday(), ())
+            if (regla.servicio_id is None or regla.servicio_id == servicio_id)
+            and (regla.vigente_desde is None or regla.vigente_desde <= fecha)
+            and (regla.vigente_hasta is None or regla.vigente_hasta >= fecha)
+        ]
+        ventanas.extend(
+            (excepcion.hora_inicio, excepcion.hora_fin)
+            for excepcion in self._excepciones_por_fecha.get(fecha, ())
+            if excepcion.tipo == ExcepcionDisponibilidad.Tipo.ABIERTO
+            and (excepcion.servicio_id is None or excepcion.servicio_id == servicio_id)
+        )
+        return ventanas
+
+    def hay_cierre(self, fecha: date, hora_inicio: time, hora_fin: time, servicio_id: Optional[int]) -> bool:
+        return any(
+            excepcion.tipo == ExcepcionDisponibilidad.Tipo.CERRADO
+            and (excepcion.servicio_id is None or excepcion.servicio_id == servicio_id)
+            and excepcion.hora_inicio < hora_fin
+            and excepcion.hora_fin > hora_inicio
+            for excepcion in self._excepciones_por_fecha.get(fecha, ())
+        )
+
+    def ocupacion(self, inicio: datetime, fin: datetime, excluir_pk: Optional[int] = None) -> int:
+        """Cantidad de citas agendadas que solapan [inicio, fin)."""
+        inicio = inicio.astimezone(dt_timezone.utc)
+        desde = bisect_right(self._inicios, inicio - self._duracion_maxima)
+        hasta = bisect_left(self._inicios, fin)
+        return sum(
+            1
+            for cita_inicio, cita_fin, pk in self._citas[desde:hasta]
+            if cita_fin > inicio and cita_inicio < fin and pk != excluir_pk
+        )
+
+    def cubre(self, fecha: date, hora_inicio: time, hora_fin: time, servicio_id: Optional[int]) -> bool:
+        """Alguna regla vigente o excepcion `open` cubre completo el intervalo local."""
+        return any(
+            inicio <= hora_inicio and fin >= hora_fin for inicio, fin in self.ventanas(fecha, servicio_id)
+        )
+
+    def errores_intervalo(
+        self, inicio: datetime, fin: datetime, servicio_id: Optional[int], excluir_pk: Optional[int] = None
+    ) -> Dict[str, str]:
+        """Errores de capacidad y disponibilidad para [inicio, fin), con las claves/mensajes de Cita.clean."""
+        errores = {}
+        if self.ocupacion(inicio, fin, excluir_pk) >= self.recurso.capacidad:
+            errores["inicio"] = "El recurso ya esta ocupado en ese intervalo."
+
+        inicio_local, fin_local = inicio.astimezone(self.tz), fin.astimezone(self.tz)
+        fecha, hora_inicio, hora_fin = inicio_local.date(), inicio_local.time(), fin_local.time()
+        if self.hay_cierre(fecha, hora_inicio, hora_fin, servicio_id):
+            errores["inicio"] = "Hay una excepcion de cierre en el horario solicitado."
+        elif not self.cubre(fecha, hora_inicio, hora_fin, servicio_id):
+            errores["inicio"] = "El intervalo solicitado esta fuera de la disponibilidad del recurso."
+        return errores
+
+    def iterar_slots(
+        self,
+        servicio: Servicio,
+        duracion: Optional[timedelta] = None,
+        paso: Optional[timedelta] = None,
+        despues_de: Optional[datetime] = None,
+    ) -> Iterator[Slot]:
+        """Generador de slots ordenados por inicio; calcula cada dia solo cuando se le pide."""
+        desde = max(despues_de.astimezone(self.tz).date(), self.desde) if despues_de else self.desde
+        for fecha in _rango_fechas(desde, self.hasta):
+            yield from self.slots_del_dia(servicio, fecha, duracion, paso, despues_de)
+
+    def slots_del_dia(
+        self,
+        servicio: Servicio,
+        fecha: date,
+        duracion: Optional[timedelta] = None,
+        paso: Optional[timedelta] = None,
+        despues_de: Optional[datetime] = None,
+    ) -> List[Slot]:
+        """Slots reservables de una fecha local del rango, ordenados por inicio."""
+        duracion = duracion or servicio.duracion_total_esperada
+        paso = paso or duracion
+        capacidad = self.recurso.capacidad
+        encontrados: Dict[datetime, Slot] = {}
+        for hora_inicio, hora_fin in self.ventanas(fecha, servicio.pk):
+            cursor = datetime.combine(fecha, hora_inicio, tzinfo=self.tz)
+            limite = datetime.combine(fecha, hora_fin, tzinfo=self.tz)
+            while cursor + duracion <= limite:
+                fin = cursor + duracion
+                if (
+                    cursor not in encontrados
+                    and (despues_de is None or cursor >= despues_de)
+                    and not self.hay_cierre(fecha, cursor.time(), fin.time(), servicio.pk)
+                ):
+                    restante = capacidad - self.ocupacion(cursor, fin)
+                    if restante > 0:
+                        encontrados[cursor] = Slot(cursor, fin, restante)
+                cursor += paso
+        return [encontrados[inicio] for inicio in sorted(encontrados)]
+
+    def slots(
+        self,
+        servicio: Servicio,
+        duracion: Optional[timedelta] = None,
+        paso: Optional[timedelta] = None,
+        despues_de: Optional[datetime] = None,
+    ) -> List[Slot]:
+        """Slots reservables del rango, ordenados por inicio, con su capacidad restante."""
+        return list(self.iterar_slots(servicio, duracion, paso, despues_de))
+
+    def primer_hueco(
+        self,
+        servicio: Servicio,
+        despues_de: datetime,
+        duracion: Optional[timedelta] = None,
+        paso: Optional[timedelta] = None,
+    ) -> Optional[Slot]:
+        """Primer slot reservable que empieza en `despues_de` o despues, dentro del rango cargado."""
+        return next(self.iterar_slots(servicio, duracion, paso, despues_de), None)
@@ -0,0 +1,22 @@
+import django_filters
+
+from .models import DisponibilidadDiaria
+
+
+class NumberInFilter(django_filters.BaseInFilter, django_filters.NumberFilter):
+    pass
+
+
+class DisponibilidadDiariaFilter(django_filters.FilterSet):
+    # Filtra por id directo (sin validar cada recurso/servicio contra la base).
+    recurso = django_filters.NumberFilter(field_name="recurso_id")
+    recurso__in = NumberInFilter(field_name="recurso_id")
+    servicio = django_filters.NumberFilter(field_name="servicio_id")
+    servicio__in = NumberInFilter(field_name="servicio_id")
+    fecha__gte = django_filters.DateFilter(field_name="fecha", lookup_expr="gte")
+    fecha__lte = django_filters.DateFilter(field_name="fecha", lookup_expr="lte")
+    slots_libres__gte = django_filters.NumberFilter(field_name="slots_libres", lookup_expr="gte")
+
+    class Meta:
+        model = DisponibilidadDiaria
+        fields = ["fecha"]
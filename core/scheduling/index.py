@@ -0,0 +1,96 @@
+"""
+Indice de disponibilidad en memoria por RecursoReservable.
+
+Mantiene, por proceso, un `CalendarioRecurso` por recurso cubriendo desde ayer hasta
+SCHEDULING_INDICE_HORIZONTE_DIAS, construido de forma perezosa y con expulsion LRU acotada
+por SCHEDULING_INDICE_MAX_RECURSOS. Las señales de `Cita` lo actualizan en el proceso que
+escribe; SCHEDULING_INDICE_TTL (segundos) acota cuanto puede atrasarse frente a escrituras
+de otros procesos. Es una vista de lectura: `Cita.clean` sigue validando contra la base.
+"""
+import threading
+import time as monotonic_time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+from .availability import CalendarioRecurso
+from .models import Cita, RecursoReservable
+from .timezones import local, zona_de_recurso
+
+
+class RegistroIndices:
+    def __init__(self, max_recursos: int, horizonte_dias: int, ttl: float):
+        self.max_recursos = max_recursos
+        self.horizonte_dias = horizonte_dias
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._indices: "OrderedDict[int, tuple[float, CalendarioRecurso]]" = OrderedDict()
+
+    def _vigente(self, construido_en: float, calendario: CalendarioRecurso) -> bool:
+        if monotonic_time.monotonic() - construido_en > self.ttl:
+            return False
+        return calendario.incluye(calendario.recurso.pk, timezone.localdate(timezone=calendario.tz))
+
+    def obtener(self, recurso: RecursoReservable) -> CalendarioRecurso:
+        with self._lock:
+            entrada = self._indices.get(recurso.pk)
+            if entrada is not None and self._vigente(*entrada):
+                self._indices.move_to_end(recurso.pk)
+                return entrada[1]
+
+        # La carga se hace fuera del lock para no serializar consultas de distintos recursos.
+        # El horizonte se ancla en la fecha local del recurso, no en la zona del proyecto.
+        hoy = local(timezone.now(), zona_de_recurso(recurso)).fecha
+        calendario = CalendarioRecurso.cargar(
+            recurso, hoy - timedelta(days=1), hoy + timedelta(days=self.horizonte_dias)
+        )
+        with self._lock:
+            self._indices[recurso.pk] = (monotonic_time.monotonic(), calendario)
+            self._indices.move_to_end(recurso.pk)
+            while len(self._indices) > self.max_recursos:
+                self._indices.popitem(last=False)
+        return calendario
+
+    def capacidad_restante(self, recurso: RecursoReservable, instante) -> int:
+        calendario = self.obtener(recurso)
+        if not calendario.incluye(recurso.pk, instante.astimezone(calendario.tz).date()):
+            fecha = instante.astimezone(calendario.tz).date()
+            calendario = CalendarioRecurso.cargar(recurso, fecha, fecha)
+            return calendario.capacidad_restante(instante)
+        with self._lock:
+            return calendario.capacidad_restante(instante)
+
+    def primer_hueco(self, recurso: RecursoReservable, servicio, despues_de, duracion: Optional[timedelta] = None):
+        calendario = self.obtener(recurso)
+        with self._lock:
+            return calendario.primer_hueco(servicio, despues_de, duracion=duracion)
+
+    def cita_guardada(self, cita: Cita) -> None:
+        with self._lock:
+            for _, calendario in self._indices.values():
+                calendario.quitar_cita(cita.pk)
+            entrada = self._indices.get(cita.recurso_id)
+            if entrada is not None and cita.estado == Cita.Estado.AGENDADA:
+                entrada[1].agregar_cita(cita.pk, cita.inicio, cita.fin)
+
+    def cita_eliminada(self, cita_pk: int) -> None:
+        with self._lock:
+            for _, calendario in self._indices.values():
+                calendario.quitar_cita(cita_pk)
+
+    def invalidar(self, recurso_id: Optional[int] = None) -> None:
+        with self._lock:
+            if recurso_id is None:
+                self._indices.clear()
+            else:
+                self._indices.pop(recurso_id, None)
+
+
+registro = RegistroIndices(
+    max_recursos=getattr(settings, "SCHEDULING_INDICE_MAX_RECURSOS", 256),
+    horizonte_dias=getattr(settings, "SCHEDULING_INDICE_HORIZONTE_DIAS", 60),
+    ttl=getattr(settings, "SCHEDULING_INDICE_TTL", 300),
+)
@@ -0,0 +1,140 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from scheduling.availability import CalendarioRecurso
+from scheduling.index import RegistroIndices
+from scheduling.models import Cita, RecursoReservable, ReglaDisponibilidadRecurrente, Servicio
+from scheduling.timezones import local, zona
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara consultas de agenda via ORM contra el indice en memoria sobre datos sinteticos "
+        "(se crean dentro de una transaccion que se revierte al final)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--citas", type=int, default=2000)
+        parser.add_argument("--consultas", type=int, default=500)
+        parser.add_argument("--dias", type=int, default=30)
+        parser.add_argument("--capacidad", type=int, default=3)
+        parser.add_argument("--semilla", type=int, default=7)
+        parser.add_argument(
+            "--zonas",
+            metavar="ZONA",
+            nargs="?",
+            const="America/Santiago",
+            help="Solo micro-benchmark de conversion a hora local (sin base de datos).",
+        )
+
+    def handle(self, *args, **options):
+        if options["zonas"]:
+            self._benchmark_zonas(options["zonas"], options["consultas"], random.Random(options["semilla"]))
+            return
+        with transaction.atomic():
+            self._ejecutar(options)
+            transaction.set_rollback(True)
+
+    def _ejecutar(self, options):
+        azar = random.Random(options["semilla"])
+        dias = options["dias"]
+        recurso = RecursoReservable.objects.create(
+            nombre=f"benchmark-{timezone.now().timestamp()}", zona_horaria="UTC", capacidad=options["capacidad"]
+        )
+        servicio = Servicio.objects.create(recurso=recurso, nombre="benchmark", duracion=timedelta(minutes=30))
+        ReglaDisponibilidadRecurrente.objects.bulk_create(
+            ReglaDisponibilidadRecurrente(
+                recurso=recurso,
+                dia_semana=dia,
+                hora_inicio=datetime.min.time().replace(hour=8),
+                hora_fin=datetime.min.time().replace(hour=20),
+            )
+            for dia in range(7)
+        )
+
+        hoy = timezone.localdate()
+        base = datetime.combine(hoy, datetime.min.time(), tzinfo=dt_timezone.utc)
+        slots_por_dia = 24  # 8:00-20:00 en bloques de 30 minutos
+        citas = []
+        for _ in range(options["citas"]):
+            inicio = base + timedelta(days=azar.randrange(dias), hours=8, minutes=30 * azar.randrange(slots_por_dia))
+            fin = inicio + timedelta(minutes=30)
+            citas.append(Cita(recurso=recurso, servicio=servicio, titulo="benchmark", inicio=inicio, fin=fin))
+        Cita.objects.bulk_create(citas, batch_size=1000)
+
+        instantes = [
+            base + timedelta(days=azar.randrange(dias), minutes=azar.randrange(24 * 60))
+            for _ in range(options["consultas"])
+        ]
+
+        def orm_capacidad(instante):
+            return recurso.capacidad - Cita.objects.filter(
+                recurso=recurso, estado=Cita.Estado.AGENDADA, inicio__lte=instante, fin__gt=instante
+            ).count()
+
+        def orm_primer_hueco(instante):
+            fecha = instante.date()
+            calendario = CalendarioRecurso.cargar(recurso, fecha, fecha + timedelta(days=dias))
+            return calendario.primer_hueco(servicio, instante)
+
+        registro = RegistroIndices(max_recursos=1, horizonte_dias=dias, ttl=3600)
+        inicio_carga = time.perf_counter()
+        registro.obtener(recurso)
+        carga_ms = (time.perf_counter() - inicio_carga) * 1000
+
+        resultados = [
+            ("capacidad (ORM)", self._medir(orm_capacidad, instantes)),
+            ("capacidad (indice)", self._medir(lambda t: registro.capacidad_restante(recurso, t), instantes)),
+            ("primer hueco (ORM)", self._medir(orm_primer_hueco, instantes)),
+            ("primer hueco (indice)", self._medir(lambda t: registro.primer_hueco(recurso, servicio, t), instantes)),
+        ]
+
+        for instante in instantes[:50]:
+            if orm_capacidad(instante) != registro.capacidad_restante(recurso, instante):
+                self.stderr.write(self.style.ERROR(f"Capacidad distinta en {instante.isoformat()}"))
+
+        self.stdout.write(
+            f"Citas: {len(citas)} | consultas: {len(instantes)} | dias: {dias} | carga del indice: {carga_ms:.2f} ms"
+        )
+        for nombre, (promedio, p95) in resultados:
+            self.stdout.write(f"{nombre:<24} promedio {promedio * 1000:8.1f} us   p95 {p95 * 1000:8.1f} us")
+
+    def _benchmark_zonas(self, nombre, cantidad, azar):
+        base = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        instantes = [base + timedelta(minutes=azar.randrange(2 * 365 * 24 * 60)) for _ in range(cantidad)]
+
+        def directo():
+            # Ruta anterior de Cita._fechas_locales: ZoneInfo por llamada y dos conversiones.
+            resultado = []
+            for instante in instantes:
+                tz = ZoneInfo(nombre)
+                resultado.append((timezone.localtime(instante, tz), timezone.localtime(instante, tz)))
+            return resultado
+
+        def memoizado():
+            tz = zona(nombre)
+            return [local(instante, tz) for instante in instantes]
+
+        self.stdout.write(f"Zona: {nombre} | instantes: {cantidad}")
+        casos = (("ZoneInfo por llamada", directo), ("zona memoizada", memoizado))
+        for etiqueta, funcion in casos:
+            inicio = time.perf_counter()
+            funcion()
+            por_llamada = (time.perf_counter() - inicio) / cantidad * 1_000_000
+            self.stdout.write(f"{etiqueta:<24} {por_llamada:8.3f} us/instante")
+
+    @staticmethod
+    def _medir(funcion, instantes):
+        tiempos = []
+        for instante in instantes:
+            inicio = time.perf_counter()
+            funcion(instante)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        tiempos.sort()
+        return sum(tiempos) / len(tiempos), tiempos[int(len(tiempos) * 0.95) - 1 if len(tiempos) > 1 else 0]
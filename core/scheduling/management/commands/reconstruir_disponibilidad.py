@@ -0,0 +1,57 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+
+from scheduling.models import RecursoReservable
+from scheduling.services import (
+    avanzar_horizonte_disponibilidad,
+    horizonte_disponibilidad,
+    procesar_disponibilidad_pendiente,
+    reconstruir_disponibilidad,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula (backfill) la tabla DisponibilidadDiaria por lotes de recursos. Con --pendientes consume "
+        "los rangos marcados por los cambios de agenda (cron cada minuto) y con --avanzar corre el horizonte "
+        "un dia (cron diario)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--recurso", type=int, action="append", help="Id de recurso (repetible). Por defecto todos."
+        )
+        parser.add_argument("--desde", type=date.fromisoformat, help="Fecha inicial YYYY-MM-DD (por defecto hoy).")
+        parser.add_argument("--dias", type=int, help="Dias a recalcular (por defecto todo el horizonte).")
+        parser.add_argument("--lote", type=int, default=50, help="Recursos por transaccion.")
+        parser.add_argument("--pendientes", action="store_true", help="Procesa los rangos pendientes y termina.")
+        parser.add_argument(
+            "--avanzar", action="store_true", help="Borra fechas pasadas y calcula los dias nuevos del horizonte."
+        )
+
+    def handle(self, *args, **options):
+        if options["pendientes"] or options["avanzar"]:
+            if options["avanzar"]:
+                borradas, escritas = avanzar_horizonte_disponibilidad(options["lote"])
+                self.stdout.write(self.style.SUCCESS(f"Horizonte: filas borradas {borradas} | escritas {escritas}"))
+            if options["pendientes"]:
+                rangos, filas = 0, 0
+                while True:
+                    procesados, escritas = procesar_disponibilidad_pendiente()
+                    rangos, filas = rangos + procesados, filas + escritas
+                    if not procesados:
+                        break
+                self.stdout.write(self.style.SUCCESS(f"Pendientes: {rangos} | filas escritas: {filas}"))
+            return
+
+        desde, hasta = horizonte_disponibilidad()
+        desde = options["desde"] or desde
+        if options["dias"]:
+            hasta = desde + timedelta(days=options["dias"] - 1)
+
+        ids = options["recurso"] or list(RecursoReservable.objects.order_by("id").values_list("id", flat=True))
+        filas = 0
+        for inicio in range(0, len(ids), options["lote"]):
+            filas += reconstruir_disponibilidad(ids[inicio:inicio + options["lote"]], desde, hasta)
+        self.stdout.write(self.style.SUCCESS(f"Recursos: {len(ids)} | filas escritas: {filas}"))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0002_cita_confirmed_at_cita_pago_confirmado_cita_user_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DisponibilidadDiaria',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('intervalos_libres', models.JSONField(default=list, help_text='Intervalos locales con cupo: [{"inicio": "HH:MM:SS", "fin": "HH:MM:SS"}].')),
+                ('slots_libres', models.PositiveIntegerField(default=0)),
+                ('capacidad_restante', models.PositiveIntegerField(default=0, help_text='Mayor capacidad restante entre los slots del dia.')),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+                ('recurso', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='disponibilidad_diaria', to='scheduling.recursoreservable')),
+                ('servicio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='disponibilidad_diaria', to='scheduling.servicio')),
+            ],
+            options={
+                'db_table': 'programacion_disponibilidad_diaria',
+                'ordering': ['fecha', 'recurso_id', 'servicio_id'],
+                'indexes': [models.Index(fields=['servicio', 'fecha'], name='programacio_servici_0efd1d_idx'), models.Index(fields=['fecha', 'recurso'], name='programacio_fecha_a3e36c_idx')],
+                'constraints': [models.UniqueConstraint(fields=('recurso', 'servicio', 'fecha'), name='uq_disponibilidad_diaria')],
+            },
+        ),
+    ]
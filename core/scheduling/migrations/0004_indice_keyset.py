@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0003_disponibilidaddiaria'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['inicio', 'id'], name='programacio_inicio_fbedfe_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0004_indice_keyset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DisponibilidadPendiente',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('desde', models.DateField()),
+                ('hasta', models.DateField()),
+                ('dia_semana', models.PositiveSmallIntegerField(blank=True, choices=[(0, 'lunes'), (1, 'martes'), (2, 'miercoles'), (3, 'jueves'), (4, 'viernes'), (5, 'sabado'), (6, 'domingo')], null=True)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('recurso', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='scheduling.recursoreservable')),
+            ],
+            options={
+                'db_table': 'programacion_disponibilidad_pendiente',
+                'ordering': ['id'],
+            },
+        ),
+    ]
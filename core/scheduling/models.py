@@ -1,5 +1,4 @@
 from datetime import timedelta
-from zoneinfo import ZoneInfo
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
@@ -9,6 +8,8 @@ from django.db.models import F, Q
 from django.utils import timezone
 from ecommerce.models import Producto
 
+from .timezones import zona_de_recurso, zona_valida
+
 
 class RecursoReservable(models.Model):
     """Recurso reservable: salon, sala, especialista, etc."""
@@ -33,13 +34,17 @@ class RecursoReservable(models.Model):
 
     def clean(self):
         errors = {}
-        try:
-            ZoneInfo(self.zona_horaria)
-        except Exception:
+        if not zona_valida(self.zona_horaria):
             errors["zona_horaria"] = "Zona horaria no valida."
         if errors:
             raise ValidationError(errors)
 
+    def save(self, *args, **kwargs):
+        # La zona se valida al guardar: el resto de scheduling la usa sin volver a verificarla.
+        if not zona_valida(self.zona_horaria):
+            raise ValidationError({"zona_horaria": "Zona horaria no valida."})
+        super().save(*args, **kwargs)
+
 
 class Servicio(models.Model):
     """Servicio asociado a un recurso (ej. consulta, demo, clase)."""
@@ -239,6 +244,7 @@ class Cita(models.Model):
         indexes = [
             models.Index(fields=["recurso", "inicio"]),
             models.Index(fields=["recurso", "estado"]),
+            models.Index(fields=["inicio", "id"]),
             models.Index(fields=["producto", "inicio"]),
             models.Index(fields=["pago_confirmado"]),
         ]
@@ -267,8 +273,7 @@ class Cita(models.Model):
                 errors["fin"] = "La cita debe iniciar y terminar el mismo dia para validar la disponibilidad."
             if not errors:
                 self._validar_duracion_minima(errors)
-                self._validar_solapes(errors)
-                self._validar_disponibilidad(errors)
+                self._validar_agenda(errors)
 
         if errors:
             raise ValidationError(errors)
@@ -282,69 +287,29 @@ class Cita(models.Model):
                 f"la cita dura {duracion}."
             )
 
-    def _validar_solapes(self, errors: dict) -> None:
-        qs = (
-            Cita.objects.filter(recurso=self.recurso, estado=self.Estado.AGENDADA)
-            .filter(inicio__lt=self.fin, fin__gt=self.inicio)
-        )
-        if self.pk:
-            qs = qs.exclude(pk=self.pk)
-        cantidad_solapada = qs.count()
+    def _validar_agenda(self, errors: dict) -> None:
+        """
+        Solapes, excepciones y reglas se validan con un CalendarioRecurso: una sola carga
+        (reglas, excepciones y citas del dia) en lugar de una consulta por verificacion.
+        Los flujos en lote pueden asignar `_calendario` para reutilizar la misma carga.
+        """
+        from .availability import CalendarioRecurso
 
-        if cantidad_solapada >= self.recurso.capacidad:
-            errors["inicio"] = "El recurso ya esta ocupado en ese intervalo."
-
-    def _validar_disponibilidad(self, errors: dict) -> None:
-        inicio_local, fin_local = self._fechas_locales()
-        fecha = inicio_local.date()
-        hora_inicio = inicio_local.time()
-        hora_fin = fin_local.time()
-        dia_semana = inicio_local.weekday()
-
-        hay_cierre = ExcepcionDisponibilidad.objects.filter(
-            recurso=self.recurso,
-            tipo=ExcepcionDisponibilidad.Tipo.CERRADO,
-            esta_activa=True,
-            fecha=fecha,
-            hora_inicio__lt=hora_fin,
-            hora_fin__gt=hora_inicio,
-        ).filter(Q(servicio__isnull=True) | Q(servicio=self.servicio)).exists()
-
-        if hay_cierre:
-            errors["inicio"] = "Hay una excepcion de cierre en el horario solicitado."
-            return
-
-        hay_apertura = ExcepcionDisponibilidad.objects.filter(
-            recurso=self.recurso,
-            tipo=ExcepcionDisponibilidad.Tipo.ABIERTO,
-            esta_activa=True,
-            fecha=fecha,
-            hora_inicio__lte=hora_inicio,
-            hora_fin__gte=hora_fin,
-        ).filter(Q(servicio__isnull=True) | Q(servicio=self.servicio)).exists()
-
-        reglas = ReglaDisponibilidadRecurrente.objects.filter(
-            recurso=self.recurso,
-            dia_semana=dia_semana,
-            esta_activa=True,
-        ).filter(Q(servicio__isnull=True) | Q(servicio=self.servicio))
-
-        reglas = reglas.filter(
-            Q(vigente_desde__isnull=True) | Q(vigente_desde__lte=fecha),
-            Q(vigente_hasta__isnull=True) | Q(vigente_hasta__gte=fecha),
-        )
-
-        regla_cubre = any(
-            regla.hora_inicio <= hora_inicio <= regla.hora_fin and regla.hora_fin >= hora_fin
-            for regla in reglas
-        )
-
-        if not (hay_apertura or regla_cubre):
-            errors["inicio"] = "El intervalo solicitado esta fuera de la disponibilidad del recurso."
+        fecha = self._fechas_locales()[0].date()
+        calendario = getattr(self, "_calendario", None)
+        if calendario is None or not calendario.incluye(self.recurso_id, fecha):
+            calendario = CalendarioRecurso.cargar(self.recurso, fecha, fecha)
+        errors.update(calendario.errores_intervalo(self.inicio, self.fin, self.servicio_id, excluir_pk=self.pk))
 
     def _fechas_locales(self):
-        tz = ZoneInfo(self.recurso.zona_horaria or settings.TIME_ZONE)
-        return timezone.localtime(self.inicio, tz), timezone.localtime(self.fin, tz)
+        # clean() la consulta varias veces; se memoiza mientras inicio/fin/zona no cambien.
+        tz = zona_de_recurso(self.recurso)
+        clave = (self.inicio, self.fin, tz)
+        memo = getattr(self, "_fechas_locales_memo", None)
+        if memo is None or memo[0] != clave:
+            memo = (clave, (timezone.localtime(self.inicio, tz), timezone.localtime(self.fin, tz)))
+            self._fechas_locales_memo = memo
+        return memo[1]
 
     def _cruza_dia(self) -> bool:
         if not self.inicio or not self.fin:
@@ -354,3 +319,75 @@ class Cita(models.Model):
 
     def __str__(self):
         return f"{self.titulo} | {self.inicio} - {self.fin}"
+
+
+class DisponibilidadDiaria(models.Model):
+    """
+    Disponibilidad precalculada por recurso, servicio y fecha local del recurso.
+    Se reconstruye desde reglas, excepciones y citas (ver `scheduling.services.reconstruir_disponibilidad`).
+    """
+
+    recurso = models.ForeignKey(
+        RecursoReservable,
+        on_delete=models.CASCADE,
+        related_name="disponibilidad_diaria",
+    )
+    servicio = models.ForeignKey(
+        Servicio,
+        on_delete=models.CASCADE,
+        related_name="disponibilidad_diaria",
+    )
+    fecha = models.DateField()
+    intervalos_libres = models.JSONField(
+        default=list,
+        help_text='Intervalos locales con cupo: [{"inicio": "HH:MM:SS", "fin": "HH:MM:SS"}].',
+    )
+    slots_libres = models.PositiveIntegerField(default=0)
+    capacidad_restante = models.PositiveIntegerField(
+        default=0, help_text="Mayor capacidad restante entre los slots del dia."
+    )
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "programacion_disponibilidad_diaria"
+        ordering = ["fecha", "recurso_id", "servicio_id"]
+        constraints = [
+            models.UniqueConstraint(fields=["recurso", "servicio", "fecha"], name="uq_disponibilidad_diaria"),
+        ]
+        indexes = [
+            models.Index(fields=["servicio", "fecha"]),
+            models.Index(fields=["fecha", "recurso"]),
+        ]
+
+    def __str__(self):
+        return f"{self.recurso} / {self.servicio} {self.fecha}: {self.slots_libres} slots"
+
+
+class DisponibilidadPendiente(models.Model):
+    """
+    Rango de `DisponibilidadDiaria` por recalcular, registrado en la misma transaccion del cambio que lo
+    invalida. `reconstruir_disponibilidad --pendientes` los consume; `dia_semana` limita el rango a ese
+    dia (cambios de reglas recurrentes).
+    """
+
+    # Sin FK en la base: al borrar un recurso sus reglas y citas se borran en cascada y marcan rangos del
+    # recurso que se esta borrando; esas filas se descartan al procesarlas.
+    recurso = models.ForeignKey(
+        RecursoReservable,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="+",
+    )
+    desde = models.DateField()
+    hasta = models.DateField()
+    dia_semana = models.PositiveSmallIntegerField(
+        choices=ReglaDisponibilidadRecurrente.DiaSemana.choices, blank=True, null=True
+    )
+    creado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "programacion_disponibilidad_pendiente"
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"{self.recurso_id}: {self.desde} a {self.hasta}"
@@ -1,12 +1,21 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
 
+from ecommerce.models import Producto
+
 from .models import (
     Cita,
+    DisponibilidadDiaria,
     ExcepcionDisponibilidad,
     ReglaDisponibilidadRecurrente,
     RecursoReservable,
     Servicio,
 )
+from .services import guardar_cita
+from .timezones import zona_valida
 
 
 class RecursoReservableSerializer(serializers.ModelSerializer):
@@ -14,6 +23,11 @@ class RecursoReservableSerializer(serializers.ModelSerializer):
         model = RecursoReservable
         fields = "__all__"
 
+    def validate_zona_horaria(self, value):
+        if not zona_valida(value):
+            raise serializers.ValidationError("Zona horaria no valida.")
+        return value
+
 
 class ServicioSerializer(serializers.ModelSerializer):
     class Meta:
@@ -70,6 +84,22 @@ class CitaSerializer(serializers.ModelSerializer):
         instancia.full_clean()
         return attrs
 
+    # validate() responde rapido sin bloqueo; create/update repiten full_clean con el recurso
+    # bloqueado para que dos reservas simultaneas del ultimo cupo no pasen ambas.
+    def create(self, validated_data):
+        return self._guardar(Cita(**validated_data))
+
+    def update(self, instance, validated_data):
+        for clave, valor in validated_data.items():
+            setattr(instance, clave, valor)
+        return self._guardar(instance)
+
+    def _guardar(self, instancia):
+        try:
+            return guardar_cita(instancia)
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(serializers.as_serializer_error(exc))
+
 
 class ValidarCitaSerializer(serializers.Serializer):
     recurso = serializers.PrimaryKeyRelatedField(queryset=RecursoReservable.objects.all())
@@ -87,3 +117,129 @@ class ValidarCitaSerializer(serializers.Serializer):
         )
         cita.full_clean()
         return attrs
+
+
+class SlotsQuerySerializer(serializers.Serializer):
+    MAX_DIAS = 62
+
+    recurso = serializers.PrimaryKeyRelatedField(queryset=RecursoReservable.objects.all())
+    servicio = serializers.PrimaryKeyRelatedField(queryset=Servicio.objects.all())
+    desde = serializers.DateField()
+    hasta = serializers.DateField()
+    paso = serializers.IntegerField(min_value=1, required=False, help_text="Minutos entre inicios de slot.")
+
+    def validate(self, attrs):
+        if attrs["servicio"].recurso_id != attrs["recurso"].pk:
+            raise serializers.ValidationError({"servicio": "El servicio no pertenece al recurso seleccionado."})
+        if attrs["hasta"] < attrs["desde"]:
+            raise serializers.ValidationError({"hasta": "hasta debe ser posterior o igual a desde."})
+        if (attrs["hasta"] - attrs["desde"]).days >= self.MAX_DIAS:
+            raise serializers.ValidationError({"hasta": f"El rango maximo es de {self.MAX_DIAS} dias."})
+        if "paso" in attrs:
+            attrs["paso"] = timedelta(minutes=attrs["paso"])
+        return attrs
+
+
+class SlotSerializer(serializers.Serializer):
+    inicio = serializers.DateTimeField()
+    fin = serializers.DateTimeField()
+    capacidad_restante = serializers.IntegerField()
+
+
+class CapacidadQuerySerializer(serializers.Serializer):
+    en = serializers.DateTimeField()
+
+
+class PrimerHuecoQuerySerializer(serializers.Serializer):
+    servicio = serializers.PrimaryKeyRelatedField(queryset=Servicio.objects.all())
+    desde = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        recurso = self.context["recurso"]
+        if attrs["servicio"].recurso_id != recurso.pk:
+            raise serializers.ValidationError({"servicio": "El servicio no pertenece al recurso seleccionado."})
+        return attrs
+
+
+class IntervaloSerializer(serializers.Serializer):
+    inicio = serializers.DateTimeField()
+    fin = serializers.DateTimeField()
+
+
+class RecurrenciaSerializer(serializers.Serializer):
+    inicio = serializers.DateTimeField(help_text="Inicio de la primera sesion.")
+    fin = serializers.DateTimeField(help_text="Fin de la primera sesion.")
+    repeticiones = serializers.IntegerField(min_value=1)
+    cada_semanas = serializers.IntegerField(min_value=1, default=1)
+
+
+class CitaLoteSerializer(serializers.Serializer):
+    MAX_CITAS = 104
+
+    recurso = serializers.PrimaryKeyRelatedField(queryset=RecursoReservable.objects.all())
+    servicio = serializers.PrimaryKeyRelatedField(queryset=Servicio.objects.all())
+    producto = serializers.PrimaryKeyRelatedField(
+        queryset=Producto.objects.all(), required=False, allow_null=True
+    )
+    user = serializers.PrimaryKeyRelatedField(
+        queryset=get_user_model().objects.all(), required=False, allow_null=True
+    )
+    titulo = serializers.CharField(max_length=255)
+    notas = serializers.CharField(required=False, allow_blank=True, default="")
+    pago_confirmado = serializers.BooleanField(default=False)
+    intervalos = IntervaloSerializer(many=True, required=False)
+    recurrencia = RecurrenciaSerializer(required=False)
+
+    def validate(self, attrs):
+        if ("intervalos" in attrs) == ("recurrencia" in attrs):
+            raise serializers.ValidationError("Envia `intervalos` o `recurrencia`, no ambos.")
+        if attrs["servicio"].recurso_id != attrs["recurso"].pk:
+            raise serializers.ValidationError({"servicio": "El servicio no pertenece al recurso seleccionado."})
+        cantidad = len(attrs["intervalos"]) if "intervalos" in attrs else attrs["recurrencia"]["repeticiones"]
+        if not cantidad or cantidad > self.MAX_CITAS:
+            raise serializers.ValidationError(f"Se pueden agendar entre 1 y {self.MAX_CITAS} citas por lote.")
+        return attrs
+
+
+class ResultadoLoteSerializer(serializers.Serializer):
+    indice = serializers.IntegerField()
+    inicio = serializers.DateTimeField()
+    fin = serializers.DateTimeField()
+    id = serializers.IntegerField(allow_null=True)
+    errores = serializers.DictField(child=serializers.ListField(child=serializers.CharField()), required=False)
+
+
+class DisponibilidadDiariaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DisponibilidadDiaria
+        fields = ["recurso", "servicio", "fecha", "intervalos_libres", "slots_libres", "capacidad_restante"]
+
+
+class BusquedaQuerySerializer(serializers.Serializer):
+    MAX_DIAS = 31
+
+    servicio = serializers.CharField(max_length=255, help_text="Nombre del servicio (sin distinguir mayusculas).")
+    desde = serializers.DateTimeField()
+    hasta = serializers.DateTimeField()
+    duracion = serializers.IntegerField(min_value=1, required=False, help_text="Minutos; por defecto la del servicio.")
+    paso = serializers.IntegerField(min_value=1, required=False, help_text="Minutos entre inicios de slot.")
+    limite = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+    def validate(self, attrs):
+        if attrs["hasta"] <= attrs["desde"]:
+            raise serializers.ValidationError({"hasta": "hasta debe ser posterior a desde."})
+        if attrs["hasta"] - attrs["desde"] > timedelta(days=self.MAX_DIAS):
+            raise serializers.ValidationError({"hasta": f"El rango maximo es de {self.MAX_DIAS} dias."})
+        for campo in ("duracion", "paso"):
+            if campo in attrs:
+                attrs[campo] = timedelta(minutes=attrs[campo])
+        return attrs
+
+
+class OpcionDisponibleSerializer(serializers.Serializer):
+    recurso = serializers.IntegerField(source="servicio.recurso_id")
+    recurso_nombre = serializers.CharField(source="servicio.recurso.nombre")
+    servicio = serializers.IntegerField(source="servicio.pk")
+    inicio = serializers.DateTimeField(source="slot.inicio")
+    fin = serializers.DateTimeField(source="slot.fin")
+    capacidad_restante = serializers.IntegerField(source="slot.capacidad_restante")
@@ -0,0 +1,341 @@
+import heapq
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone as dt_timezone, tzinfo
+from itertools import islice
+from typing import Collection, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from commerce.models import CheckIn
+from ecommerce.services import tiendas_de_productos
+from sales.services import create_sales_from_citas
+
+from .availability import CalendarioRecurso, Slot
+from .index import registro
+from .models import Cita, DisponibilidadDiaria, DisponibilidadPendiente, RecursoReservable, Servicio
+from .timezones import local, zona, zona_de_recurso
+
+Intervalo = Tuple[datetime, datetime]
+
+
+def expandir_recurrencia(recurso: RecursoReservable, inicio: datetime, fin: datetime, repeticiones: int,
+                         cada_semanas: int = 1) -> List[Intervalo]:
+    """
+    Repite [inicio, fin) cada `cada_semanas` semanas sobre la hora local del recurso, de modo que
+    la serie mantiene la hora de pared aunque cambie el horario de verano.
+    """
+    tz = CalendarioRecurso.zona(recurso)
+    inicio_local, fin_local = inicio.astimezone(tz), fin.astimezone(tz)
+    intervalos = []
+    for n in range(repeticiones):
+        desfase = timedelta(weeks=n * cada_semanas)
+        intervalos.append(
+            (
+                datetime.combine(inicio_local.date() + desfase, inicio_local.time(), tzinfo=tz),
+                datetime.combine(fin_local.date() + desfase, fin_local.time(), tzinfo=tz),
+            )
+        )
+    return intervalos
+
+
+def bloquear_recurso(recurso_id: int) -> RecursoReservable:
+    """
+    Bloquea la fila del recurso hasta el fin de la transaccion: toda reserva del recurso pasa
+    por aqui, asi el conteo de solapes y el INSERT no se intercalan con otra reserva concurrente.
+    """
+    return RecursoReservable.objects.select_for_update().get(pk=recurso_id)
+
+
+@transaction.atomic
+def guardar_cita(cita: Cita) -> Cita:
+    """Valida (full_clean) y guarda la cita con el recurso bloqueado."""
+    cita.recurso = bloquear_recurso(cita.recurso_id)
+    cita.full_clean()
+    cita.save()
+    return cita
+
+
+def _errores_por_campo(exc: ValidationError) -> Dict[str, List[str]]:
+    return exc.message_dict if hasattr(exc, "error_dict") else {"non_field_errors": exc.messages}
+
+
+@transaction.atomic
+def agendar_en_lote(recurso_id: int, intervalos: Sequence[Intervalo], **campos) -> List[dict]:
+    """
+    Agenda varias citas del mismo recurso/servicio en una pasada.
+
+    Bloquea el recurso una vez (select_for_update) para serializar reservas concurrentes, carga un
+    solo CalendarioRecurso para todo el rango y valida cada intervalo con `Cita.clean`, sumando al
+    calendario las citas ya aceptadas del lote para respetar la capacidad entre ellas. Las validas
+    se insertan con bulk_create y los efectos de `scheduling.signals` se aplican en lote.
+    Devuelve un resultado por intervalo, en el mismo orden.
+    """
+    recurso = bloquear_recurso(recurso_id)
+    tz = CalendarioRecurso.zona(recurso)
+    fechas = [inicio.astimezone(tz).date() for inicio, _ in intervalos]
+    calendario = CalendarioRecurso.cargar(recurso, min(fechas), max(fechas))
+
+    pago_confirmado = campos.get("pago_confirmado", False)
+    confirmado_en = timezone.now() if pago_confirmado else None
+    resultados: List[dict] = []
+    aceptadas: List[Cita] = []
+    for indice, (inicio, fin) in enumerate(intervalos):
+        cita = Cita(recurso=recurso, inicio=inicio, fin=fin, confirmed_at=confirmado_en, **campos)
+        cita._calendario = calendario
+        try:
+            cita.clean()
+        except ValidationError as exc:
+            resultados.append({"indice": indice, "inicio": inicio, "fin": fin, "errores": _errores_por_campo(exc)})
+            continue
+        # Clave provisoria negativa: la cita ocupa capacidad para el resto del lote.
+        calendario.agregar_cita(-(indice + 1), inicio, fin)
+        resultado = {"indice": indice, "inicio": inicio, "fin": fin, "cita": cita}
+        resultados.append(resultado)
+        aceptadas.append(cita)
+
+    if aceptadas:
+        Cita.objects.bulk_create(aceptadas)
+        _efectos_en_lote(aceptadas)
+
+    for resultado in resultados:
+        cita = resultado.pop("cita", None)
+        resultado["id"] = cita.pk if cita else None
+    return resultados
+
+
+def _efectos_en_lote(citas: List[Cita]) -> None:
+    """Equivalente en lote de los receptores post_save de Cita (bulk_create no emite señales)."""
+    pagadas = [cita for cita in citas if cita.pago_confirmado and cita.producto_id]
+    if pagadas:
+        create_sales_from_citas(pagadas)
+        tiendas = tiendas_de_productos({cita.producto_id for cita in pagadas})
+        CheckIn.objects.bulk_create(
+            [
+                CheckIn(
+                    cita=cita,
+                    producto=cita.producto,
+                    tienda_id=tiendas[cita.producto_id],
+                    user=cita.user,
+                    status=CheckIn.Status.PENDIENTE,
+                )
+                for cita in pagadas
+            ],
+            ignore_conflicts=True,
+        )
+
+    tz = CalendarioRecurso.zona(citas[0].recurso)
+    fechas = [cita.inicio.astimezone(tz).date() for cita in citas]
+    marcar_disponibilidad_pendiente(citas[0].recurso_id, min(fechas), max(fechas))
+
+    def sincronizar():
+        for cita in citas:
+            registro.cita_guardada(cita)
+
+    transaction.on_commit(sincronizar)
+
+
+def horizonte_disponibilidad(tz: Optional[tzinfo] = None) -> Tuple[date, date]:
+    """
+    Fechas (inclusive) que materializa `DisponibilidadDiaria` para un recurso en la zona `tz`, desde su
+    dia local de hoy. Sin `tz`, el rango que contiene el horizonte de cualquier zona (un dia de margen
+    a cada lado del dia UTC).
+    """
+    dias = settings.SCHEDULING_DISPONIBILIDAD_HORIZONTE_DIAS
+    if tz is None:
+        hoy = local(timezone.now(), dt_timezone.utc).fecha
+        return hoy - timedelta(days=1), hoy + timedelta(days=dias + 1)
+    hoy = local(timezone.now(), tz).fecha
+    return hoy, hoy + timedelta(days=dias)
+
+
+def _resumen_dia(slots) -> dict:
+    intervalos = []
+    for slot in slots:
+        if intervalos and slot.inicio <= intervalos[-1][1]:
+            intervalos[-1][1] = max(intervalos[-1][1], slot.fin)
+        else:
+            intervalos.append([slot.inicio, slot.fin])
+    return {
+        "intervalos_libres": [
+            {"inicio": inicio.time().isoformat(), "fin": fin.time().isoformat()} for inicio, fin in intervalos
+        ],
+        "slots_libres": len(slots),
+        "capacidad_restante": max((slot.capacidad_restante for slot in slots), default=0),
+    }
+
+
+@transaction.atomic
+def reconstruir_disponibilidad(
+    recurso_ids: Iterable[int],
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    fechas: Optional[Collection[date]] = None,
+) -> int:
+    """
+    Recalcula `DisponibilidadDiaria` de los recursos entre `desde` y `hasta` (por defecto todo el
+    horizonte), recortado al horizonte de cada recurso en su zona; con `fechas` solo esas. Tres consultas de carga para
+    todos los recursos, un DELETE del rango y un bulk_create; devuelve la cantidad de filas escritas.
+    """
+    recurso_ids = set(recurso_ids)
+    inicio_horizonte, fin_horizonte = horizonte_disponibilidad()
+    if fechas is not None:
+        dias = sorted(fecha for fecha in set(fechas) if inicio_horizonte <= fecha <= fin_horizonte)
+        if not dias:
+            return 0
+        desde, hasta = dias[0], dias[-1]
+    else:
+        desde = max(desde or inicio_horizonte, inicio_horizonte)
+        hasta = min(hasta or fin_horizonte, fin_horizonte)
+        dias = [desde + timedelta(days=n) for n in range((hasta - desde).days + 1)]
+    if not recurso_ids or not dias:
+        return 0
+
+    recursos = list(RecursoReservable.objects.filter(pk__in=recurso_ids, esta_activo=True))
+    horizontes = {recurso.pk: horizonte_disponibilidad(zona_de_recurso(recurso)) for recurso in recursos}
+    calendarios = CalendarioRecurso.cargar_varios(recursos, desde, hasta)
+    servicios = Servicio.objects.filter(recurso_id__in=calendarios, esta_activo=True)
+
+    filas = [
+        DisponibilidadDiaria(
+            recurso_id=servicio.recurso_id,
+            servicio=servicio,
+            fecha=fecha,
+            **_resumen_dia(calendarios[servicio.recurso_id].slots_del_dia(servicio, fecha)),
+        )
+        for servicio in servicios
+        for fecha in dias
+        if horizontes[servicio.recurso_id][0] <= fecha <= horizontes[servicio.recurso_id][1]
+    ]
+
+    obsoletas = DisponibilidadDiaria.objects.filter(recurso_id__in=recurso_ids, fecha__gte=desde, fecha__lte=hasta)
+    if fechas is not None:
+        obsoletas = obsoletas.filter(fecha__in=dias)
+    obsoletas.delete()
+    DisponibilidadDiaria.objects.bulk_create(filas, batch_size=1000)
+    return len(filas)
+
+
+def marcar_disponibilidad_pendiente(
+    recurso_id: int, desde: Optional[date] = None, hasta: Optional[date] = None, dia_semana: Optional[int] = None
+) -> Optional[DisponibilidadPendiente]:
+    """
+    Registra (en la transaccion en curso) que `DisponibilidadDiaria` del recurso quedo desactualizada
+    entre `desde` y `hasta`, por defecto todo el horizonte. No hace nada si el rango cae fuera de el; el
+    recorte a la zona del recurso lo hace `reconstruir_disponibilidad` al procesarlo.
+    """
+    inicio_horizonte, fin_horizonte = horizonte_disponibilidad()
+    desde = max(desde or inicio_horizonte, inicio_horizonte)
+    hasta = min(hasta or fin_horizonte, fin_horizonte)
+    if recurso_id is None or desde > hasta:
+        return None
+    return DisponibilidadPendiente.objects.create(
+        recurso_id=recurso_id, desde=desde, hasta=hasta, dia_semana=dia_semana
+    )
+
+
+def procesar_disponibilidad_pendiente(limite: int = 1000) -> Tuple[int, int]:
+    """
+    Consume hasta `limite` rangos pendientes: junta sus fechas por recurso y recalcula solo esas, agrupando
+    los recursos con las mismas fechas en una sola reconstruccion. En PostgreSQL varios procesos pueden
+    correr a la vez (skip_locked). Devuelve (rangos procesados, filas escritas).
+    """
+    inicio_horizonte, fin_horizonte = horizonte_disponibilidad()
+    with transaction.atomic():
+        pendientes = list(
+            DisponibilidadPendiente.objects.select_for_update(skip_locked=True).order_by("id")[:limite]
+        )
+        fechas_por_recurso: Dict[int, set] = defaultdict(set)
+        for pendiente in pendientes:
+            dia = max(pendiente.desde, inicio_horizonte)
+            while dia <= min(pendiente.hasta, fin_horizonte):
+                if pendiente.dia_semana is None or dia.weekday() == pendiente.dia_semana:
+                    fechas_por_recurso[pendiente.recurso_id].add(dia)
+                dia += timedelta(days=1)
+
+        recursos_por_fechas: Dict[frozenset, List[int]] = defaultdict(list)
+        for recurso_id, fechas in fechas_por_recurso.items():
+            recursos_por_fechas[frozenset(fechas)].append(recurso_id)
+        filas = sum(
+            reconstruir_disponibilidad(recurso_ids, fechas=fechas)
+            for fechas, recurso_ids in recursos_por_fechas.items()
+        )
+        DisponibilidadPendiente.objects.filter(pk__in=[pendiente.pk for pendiente in pendientes]).delete()
+    return len(pendientes), filas
+
+
+def avanzar_horizonte_disponibilidad(lote: int = 50) -> Tuple[int, int]:
+    """
+    Corrimiento diario: borra las fechas que ya pasaron en la zona de cada recurso y calcula, para cada
+    recurso activo con servicios, los dias desde su ultima fecha calculada hasta el fin de su horizonte (uno
+    por dia si corre a diario; todo el horizonte para recursos sin filas). Devuelve (filas borradas, filas escritas).
+    """
+    borradas = 0
+    for nombre in RecursoReservable.objects.order_by().values_list("zona_horaria", flat=True).distinct():
+        inicio_horizonte, _ = horizonte_disponibilidad(zona(nombre or settings.TIME_ZONE))
+        borradas += DisponibilidadDiaria.objects.filter(
+            recurso__zona_horaria=nombre, fecha__lt=inicio_horizonte
+        ).delete()[0]
+
+    ultimas = dict(
+        DisponibilidadDiaria.objects.values("recurso_id")
+        .annotate(ultima=Max("fecha"))
+        .values_list("recurso_id", "ultima")
+    )
+    recursos_por_rango: Dict[Tuple[date, date], List[int]] = defaultdict(list)
+    activos = RecursoReservable.objects.filter(esta_activo=True, servicios__esta_activo=True).distinct()
+    for recurso in activos.only("zona_horaria").order_by("id"):
+        inicio_horizonte, fin_horizonte = horizonte_disponibilidad(zona_de_recurso(recurso))
+        ultima = ultimas.get(recurso.pk)
+        desde = max(ultima + timedelta(days=1), inicio_horizonte) if ultima else inicio_horizonte
+        if desde <= fin_horizonte:
+            recursos_por_rango[desde, fin_horizonte].append(recurso.pk)
+
+    escritas = 0
+    for (desde, hasta), recurso_ids in recursos_por_rango.items():
+        for inicio in range(0, len(recurso_ids), lote):
+            escritas += reconstruir_disponibilidad(recurso_ids[inicio:inicio + lote], desde, hasta)
+    return borradas, escritas
+
+
+def buscar_disponibilidad(
+    nombre_servicio: str,
+    desde: datetime,
+    hasta: datetime,
+    duracion: Optional[timedelta] = None,
+    paso: Optional[timedelta] = None,
+    limite: int = 10,
+) -> List[Tuple[Servicio, Slot]]:
+    """
+    Primeros `limite` huecos entre `desde` y `hasta` en cualquier recurso activo que ofrezca un
+    servicio activo con ese nombre, ordenados por inicio.
+
+    Servicios y recursos salen de una consulta y reglas, excepciones y citas de todos los recursos
+    de tres mas (`cargar_varios`); luego se mezclan en memoria los generadores de slots de cada
+    recurso (ya ordenados) con heapq.merge, que se detiene al juntar `limite` resultados.
+    """
+    servicios = list(
+        Servicio.objects.filter(nombre__iexact=nombre_servicio, esta_activo=True, recurso__esta_activo=True)
+        .select_related("recurso")
+        .order_by("recurso_id", "id")
+    )
+    if not servicios:
+        return []
+
+    # Un dia de margen cubre cualquier zona horaria de los recursos.
+    fecha_desde = desde.astimezone(dt_timezone.utc).date() - timedelta(days=1)
+    fecha_hasta = hasta.astimezone(dt_timezone.utc).date() + timedelta(days=1)
+    calendarios = CalendarioRecurso.cargar_varios({s.recurso for s in servicios}, fecha_desde, fecha_hasta)
+
+    def candidatos(servicio):
+        for slot in calendarios[servicio.recurso_id].iterar_slots(servicio, duracion, paso, despues_de=desde):
+            if slot.inicio >= hasta:
+                return
+            if slot.fin <= hasta:
+                yield slot.inicio, servicio.pk, servicio, slot
+
+    ordenados = heapq.merge(*map(candidatos, servicios), key=lambda candidato: candidato[:2])
+    return [(servicio, slot) for _, _, servicio, slot in islice(ordenados, limite)]
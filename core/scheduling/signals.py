@@ -1,11 +1,16 @@
-from django.db.models.signals import post_save, pre_save
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 
 from commerce.models import CheckIn
-from sales.services import create_sale_from_cita, guess_tienda_from_producto
+from sales.services import create_sale_from_cita
 
-from .models import Cita
+from .index import registro
+from .models import Cita, ExcepcionDisponibilidad, RecursoReservable, ReglaDisponibilidadRecurrente, Servicio
+from .services import marcar_disponibilidad_pendiente
 
 
 @receiver(pre_save, sender=Cita)
@@ -19,16 +24,115 @@ def on_cita_pagada(sender, instance: Cita, **kwargs):
     if not instance.pago_confirmado or not instance.producto:
         return
 
-    create_sale_from_cita(instance)
+    venta = create_sale_from_cita(instance)
 
-    tienda = guess_tienda_from_producto(instance.producto)
+    # La venta ya resolvio la tienda del producto: el check-in reusa ese id.
     CheckIn.objects.get_or_create(
         cita=instance,
         producto=instance.producto,
         defaults={
-            "tienda": tienda,
+            "tienda_id": venta.tienda_id,
             "user": getattr(instance, "user", None),
             "status": CheckIn.Status.PENDIENTE,
         },
     )
 
+
+# Campos que cambian la disponibilidad, por modelo. Sus valores al cargar la instancia (post_init, sin
+# consultar la base) permiten marcar tambien el rango anterior cuando se mueve una cita, regla o excepcion.
+CAMPOS_AGENDA = {
+    Cita: ("recurso_id", "inicio", "fin", "estado"),
+    ReglaDisponibilidadRecurrente: ("recurso_id", "dia_semana", "vigente_desde", "vigente_hasta"),
+    ExcepcionDisponibilidad: ("recurso_id", "fecha"),
+    Servicio: ("recurso_id",),
+}
+
+
+def _recordar_agenda(sender, instance, **kwargs):
+    instance._agenda_cargada = tuple(instance.__dict__.get(campo) for campo in CAMPOS_AGENDA[sender])
+
+
+for modelo in CAMPOS_AGENDA:
+    post_init.connect(_recordar_agenda, sender=modelo, dispatch_uid=f"recordar_agenda_{modelo.__name__}")
+
+
+def _estados_agenda(instance) -> set:
+    """Estado actual y el cargado de la instancia (uno solo si no cambio o es nueva)."""
+    actual = tuple(getattr(instance, campo) for campo in CAMPOS_AGENDA[type(instance)])
+    estados = {actual}
+    anterior = getattr(instance, "_agenda_cargada", None)
+    if anterior and None not in anterior[:2]:
+        estados.add(anterior)
+    instance._agenda_cargada = actual
+    return estados
+
+
+def _marcar_alrededor(recurso_id: int, instante) -> None:
+    # Un dia de margen a cada lado: la fecha local del recurso puede diferir de la fecha UTC.
+    fecha = instante.date()
+    marcar_disponibilidad_pendiente(recurso_id, fecha - timedelta(days=1), fecha + timedelta(days=1))
+
+
+@receiver(post_save, sender=Cita)
+def sincronizar_agenda_cita(sender, instance: Cita, update_fields=None, **kwargs):
+    estados = _estados_agenda(instance)
+    if update_fields is None or {"recurso", "inicio", "fin", "estado"} & set(update_fields):
+        for recurso_id, inicio in {estado[:2] for estado in estados}:
+            _marcar_alrededor(recurso_id, inicio)
+    transaction.on_commit(lambda: registro.cita_guardada(instance))
+
+
+@receiver(post_delete, sender=Cita)
+def quitar_cita_de_agenda(sender, instance: Cita, **kwargs):
+    pk = instance.pk
+    _marcar_alrededor(instance.recurso_id, instance.inicio)
+    transaction.on_commit(lambda: registro.cita_eliminada(pk))
+
+
+def _invalidar_indice(recurso_ids) -> None:
+    def sincronizar():
+        for recurso_id in recurso_ids:
+            registro.invalidar(recurso_id)
+
+    transaction.on_commit(sincronizar)
+
+
+@receiver(post_save, sender=RecursoReservable)
+def invalidar_agenda_recurso(sender, instance: RecursoReservable, **kwargs):
+    # Capacidad, zona horaria o estado afectan todo el horizonte del recurso.
+    marcar_disponibilidad_pendiente(instance.pk)
+    _invalidar_indice([instance.pk])
+
+
+@receiver(post_delete, sender=RecursoReservable)
+@receiver(post_delete, sender=Servicio)
+def olvidar_agenda(sender, instance, **kwargs):
+    # Sus filas de DisponibilidadDiaria se borran en cascada: no hay nada que recalcular.
+    _invalidar_indice([getattr(instance, "recurso_id", instance.pk)])
+
+
+@receiver(post_save, sender=Servicio)
+def invalidar_agenda_servicio(sender, instance: Servicio, **kwargs):
+    recurso_ids = {estado[0] for estado in _estados_agenda(instance)}
+    for recurso_id in recurso_ids:
+        marcar_disponibilidad_pendiente(recurso_id)
+    _invalidar_indice(recurso_ids)
+
+
+@receiver(post_save, sender=ReglaDisponibilidadRecurrente)
+@receiver(post_delete, sender=ReglaDisponibilidadRecurrente)
+def invalidar_agenda_regla(sender, instance: ReglaDisponibilidadRecurrente, **kwargs):
+    # Solo las fechas de su dia de la semana dentro de la vigencia (actual y anterior).
+    estados = _estados_agenda(instance)
+    for recurso_id, dia_semana, vigente_desde, vigente_hasta in estados:
+        marcar_disponibilidad_pendiente(recurso_id, vigente_desde, vigente_hasta, dia_semana=dia_semana)
+    _invalidar_indice({estado[0] for estado in estados})
+
+
+@receiver(post_save, sender=ExcepcionDisponibilidad)
+@receiver(post_delete, sender=ExcepcionDisponibilidad)
+def invalidar_agenda_excepcion(sender, instance: ExcepcionDisponibilidad, **kwargs):
+    estados = _estados_agenda(instance)
+    for recurso_id, fecha in estados:
+        marcar_disponibilidad_pendiente(recurso_id, fecha, fecha)
+    _invalidar_indice({estado[0] for estado in estados})
@@ -1,10 +1,33 @@
-from datetime import timedelta
+import threading
+import time as reloj
+from datetime import datetime, time, timedelta
+from io import StringIO
+from zoneinfo import ZoneInfo
 
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TransactionTestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework.test import APITestCase
 
+from commerce.models import CheckIn
+from ecommerce.models import Producto
+from sales.models import SaleEvent
+from scheduling.index import registro
+from scheduling.models import (
+    Cita,
+    DisponibilidadDiaria,
+    DisponibilidadPendiente,
+    ExcepcionDisponibilidad,
+    RecursoReservable,
+    ReglaDisponibilidadRecurrente,
+    Servicio,
+)
+from scheduling.services import guardar_cita, horizonte_disponibilidad, procesar_disponibilidad_pendiente
+
 
 class SchedulingApiTests(APITestCase):
     def setUp(self):
@@ -130,3 +153,362 @@ class SchedulingApiTests(APITestCase):
         self.assertEqual(self.client.delete(reverse("reglas-disponibilidad-detail", args=[regla_resp.data["id"]])).status_code, 204)
         self.assertEqual(self.client.delete(reverse("servicios-detail", args=[servicio_id])).status_code, 204)
         self.assertEqual(self.client.delete(reverse("recursos-detail", args=[recurso_id])).status_code, 204)
+
+    def test_zona_horaria_invalida_se_rechaza_al_guardar(self):
+        with self.assertRaises(ValidationError):
+            RecursoReservable(nombre="Sala Z", zona_horaria="Marte/Olimpo").save()
+        resp = self._post("recursos-list", {"nombre": "Sala Z", "zona_horaria": "Marte/Olimpo", "capacidad": 1})
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("zona_horaria", resp.data)
+
+
+class SlotsTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "pass1234")
+        self.client.force_authenticate(self.user)
+        self.tz = ZoneInfo("America/Santiago")
+        self.recurso = RecursoReservable.objects.create(nombre="Box 1", zona_horaria="America/Santiago", capacidad=1)
+        self.servicio = Servicio.objects.create(
+            recurso=self.recurso,
+            nombre="Control",
+            duracion=timedelta(minutes=30),
+            buffer_antes=timedelta(minutes=5),
+            buffer_despues=timedelta(minutes=5),
+        )
+        self.fecha = timezone.localdate(timezone=self.tz) + timedelta(days=7)
+        ReglaDisponibilidadRecurrente.objects.create(
+            recurso=self.recurso, dia_semana=self.fecha.weekday(), hora_inicio=time(9), hora_fin=time(11)
+        )
+
+    def _local(self, hora: int, minuto: int = 0) -> datetime:
+        return datetime.combine(self.fecha, time(hora, minuto), tzinfo=self.tz)
+
+    def test_slots_respetan_citas_excepciones_y_zona_horaria(self):
+        Cita.objects.create(
+            recurso=self.recurso,
+            servicio=self.servicio,
+            titulo="Ocupado",
+            inicio=self._local(9, 40),
+            fin=self._local(10, 20),
+        )
+        ExcepcionDisponibilidad.objects.create(
+            recurso=self.recurso, fecha=self.fecha, hora_inicio=time(10, 20), hora_fin=time(10, 30), tipo="closed"
+        )
+        ExcepcionDisponibilidad.objects.create(
+            recurso=self.recurso, fecha=self.fecha, hora_inicio=time(15), hora_fin=time(16), tipo="open"
+        )
+
+        with self.assertNumQueries(5):
+            resp = self.client.get(
+                reverse("citas-slots"),
+                {"recurso": self.recurso.id, "servicio": self.servicio.id, "desde": self.fecha, "hasta": self.fecha},
+            )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["duracion"], "00:40:00")
+        inicios = [datetime.fromisoformat(slot["inicio"]).astimezone(self.tz) for slot in resp.data["slots"]]
+        self.assertEqual(inicios, [self._local(9), self._local(15)])
+
+    def test_clean_valida_agenda_con_una_carga(self):
+        Cita.objects.create(
+            recurso=self.recurso, servicio=self.servicio, titulo="A", inicio=self._local(9), fin=self._local(9, 40)
+        )
+        solapada = Cita(
+            recurso=self.recurso, servicio=self.servicio, titulo="B", inicio=self._local(9, 20), fin=self._local(10)
+        )
+        with self.assertNumQueries(3), self.assertRaises(ValidationError) as ctx:
+            solapada.clean()
+        self.assertIn("ocupado", ctx.exception.message_dict["inicio"][0])
+
+        fuera = Cita(
+            recurso=self.recurso, servicio=self.servicio, titulo="C", inicio=self._local(12), fin=self._local(12, 40)
+        )
+        with self.assertRaises(ValidationError) as ctx:
+            fuera.clean()
+        self.assertIn("fuera de la disponibilidad", ctx.exception.message_dict["inicio"][0])
+
+    def test_indice_en_memoria_se_sincroniza_con_senales(self):
+        registro.invalidar()
+        url_capacidad = reverse("recursos-capacidad", args=[self.recurso.id])
+        url_hueco = reverse("recursos-primer-hueco", args=[self.recurso.id])
+
+        resp = self.client.get(url_hueco, {"servicio": self.servicio.id, "desde": self._local(8).isoformat()})
+        self.assertEqual(datetime.fromisoformat(resp.data["slot"]["inicio"]).astimezone(self.tz), self._local(9))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cita = Cita.objects.create(
+                recurso=self.recurso, servicio=self.servicio, titulo="A", inicio=self._local(9), fin=self._local(9, 40)
+            )
+        # Ya cargado: capacidad y primer hueco se responden sin ir a la base.
+        with self.assertNumQueries(1):  # solo get_object
+            resp = self.client.get(url_capacidad, {"en": self._local(9, 10).isoformat()})
+        self.assertEqual(resp.data["capacidad_restante"], 0)
+        resp = self.client.get(url_hueco, {"servicio": self.servicio.id, "desde": self._local(8).isoformat()})
+        self.assertEqual(datetime.fromisoformat(resp.data["slot"]["inicio"]).astimezone(self.tz), self._local(9, 40))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cita.delete()
+        resp = self.client.get(url_capacidad, {"en": self._local(9, 10).isoformat()})
+        self.assertEqual(resp.data["capacidad_restante"], 1)
+
+    def test_bulk_agenda_serie_semanal_con_efectos_en_lote(self):
+        producto = Producto.objects.create(nombre="Sesion", precio="10.00")
+        Cita.objects.create(
+            recurso=self.recurso,
+            servicio=self.servicio,
+            titulo="Ocupado",
+            inicio=self._local(9) + timedelta(weeks=2),
+            fin=self._local(9, 40) + timedelta(weeks=2),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(
+                reverse("citas-bulk"),
+                {
+                    "recurso": self.recurso.id,
+                    "servicio": self.servicio.id,
+                    "producto": producto.id,
+                    "titulo": "Kinesiologia",
+                    "pago_confirmado": True,
+                    "recurrencia": {
+                        "inicio": self._local(9).isoformat(),
+                        "fin": self._local(9, 40).isoformat(),
+                        "repeticiones": 12,
+                    },
+                },
+                format="json",
+            )
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual((resp.data["creadas"], resp.data["rechazadas"]), (11, 1))
+        self.assertIn("ocupado", resp.data["resultados"][2]["errores"]["inicio"][0])
+        creadas = [r["id"] for r in resp.data["resultados"] if r["id"]]
+        self.assertEqual(Cita.objects.filter(pk__in=creadas, confirmed_at__isnull=False).count(), 11)
+        self.assertEqual(SaleEvent.objects.filter(cita__in=creadas).count(), 11)
+        self.assertEqual(CheckIn.objects.filter(cita__in=creadas).count(), 11)
+
+        # La capacidad se respeta tambien entre intervalos del mismo lote.
+        intervalo = {"inicio": self._local(10).isoformat(), "fin": self._local(10, 40).isoformat()}
+        resp = self.client.post(
+            reverse("citas-bulk"),
+            {
+                "recurso": self.recurso.id,
+                "servicio": self.servicio.id,
+                "titulo": "Duplicado",
+                "intervalos": [intervalo, intervalo],
+            },
+            format="json",
+        )
+        self.assertEqual((resp.data["creadas"], resp.data["rechazadas"]), (1, 1))
+
+    def test_disponibilidad_diaria_backfill_e_incremental(self):
+        call_command("reconstruir_disponibilidad", stdout=StringIO())
+        fila = DisponibilidadDiaria.objects.get(servicio=self.servicio, fecha=self.fecha)
+        self.assertEqual(fila.slots_libres, 3)
+        self.assertEqual(fila.intervalos_libres, [{"inicio": "09:00:00", "fin": "11:00:00"}])
+
+        # Guardar la cita solo marca el rango; el recalculo lo hace el comando fuera de la request.
+        Cita.objects.create(
+            recurso=self.recurso,
+            servicio=self.servicio,
+            titulo="A",
+            inicio=self._local(9, 40),
+            fin=self._local(10, 20),
+        )
+        self.assertEqual(DisponibilidadDiaria.objects.get(servicio=self.servicio, fecha=self.fecha).slots_libres, 3)
+        call_command("reconstruir_disponibilidad", "--pendientes", stdout=StringIO())
+        self.assertFalse(DisponibilidadPendiente.objects.exists())
+        fila = DisponibilidadDiaria.objects.get(servicio=self.servicio, fecha=self.fecha)
+        self.assertEqual(fila.slots_libres, 2)
+        self.assertEqual(
+            fila.intervalos_libres,
+            [{"inicio": "09:00:00", "fin": "09:40:00"}, {"inicio": "10:20:00", "fin": "11:00:00"}],
+        )
+
+        with self.assertNumQueries(2):  # count + rango por fecha
+            resp = self.client.get(
+                reverse("disponibilidad-diaria-list"),
+                {"recurso__in": self.recurso.id, "fecha__gte": self.fecha, "fecha__lte": self.fecha + timedelta(9)},
+            )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["results"][0]["slots_libres"], 2)
+
+    def test_disponibilidad_pendiente_se_limita_a_las_fechas_afectadas(self):
+        call_command("reconstruir_disponibilidad", "--pendientes", stdout=StringIO())
+        regla = ReglaDisponibilidadRecurrente.objects.get(recurso=self.recurso)
+        regla.hora_fin = time(10)
+        regla.save()
+        ExcepcionDisponibilidad.objects.create(
+            recurso=self.recurso,
+            fecha=self.fecha + timedelta(days=1),
+            hora_inicio=time(9),
+            hora_fin=time(10),
+            tipo="open",
+        )
+        self.assertEqual(
+            list(DisponibilidadPendiente.objects.values_list("desde", "hasta", "dia_semana")),
+            [
+                (*horizonte_disponibilidad(), self.fecha.weekday()),
+                (self.fecha + timedelta(days=1), self.fecha + timedelta(days=1), None),
+            ],
+        )
+        antes = dict(DisponibilidadDiaria.objects.values_list("fecha", "actualizado_en"))
+
+        procesados, filas = procesar_disponibilidad_pendiente()
+        recalculadas = DisponibilidadDiaria.objects.filter(actualizado_en__gt=max(antes.values()))
+        fechas = set(recalculadas.values_list("fecha", flat=True))
+        self.assertEqual(procesados, 2)
+        self.assertEqual(filas, len(fechas))
+        self.assertEqual(
+            {fecha for fecha in fechas if fecha.weekday() != self.fecha.weekday()}, {self.fecha + timedelta(days=1)}
+        )
+        self.assertEqual(DisponibilidadDiaria.objects.get(fecha=self.fecha).slots_libres, 1)
+        self.assertEqual(DisponibilidadDiaria.objects.get(fecha=self.fecha + timedelta(days=1)).slots_libres, 1)
+
+    def test_avanzar_horizonte_borra_pasado_y_calcula_dias_nuevos(self):
+        call_command("reconstruir_disponibilidad", stdout=StringIO())
+        _, fin = horizonte_disponibilidad(self.tz)
+        DisponibilidadDiaria.objects.filter(fecha=fin).delete()
+        DisponibilidadDiaria.objects.create(
+            recurso=self.recurso, servicio=self.servicio, fecha=fin - timedelta(days=400)
+        )
+
+        salida = StringIO()
+        call_command("reconstruir_disponibilidad", "--avanzar", stdout=salida)
+        self.assertIn("filas borradas 1 | escritas 1", salida.getvalue())
+        self.assertTrue(DisponibilidadDiaria.objects.filter(fecha=fin).exists())
+        self.assertFalse(DisponibilidadDiaria.objects.filter(fecha__lt=timezone.localdate(timezone=self.tz)).exists())
+
+    @override_settings(TIME_ZONE="Pacific/Pago_Pago")
+    def test_horizonte_de_disponibilidad_sigue_la_zona_del_recurso(self):
+        # UTC+14 frente a UTC-11: el dia local del recurso siempre va adelantado al del proyecto.
+        tz = ZoneInfo("Pacific/Kiritimati")
+        adelantado = RecursoReservable.objects.create(nombre="Box 4", zona_horaria=tz.key, capacidad=1)
+        servicio = Servicio.objects.create(recurso=adelantado, nombre="Control", duracion=timedelta(minutes=30))
+        for dia_semana in range(7):
+            ReglaDisponibilidadRecurrente.objects.create(
+                recurso=adelantado, dia_semana=dia_semana, hora_inicio=time(9), hora_fin=time(10)
+            )
+        hoy, fin = horizonte_disponibilidad(tz)
+        self.assertGreater(hoy, timezone.localdate())
+
+        call_command("reconstruir_disponibilidad", "--recurso", str(adelantado.id), stdout=StringIO())
+        fechas = DisponibilidadDiaria.objects.filter(recurso=adelantado).values_list("fecha", flat=True)
+        self.assertEqual((min(fechas), max(fechas), len(fechas)), (hoy, fin, (fin - hoy).days + 1))
+
+        DisponibilidadDiaria.objects.filter(recurso=adelantado, fecha=fin).delete()
+        DisponibilidadDiaria.objects.create(recurso=adelantado, servicio=servicio, fecha=hoy - timedelta(days=1))
+        call_command("reconstruir_disponibilidad", "--avanzar", stdout=StringIO())
+        fechas = DisponibilidadDiaria.objects.filter(recurso=adelantado).values_list("fecha", flat=True)
+        self.assertEqual((min(fechas), max(fechas), len(fechas)), (hoy, fin, (fin - hoy).days + 1))
+
+    def test_buscar_ordena_huecos_de_todos_los_recursos(self):
+        otro = RecursoReservable.objects.create(nombre="Box 2", zona_horaria="America/Santiago", capacidad=1)
+        inactivo = RecursoReservable.objects.create(nombre="Box 3", zona_horaria="America/Santiago", esta_activo=False)
+        for recurso in (otro, inactivo):
+            Servicio.objects.create(
+                recurso=recurso, nombre="control", duracion=timedelta(minutes=30), buffer_despues=timedelta(minutes=10)
+            )
+            ReglaDisponibilidadRecurrente.objects.create(
+                recurso=recurso, dia_semana=self.fecha.weekday(), hora_inicio=time(9, 20), hora_fin=time(10)
+            )
+        Cita.objects.create(
+            recurso=self.recurso, servicio=self.servicio, titulo="A", inicio=self._local(9), fin=self._local(9, 40)
+        )
+
+        with self.assertNumQueries(4):
+            resp = self.client.get(
+                reverse("citas-buscar"),
+                {
+                    "servicio": "Control",
+                    "desde": self._local(0).isoformat(),
+                    "hasta": self._local(23).isoformat(),
+                    "limite": 2,
+                },
+            )
+        self.assertEqual(resp.status_code, 200)
+        opciones = [
+            (r["recurso_nombre"], datetime.fromisoformat(r["inicio"]).astimezone(self.tz))
+            for r in resp.data["resultados"]
+        ]
+        self.assertEqual(opciones, [("Box 2", self._local(9, 20)), ("Box 1", self._local(9, 40))])
+
+    def test_citas_paginan_por_keyset(self):
+        media_hora = timedelta(minutes=30)
+        citas = Cita.objects.bulk_create(
+            [
+                Cita(recurso=self.recurso, servicio=self.servicio, titulo=str(n), inicio=i, fin=i + media_hora)
+                for n, i in enumerate([self._local(9)] * 3 + [self._local(10)] * 2)
+            ]
+        )
+        esperado = [c.id for c in sorted(citas, key=lambda c: (c.inicio, c.id), reverse=True)]
+
+        vistos, url, paginas = [], reverse("citas-list") + "?page_size=2", []
+        while url:
+            with self.assertNumQueries(1):
+                resp = self.client.get(url)
+            self.assertNotIn("count", resp.data)
+            paginas.append(resp.data)
+            vistos.extend(r["id"] for r in resp.data["results"])
+            url = resp.data["next"]
+        self.assertEqual(vistos, esperado)
+        self.assertEqual(len(paginas), 3)
+        self.assertIsNone(paginas[0]["previous"])
+
+        anterior = self.client.get(paginas[2]["previous"]).data
+        self.assertEqual([r["id"] for r in anterior["results"]], esperado[2:4])
+        self.assertEqual(self.client.get(anterior["previous"]).data["previous"], None)
+
+        resp = self.client.get(reverse("citas-list"), {"page_size": 2, "con_total": 1})
+        self.assertEqual((resp.data["count"], resp.data["count_exacto"]), (5, True))
+        resp = self.client.get(reverse("citas-list"), {"page_size": 2, "page": 2})
+        self.assertEqual([r["id"] for r in resp.data["results"]], esperado[2:4])
+        self.assertEqual(resp.data["count"], 5)
+        self.assertEqual(self.client.get(reverse("citas-list"), {"cursor": "no-es-un-cursor"}).status_code, 404)
+
+
+class ReservasConcurrentesTests(TransactionTestCase):
+    """Reservas simultaneas del mismo cupo nunca superan la capacidad del recurso."""
+
+    CLIENTES = 16
+
+    def setUp(self):
+        self.recurso = RecursoReservable.objects.create(nombre="Box unico", zona_horaria="UTC", capacidad=1)
+        self.servicio = Servicio.objects.create(recurso=self.recurso, nombre="Consulta", duracion=timedelta(minutes=30))
+        self.fecha = timezone.localdate() + timedelta(days=3)
+        ReglaDisponibilidadRecurrente.objects.create(
+            recurso=self.recurso, dia_semana=self.fecha.weekday(), hora_inicio=time(9), hora_fin=time(18)
+        )
+
+    def test_sin_doble_reserva_bajo_carga(self):
+        barrera = threading.Barrier(self.CLIENTES)
+        inicio = datetime.combine(self.fecha, time(10), tzinfo=ZoneInfo("UTC"))
+        rechazos = []
+
+        def reservar(n):
+            barrera.wait()
+            try:
+                # Se desplaza la mitad de los clientes 15 minutos: solapes parciales, no solo identicos.
+                desde = inicio + timedelta(minutes=15 * (n % 2))
+                for _ in range(500):
+                    cita = Cita(
+                        recurso_id=self.recurso.pk, servicio=self.servicio, titulo=f"c{n}", inicio=desde,
+                        fin=desde + timedelta(minutes=30),
+                    )
+                    try:
+                        guardar_cita(cita)
+                        return
+                    except OperationalError:
+                        reloj.sleep(0.005)
+                    except ValidationError:
+                        rechazos.append(n)
+                        return
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=reservar, args=(n,)) for n in range(self.CLIENTES)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(Cita.objects.filter(recurso=self.recurso).count(), 1)
+        self.assertEqual(len(rechazos), self.CLIENTES - 1)
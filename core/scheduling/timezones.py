@@ -0,0 +1,42 @@
+"""
+Zonas horarias de scheduling: registro memoizado de ZoneInfo y conversion a hora local.
+
+La zona se resuelve una vez por nombre (`zona`) y la conversion usa `astimezone` de zoneinfo
+(implementado en C): cachear desfases por hora en Python resulto mas lento
+(ver `manage.py benchmark_agenda --zonas`).
+"""
+from datetime import date, datetime, time
+from functools import lru_cache
+from typing import NamedTuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+
+
+class HoraLocal(NamedTuple):
+    fecha: date
+    hora: time
+    dia_semana: int
+
+
+@lru_cache(maxsize=None)
+def zona(nombre: str) -> ZoneInfo:
+    """ZoneInfo memoizado por nombre; ZoneInfoNotFoundError/ValueError si no existe."""
+    return ZoneInfo(nombre)
+
+
+def zona_valida(nombre: str) -> bool:
+    try:
+        zona(nombre)
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+    return True
+
+
+def zona_de_recurso(recurso) -> ZoneInfo:
+    return zona(recurso.zona_horaria or settings.TIME_ZONE)
+
+
+def local(instante: datetime, tz: ZoneInfo) -> HoraLocal:
+    convertido = instante.astimezone(tz)
+    return HoraLocal(convertido.date(), convertido.time(), convertido.weekday())
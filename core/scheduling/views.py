@@ -1,23 +1,39 @@
+from django.utils import timezone
+from django.utils.duration import duration_string
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from common.pagination import get_page_number_pagination
+from common.pagination import get_keyset_pagination, get_page_number_pagination
 
+from .availability import CalendarioRecurso
+from .filters import DisponibilidadDiariaFilter
+from .index import registro
+from .services import agendar_en_lote, buscar_disponibilidad, expandir_recurrencia
 from .models import (
     Cita,
+    DisponibilidadDiaria,
     ExcepcionDisponibilidad,
     ReglaDisponibilidadRecurrente,
     RecursoReservable,
     Servicio,
 )
 from .serializers import (
+    BusquedaQuerySerializer,
+    CapacidadQuerySerializer,
+    CitaLoteSerializer,
     CitaSerializer,
+    DisponibilidadDiariaSerializer,
     ExcepcionDisponibilidadSerializer,
+    OpcionDisponibleSerializer,
+    PrimerHuecoQuerySerializer,
     ReglaDisponibilidadRecurrenteSerializer,
     RecursoReservableSerializer,
+    ResultadoLoteSerializer,
     ServicioSerializer,
+    SlotSerializer,
+    SlotsQuerySerializer,
     ValidarCitaSerializer,
 )
 
@@ -32,6 +48,38 @@ class RecursoReservableViewSet(viewsets.ModelViewSet):
     filterset_fields = ["esta_activo"]
     queryset = RecursoReservable.objects.all().order_by("nombre", "id")
 
+    @action(detail=True, methods=["get"], url_path="capacidad")
+    def capacidad(self, request, pk=None):
+        """Capacidad restante del recurso en el instante `en`, respondida desde el indice en memoria."""
+        recurso = self.get_object()
+        serializer = CapacidadQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        instante = serializer.validated_data["en"]
+        return Response(
+            {
+                "recurso": recurso.pk,
+                "en": serializer.data["en"],
+                "capacidad_restante": registro.capacidad_restante(recurso, instante),
+            }
+        )
+
+    @action(detail=True, methods=["get"], url_path="primer-hueco")
+    def primer_hueco(self, request, pk=None):
+        """Primer slot libre del servicio desde `desde` (o ahora) dentro del horizonte del indice."""
+        recurso = self.get_object()
+        serializer = PrimerHuecoQuerySerializer(data=request.query_params, context={"recurso": recurso})
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+        despues_de = max(datos.get("desde") or timezone.now(), timezone.now())
+        slot = registro.primer_hueco(recurso, datos["servicio"], despues_de)
+        return Response(
+            {
+                "recurso": recurso.pk,
+                "servicio": datos["servicio"].pk,
+                "slot": SlotSerializer(slot).data if slot else None,
+            }
+        )
+
 
 class ServicioViewSet(viewsets.ModelViewSet):
     serializer_class = ServicioSerializer
@@ -68,10 +116,24 @@ class ExcepcionDisponibilidadViewSet(viewsets.ModelViewSet):
     )
 
 
+class DisponibilidadDiariaViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Vista de mes: lectura directa de la tabla precalculada (un rango sobre el indice por fecha).
+    Filtrar por `fecha__gte`/`fecha__lte` y `recurso__in` o `servicio`.
+    """
+
+    serializer_class = DisponibilidadDiariaSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = get_page_number_pagination(500, max_page_size=5000)
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = DisponibilidadDiariaFilter
+    queryset = DisponibilidadDiaria.objects.all().order_by("fecha", "recurso_id", "servicio_id")
+
+
 class CitaViewSet(viewsets.ModelViewSet):
     serializer_class = CitaSerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = get_page_number_pagination(20)
+    pagination_class = get_keyset_pagination(("-inicio", "-id"), 20)
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     ordering_fields = ["inicio", "fin", "creado_en"]
     filterset_fields = {
@@ -90,6 +152,80 @@ class CitaViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         return Response({"detail": "Intervalo disponible para agendar."})
 
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request):
+        """Agenda una serie (lista de intervalos o recurrencia semanal) validando todo en una pasada."""
+        serializer = CitaLoteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+        recurso = datos["recurso"]
+        if "recurrencia" in datos:
+            recurrencia = datos["recurrencia"]
+            intervalos = expandir_recurrencia(
+                recurso,
+                recurrencia["inicio"],
+                recurrencia["fin"],
+                recurrencia["repeticiones"],
+                recurrencia["cada_semanas"],
+            )
+        else:
+            intervalos = [(intervalo["inicio"], intervalo["fin"]) for intervalo in datos["intervalos"]]
+
+        resultados = agendar_en_lote(
+            recurso.pk,
+            intervalos,
+            servicio=datos["servicio"],
+            producto=datos.get("producto"),
+            user=datos.get("user"),
+            titulo=datos["titulo"],
+            notas=datos["notas"],
+            pago_confirmado=datos["pago_confirmado"],
+        )
+        creadas = sum(1 for resultado in resultados if resultado["id"])
+        return Response(
+            {
+                "creadas": creadas,
+                "rechazadas": len(resultados) - creadas,
+                "resultados": ResultadoLoteSerializer(resultados, many=True).data,
+            },
+            status=status.HTTP_201_CREATED if creadas else status.HTTP_400_BAD_REQUEST,
+        )
+
+    @action(detail=False, methods=["get"], url_path="slots")
+    def slots(self, request):
+        """Slots reservables de un servicio en un rango de fechas locales del recurso."""
+        serializer = SlotsQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+        servicio = datos["servicio"]
+        calendario = CalendarioRecurso.cargar(datos["recurso"], datos["desde"], datos["hasta"])
+        slots = calendario.slots(servicio, paso=datos.get("paso"), despues_de=timezone.now())
+        return Response(
+            {
+                "recurso": datos["recurso"].pk,
+                "servicio": servicio.pk,
+                "duracion": duration_string(servicio.duracion_total_esperada),
+                "slots": SlotSerializer(slots, many=True).data,
+            }
+        )
+
+    @action(detail=False, methods=["get"], url_path="buscar")
+    def buscar(self, request):
+        """Primeros huecos de un servicio (por nombre) en todos los recursos activos que lo ofrecen."""
+        serializer = BusquedaQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        datos = serializer.validated_data
+        opciones = buscar_disponibilidad(
+            datos["servicio"],
+            max(datos["desde"], timezone.now()),
+            datos["hasta"],
+            duracion=datos.get("duracion"),
+            paso=datos.get("paso"),
+            limite=datos["limite"],
+        )
+        resultados = [{"servicio": servicio, "slot": slot} for servicio, slot in opciones]
+        return Response({"resultados": OpcionDisponibleSerializer(resultados, many=True).data})
+
     @action(detail=True, methods=["post"], url_path="cancelar")
     def cancelar(self, request, pk=None):
         cita = self.get_object()